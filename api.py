@@ -0,0 +1,151 @@
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import binaire
+
+# Accès HTTP au serveur de jeu, partagé par le client et les bots de test.
+# Une seule requests.Session : connexions gardées ouvertes (keep-alive) et réutilisées,
+# délais de connexion/lecture sur chaque requête, nouvelles tentatives bornées.
+
+# URL du serveur (ex. ASSISTES_SERVER_URL=http://192.168.1.20:5000)
+SERVER_URL = os.environ.get('ASSISTES_SERVER_URL', "http://localhost:5000")
+
+# Délais (en secondes) : établissement de la connexion, puis attente de la réponse.
+# Pour les long-polls et le flux SSE, la durée d'attente demandée au serveur s'ajoute.
+DELAI_CONNEXION = 3.05
+DELAI_LECTURE = 10
+
+# Nouvelles tentatives, espacées de 0.3 s, 0.6 s, 1.2 s... Les POST ne sont rejoués
+# que si la connexion a échoué (requête jamais envoyée) : un coup n'est pas joué deux fois.
+ESSAIS = 3
+FACTEUR_ATTENTE = 0.3
+STATUTS_A_REJOUER = (502, 503, 504)
+
+# Durée (en secondes) pendant laquelle le serveur garde une requête d'attente ouverte
+ATTENTE_LONG_POLL = 20
+
+# Intervalle maximal entre deux messages du flux SSE (ATTENTE_MAX côté serveur)
+ATTENTE_SSE = 25
+
+# ASSISTES_FORMAT=binaire : états de partie demandés au format binaire (binaire.py,
+# environ deux fois plus petit que le JSON, mais plus coûteux à encoder et décoder).
+# Le serveur peut répondre en JSON (ancienne version) : lire les réponses avec donnees().
+FORMAT_BINAIRE = os.environ.get('ASSISTES_FORMAT', 'json') == 'binaire'
+
+
+class ClientAPI:
+    def __init__(self, url=SERVER_URL, essais=ESSAIS, taille_pool=10, format_binaire=FORMAT_BINAIRE):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.accept = f"{binaire.TYPE_MIME}, application/json;q=0.9" if format_binaire else 'application/json'
+        # Dernier état complet reçu par partie : {game_id: (etag, response)}
+        self.etats = {}
+        relances = Retry(
+            total=essais, connect=essais, read=essais, status=essais,
+            backoff_factor=FACTEUR_ATTENTE, status_forcelist=STATUTS_A_REJOUER,
+            allowed_methods=frozenset({'GET'}), raise_on_status=False,
+        )
+        adaptateur = HTTPAdapter(pool_connections=taille_pool, pool_maxsize=taille_pool, max_retries=relances)
+        self.session.mount('http://', adaptateur)
+        self.session.mount('https://', adaptateur)
+
+    def get(self, chemin, attente=0, **kwargs):
+        return self.session.get(self.url + chemin, timeout=(DELAI_CONNEXION, DELAI_LECTURE + attente), **kwargs)
+
+    def post(self, chemin, donnees):
+        return self.session.post(self.url + chemin, json=donnees, timeout=(DELAI_CONNEXION, DELAI_LECTURE))
+
+    def fermer(self):
+        self.session.close()
+
+    # --- Routes du serveur ---
+
+    def create_game(self, player_id):
+        return self.post('/create_game', {'player_id': player_id})
+
+    def join_game(self, game_id, player_id):
+        return self.post('/join_game', {'game_id': game_id, 'player_id': player_id})
+
+    def matchmaking(self, player_id):
+        return self.post('/matchmaking', {'player_id': player_id})
+
+    def lobby(self, page=1, par_page=None, player_id=None):
+        # player_id : ses propres parties ne sont pas listées
+        params = {'page': page}
+        if par_page is not None:
+            params['par_page'] = par_page
+        if player_id is not None:
+            params['player_id'] = player_id
+        return self.get('/lobby', params=params)
+
+    def resume(self, player_id):
+        return self.get(f"/resume/{player_id}")
+
+    def leave_game(self, game_id, player_id):
+        return self.post('/leave_game', {'game_id': game_id, 'player_id': player_id})
+
+    def add_bot(self, game_id, player_id):
+        return self.post('/add_bot', {'game_id': game_id, 'player_id': player_id})
+
+    def submit_team(self, game_id, player_id, equipe):
+        return self.post('/submit_team', {'game_id': game_id, 'player_id': player_id, 'equipe': equipe})
+
+    def submit_map(self, game_id, player_id, carte):
+        return self.post('/submit_map', {'game_id': game_id, 'player_id': player_id, 'map': carte})
+
+    def make_move(self, game_id, player_id, personnage_index, action_key, cible_index):
+        return self.post('/make_move', {
+            'game_id': game_id,
+            'player_id': player_id,
+            'personnage_index': personnage_index,
+            'action_key': action_key,
+            'cible_index': cible_index
+        })
+
+    def etat(self, game_id, version=None, delta=False, attente=ATTENTE_LONG_POLL):
+        # Sans version : réponse immédiate. Avec version : le serveur attend un changement.
+        # delta=True : seuls les champs modifiés depuis `version` sont renvoyés.
+        # Pour l'état complet, If-None-Match : le serveur répond 304 si rien n'a changé
+        # et la réponse précédente est resservie.
+        # Corps JSON ou binaire selon le format négocié : le lire avec donnees(response).
+        params = {} if version is None else {'since': version, 'timeout': attente}
+        headers = {'Accept': self.accept}
+        if delta and version is not None:
+            params['delta'] = 1
+            return self.get(f"/game_state/{game_id}", attente=attente, params=params, headers=headers)
+        precedent = self.etats.get(game_id)
+        if precedent:
+            headers['If-None-Match'] = precedent[0]
+        response = self.get(f"/game_state/{game_id}", attente=0 if version is None else attente, params=params, headers=headers)
+        if response.status_code == 304 and precedent:
+            return precedent[1]
+        if response.status_code == 200 and 'ETag' in response.headers:
+            self.etats[game_id] = (response.headers['ETag'], response)
+        return response
+
+    @staticmethod
+    def donnees(response):
+        # Corps d'une réponse /game_state : décodé selon le format choisi par le serveur
+        if response.headers.get('Content-Type', '').startswith(binaire.TYPE_MIME):
+            return binaire.decoder(response.content)
+        return response.json()
+
+    def evenements(self, game_id, version):
+        # Abonnement au canal Server-Sent Events de la partie, à partir de `version`
+        with self.get(f"/events/{game_id}", attente=ATTENTE_SSE, params={'since': version}, stream=True) as response:
+            if response.status_code != 200:
+                return
+            evenement = {}
+            for ligne in response.iter_lines(decode_unicode=True):
+                if ligne:
+                    if not ligne.startswith(':'):
+                        champ, _, valeur = ligne.partition(':')
+                        evenement[champ] = valeur.lstrip(' ')
+                    continue
+                if 'data' in evenement:
+                    yield {'id': int(evenement['id']), 'type': evenement['event'], 'data': json.loads(evenement['data'])}
+                evenement = {}
@@ -0,0 +1,161 @@
+import argparse
+import copy
+import json
+import platform
+import sys
+import timeit
+
+from flask import jsonify
+
+import binaire
+import client
+import metriques
+import server
+from combat import EQUIPES
+
+# Microbenchmarks des chemins exécutés à chaque coup et à chaque poll.
+# Exemple : python benchmarks.py --sortie benchmarks_base.json
+# puis, après une modification : python benchmarks.py --comparer benchmarks_base.json
+# (code de sortie 1 si un benchmark a ralenti de plus de --seuil pour cent)
+
+# Nombre de mesures par benchmark ; on garde la meilleure (la moins bruitée)
+REPETITIONS = 5
+
+
+def equipe_serveur(nom):
+    return {
+        'nom': nom,
+        'personnages': [
+            {'type': classe, 'nom': perso, 'classe': classe, 'pv': pv, 'pv_max': pv, 'vivant': True, 'arme': arme}
+            for perso, classe, pv, arme in EQUIPES[nom]
+        ]
+    }
+
+
+def partie_en_cours():
+    # Partie réaliste créée via les routes du serveur, avec quelques coups joués
+    app = server.app.test_client()
+    game_id = app.post('/create_game', json={'player_id': 'p1'}).json['game_id']
+    app.post('/join_game', json={'game_id': game_id, 'player_id': 'p2'})
+    noms = list(EQUIPES)
+    app.post('/submit_team', json={'game_id': game_id, 'player_id': 'p1', 'equipe': equipe_serveur(noms[0])})
+    app.post('/submit_team', json={'game_id': game_id, 'player_id': 'p2', 'equipe': equipe_serveur(noms[1])})
+    app.post('/submit_map', json={'game_id': game_id, 'player_id': 'p1', 'map': server.MAPS[0]})
+    for joueur, cible in (('p1', 3), ('p2', 4), ('p1', 0)):
+        app.post('/make_move', json={'game_id': game_id, 'player_id': joueur, 'personnage_index': 2,
+                                     'action_key': '1', 'cible_index': cible})
+    return game_id, server.games.get(game_id)
+
+
+def bench_jouer_coup(game_id, game):
+    # Résolution d'un coup côté serveur (make_move sans la couche HTTP).
+    # La partie est remise à zéro quand elle se termine.
+    modele = copy.deepcopy(game)
+    etat = {'game': game}
+
+    def coup():
+        game = etat['game']
+        if game['status'] == 'finished':
+            game = etat['game'] = copy.deepcopy(modele)
+            server.games.put(game_id, game)
+        actif = 'equipe1' if game['equipe_active_nom'] == game['equipe1']['nom'] else 'equipe2'
+        inactif = 'equipe2' if actif == 'equipe1' else 'equipe1'
+        joueur = game['player1_id'] if actif == 'equipe1' else game['player2_id']
+        acteur = next(i for i, p in enumerate(game[actif]['personnages']) if p['vivant'] and p['type'] != 'Druide')
+        cible = next(i for i, p in enumerate(game[inactif]['personnages']) if p['vivant'])
+        server.jouer_coup(game_id, game, joueur, acteur, '1', cible)
+
+    return coup
+
+
+def cas():
+    game_id, game = partie_en_cours()
+    etat = server.etat_public(game)
+    jeu = client.Jeu.from_dict(etat)
+    equipe = etat['equipe1']
+    personnage = equipe['personnages'][0]
+    jeu_a_jour = client.Jeu.from_dict(etat)
+    etat_binaire = binaire.encoder(etat)
+
+    def jsonify_etat():
+        with server.app.app_context():
+            jsonify(server.etat_public(game))
+
+    return {
+        'jouer_coup': bench_jouer_coup(*partie_en_cours()),
+        'Jeu.to_dict': jeu.to_dict,
+        'Jeu.from_dict': lambda: client.Jeu.from_dict(etat),
+        'Jeu.from_dict (binaire)': lambda: client.Jeu.from_dict(etat_binaire),
+        'Jeu.mettre_a_jour': lambda: jeu_a_jour.mettre_a_jour(etat),
+        'Equipe.from_dict': lambda: client.Equipe.from_dict(equipe),
+        'Personnage.from_dict': lambda: client.Personnage.from_dict(personnage),
+        'Equipe.membres_vivants': jeu.equipe1.membres_vivants,
+        'delta_partie': lambda: server.delta_partie(game, game['version'] - 2),
+        'jsonify': jsonify_etat,
+        'encoder_json': lambda: server.encoder_json(server.etat_public(game)),
+        'binaire.encoder': lambda: binaire.encoder(server.etat_public(game)),
+        'binaire.decoder': lambda: binaire.decoder(etat_binaire),
+        'etat_encode (cache)': lambda: server.etat_encode(game_id, game['version']),
+        'metriques (requête)': lambda: metriques.routes['make_move'].observer(0.003, 200),
+    }
+
+
+def mesurer(fonction):
+    # Durée d'un appel en microsecondes (meilleure de REPETITIONS séries)
+    minuteur = timeit.Timer(fonction)
+    nombre, _ = minuteur.autorange()
+    return min(minuteur.repeat(REPETITIONS, nombre)) / nombre * 1e6
+
+
+def comparer(reference, actuel, seuil):
+    # Renvoie les lignes du tableau de comparaison et la liste des régressions
+    lignes, regressions = [], []
+    for nom, duree in actuel.items():
+        avant = reference.get(nom)
+        if avant is None:
+            lignes.append(f"{nom:<24} {duree:>10.2f} µs   (nouveau)")
+            continue
+        ecart = 100 * (duree - avant) / avant
+        marque = ''
+        if ecart > seuil:
+            marque = '  << RÉGRESSION'
+            regressions.append(nom)
+        lignes.append(f"{nom:<24} {duree:>10.2f} µs   {avant:>10.2f} µs   {ecart:+6.1f} %{marque}")
+    return lignes, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks des chemins critiques (coups, sérialisation)")
+    parser.add_argument('filtre', nargs='*', help="ne lancer que les benchmarks dont le nom contient l'un de ces mots")
+    parser.add_argument('--sortie', help="écrit les résultats (référence) dans ce fichier JSON")
+    parser.add_argument('--comparer', help="fichier JSON de référence")
+    parser.add_argument('--seuil', type=float, default=10.0, help="ralentissement toléré en pour cent (défaut : 10)")
+    args = parser.parse_args()
+
+    resultats = {}
+    for nom, fonction in cas().items():
+        if args.filtre and not any(mot in nom for mot in args.filtre):
+            continue
+        resultats[nom] = round(mesurer(fonction), 3)
+
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            json.dump({'python': platform.python_version(), 'resultats': resultats}, f, indent=2)
+
+    if not args.comparer:
+        for nom, duree in resultats.items():
+            print(f"{nom:<24} {duree:>10.2f} µs")
+        return
+
+    with open(args.comparer, encoding='utf-8') as f:
+        reference = json.load(f)['resultats']
+    lignes, regressions = comparer(reference, resultats, args.seuil)
+    print(f"{'benchmark':<24} {'actuel':>13}   {'référence':>13}   {'écart':>8}")
+    print('\n'.join(lignes))
+    if regressions:
+        print(f"\n{len(regressions)} régression(s) au-delà de {args.seuil} % : {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,271 @@
+import struct
+
+# Format binaire compact des états de partie, à la place du JSON quand la taille compte :
+# sauvegardes locales (.jbin), stockage SQLite (?format=binaire), réponses /game_state
+# négociées (en-tête Accept: application/x-assistes-binaire).
+#
+# Disposition : MAGIE + numéro de VERSION (1 octet), table des chaînes, puis la valeur.
+# - table des chaînes : chaque clé et chaque nom n'est écrit qu'une fois, les valeurs
+#   y renvoient par leur index (2 octets). Les chaînes de CHAINES_CONNUES (clés des
+#   états, statuts) ne sont jamais écrites : elles occupent les premiers index ;
+# - chaque valeur commence par une étiquette d'un octet (voir ci-dessous) ;
+# - un personnage ({type, nom, classe, pv, pv_max, vivant, arme}, la structure la plus
+#   répétée) est un bloc de taille fixe sans clés, que decoder(..., personnage=...) peut
+#   transformer directement en objet.
+# Toute modification de la disposition doit incrémenter VERSION : decoder refuse les
+# versions qu'il ne connaît pas au lieu de mal les lire.
+
+MAGIE = b'ASB'
+VERSION = 1
+TYPE_MIME = 'application/x-assistes-binaire'
+
+CHAMPS_PERSONNAGE = ('type', 'nom', 'classe', 'pv', 'pv_max', 'vivant', 'arme')
+_CLES_PERSONNAGE = frozenset(CHAMPS_PERSONNAGE)
+
+# Table de chaînes implicite, commune à tous les messages d'une même VERSION. Ne jamais
+# modifier ni réordonner : ajouter des chaînes impose un nouveau numéro de VERSION.
+CHAINES_CONNUES = CHAMPS_PERSONNAGE + (
+    'personnages', 'equipe1', 'equipe2', 'stats', 'degats_infliges', 'soins_effectues', 'morts',
+    'tour_actuel', 'equipe_active_nom', 'map', 'status', 'version', 'since', 'champs', '_versions',
+    'player1_id', 'player2_id', 'bot_id', 'graine', 'save_name', 'adversaire_ia', 'game_id',
+    'id', 'data', 'message', 'error', 'coup', 'instantane', 'etat',
+    'acteur', 'action', 'cible', 'critique', 'degats', 'contrecoup', 'soins',
+    'waiting_player2', 'waiting_teams', 'waiting_map', 'ongoing', 'finished', 'statut',
+    'Warrior', 'Archer', 'Druide',
+)
+_INDEX_CONNUES = {texte: index for index, texte in enumerate(CHAINES_CONNUES)}
+
+# Étiquettes : None, False, True, entier 0-255, entier signé 64 bits, entier non signé
+# 64 bits, autre entier (en texte), flottant, chaîne, liste, dictionnaire, personnage
+AUCUN, FAUX, VRAI, OCTET, ENTIER, NATUREL, GRAND, REEL, CHAINE, LISTE, DICT, PERSONNAGE = b'NFTbqQgdslmp'
+
+# Index réservé : arme absente (None) d'un personnage
+SANS_CHAINE = 0xFFFF
+
+_H = struct.Struct('<H')
+_I = struct.Struct('<I')
+_ETIQUETTE_H = struct.Struct('<BH')
+_ETIQUETTE_I = struct.Struct('<BI')
+_ETIQUETTE_Q = struct.Struct('<Bq')
+_ETIQUETTE_QN = struct.Struct('<BQ')
+_ETIQUETTE_D = struct.Struct('<Bd')
+# Étiquette, index de type, nom, classe et arme, pv, pv_max, vivant
+_PERSONNAGE = struct.Struct('<B4Hii?')
+_MIN_I32, _MAX_I32 = -2 ** 31, 2 ** 31 - 1
+
+
+def _est_personnage(valeur):
+    return (
+        len(valeur) == 7 and valeur.keys() == _CLES_PERSONNAGE
+        and type(valeur['type']) is str and type(valeur['nom']) is str and type(valeur['classe']) is str
+        and (valeur['arme'] is None or type(valeur['arme']) is str)
+        and type(valeur['pv']) is int and type(valeur['pv_max']) is int and type(valeur['vivant']) is bool
+        and _MIN_I32 <= valeur['pv'] <= _MAX_I32 and _MIN_I32 <= valeur['pv_max'] <= _MAX_I32
+    )
+
+
+def encoder(valeur):
+    # Valeur JSON (dict, list, str, int, float, bool, None) -> octets
+    chaines = {}
+    corps = []
+    ajouter = corps.append
+
+    def chaine(texte):
+        index = _INDEX_CONNUES.get(texte)
+        if index is not None:
+            return index
+        index = chaines.get(texte)
+        if index is None:
+            index = chaines[texte] = len(CHAINES_CONNUES) + len(chaines)
+            if index >= SANS_CHAINE:
+                raise ValueError("Trop de chaînes différentes pour le format binaire")
+        return index
+
+    def ecrire(v):
+        t = type(v)
+        if t is str:
+            ajouter(_ETIQUETTE_H.pack(CHAINE, chaine(v)))
+        elif t is int:
+            if 0 <= v <= 0xFF:
+                ajouter(bytes((OCTET, v)))
+            elif -2 ** 63 <= v < 2 ** 63:
+                ajouter(_ETIQUETTE_Q.pack(ENTIER, v))
+            elif 0 <= v < 2 ** 64:
+                ajouter(_ETIQUETTE_QN.pack(NATUREL, v))
+            else:
+                ajouter(_ETIQUETTE_H.pack(GRAND, chaine(str(v))))
+        elif t is dict:
+            if _est_personnage(v):
+                arme = v['arme']
+                ajouter(_PERSONNAGE.pack(
+                    PERSONNAGE, chaine(v['type']), chaine(v['nom']), chaine(v['classe']),
+                    SANS_CHAINE if arme is None else chaine(arme), v['pv'], v['pv_max'], v['vivant']
+                ))
+            else:
+                ajouter(_ETIQUETTE_I.pack(DICT, len(v)))
+                for cle, x in v.items():
+                    ecrire(cle)
+                    ecrire(x)
+        elif t is list or t is tuple:
+            ajouter(_ETIQUETTE_I.pack(LISTE, len(v)))
+            for x in v:
+                ecrire(x)
+        elif v is None:
+            ajouter(bytes((AUCUN,)))
+        elif t is bool:
+            ajouter(bytes((VRAI if v else FAUX,)))
+        elif t is float:
+            ajouter(_ETIQUETTE_D.pack(REEL, v))
+        else:
+            raise TypeError(f"Type non encodable en binaire : {t.__name__}")
+
+    ecrire(valeur)
+    # Table (hors CHAINES_CONNUES) : nombre de chaînes, longueur (en caractères) de chacune,
+    # puis toutes les chaînes à la suite en UTF-8, décodées en une fois à la lecture
+    texte = ''.join(chaines).encode('utf-8')
+    table = struct.pack(f'<H{len(chaines)}II', len(chaines), *map(len, chaines), len(texte))
+    return b''.join([MAGIE, bytes((VERSION,)), table, texte, *corps])
+
+
+def est_binaire(octets):
+    return octets[:len(MAGIE)] == MAGIE
+
+
+def decoder(octets, personnage=None):
+    # Octets -> valeur. `personnage(type, nom, classe, pv, pv_max, vivant, arme)`, si fourni,
+    # construit chaque personnage directement à la place de son dictionnaire.
+    # ValueError si les octets ne sont pas dans un format connu ou sont tronqués.
+    # bytes plutôt que memoryview : l'accès à un octet y est plus rapide
+    vue = bytes(octets)
+    if not est_binaire(vue):
+        raise ValueError("Données non binaires (en-tête absent)")
+    if len(vue) <= len(MAGIE) or vue[len(MAGIE)] != VERSION:
+        raise ValueError(f"Version du format binaire non prise en charge : {vue[len(MAGIE)] if len(vue) > len(MAGIE) else '?'}")
+    try:
+        position = len(MAGIE) + 1
+        (nombre,) = _H.unpack_from(vue, position)
+        position += 2
+        *longueurs, taille = struct.unpack_from(f'<{nombre}II', vue, position)
+        position += 4 * (nombre + 1)
+        if position + taille > len(vue):
+            raise ValueError("Données binaires tronquées")
+        texte = vue[position:position + taille].decode('utf-8')
+        position += taille
+        chaines = list(CHAINES_CONNUES)
+        debut = 0
+        for longueur in longueurs:
+            chaines.append(texte[debut:debut + longueur])
+            debut += longueur
+
+        def lire(position):
+            etiquette = vue[position]
+            if etiquette == CHAINE:
+                return chaines[_H.unpack_from(vue, position + 1)[0]], position + 3
+            if etiquette == OCTET:
+                return vue[position + 1], position + 2
+            if etiquette == PERSONNAGE:
+                _, type_, nom, classe, arme, pv, pv_max, vivant = _PERSONNAGE.unpack_from(vue, position)
+                champs = (chaines[type_], chaines[nom], chaines[classe], pv, pv_max, vivant,
+                          None if arme == SANS_CHAINE else chaines[arme])
+                valeur = personnage(*champs) if personnage is not None else dict(zip(CHAMPS_PERSONNAGE, champs))
+                return valeur, position + _PERSONNAGE.size
+            if etiquette == DICT:
+                (taille,) = _I.unpack_from(vue, position + 1)
+                position += 5
+                valeur = {}
+                for _ in range(taille):
+                    cle, position = lire(position)
+                    valeur[cle], position = lire(position)
+                return valeur, position
+            if etiquette == LISTE:
+                (taille,) = _I.unpack_from(vue, position + 1)
+                position += 5
+                valeur = []
+                for _ in range(taille):
+                    element, position = lire(position)
+                    valeur.append(element)
+                return valeur, position
+            if etiquette == VRAI:
+                return True, position + 1
+            if etiquette == FAUX:
+                return False, position + 1
+            if etiquette == AUCUN:
+                return None, position + 1
+            if etiquette == ENTIER:
+                return _ETIQUETTE_Q.unpack_from(vue, position)[1], position + _ETIQUETTE_Q.size
+            if etiquette == NATUREL:
+                return _ETIQUETTE_QN.unpack_from(vue, position)[1], position + _ETIQUETTE_QN.size
+            if etiquette == REEL:
+                return _ETIQUETTE_D.unpack_from(vue, position)[1], position + _ETIQUETTE_D.size
+            if etiquette == GRAND:
+                return int(chaines[_H.unpack_from(vue, position + 1)[0]]), position + 3
+            raise ValueError(f"Étiquette binaire inconnue : {etiquette}")
+
+        valeur, position = lire(position)
+    except (struct.error, IndexError, UnicodeDecodeError) as e:
+        raise ValueError(f"Données binaires invalides : {e}") from e
+    if position != len(vue):
+        raise ValueError("Données binaires invalides : octets en trop")
+    return valeur
+
+
+# --- Fichiers d'enregistrements (journaux de sauvegarde .jbin) ---
+# Chaque enregistrement : taille sur 4 octets puis la valeur encodée (avec son en-tête).
+
+def enregistrement(valeur):
+    octets = encoder(valeur)
+    return _I.pack(len(octets)) + octets
+
+
+def lire_enregistrements(fichier):
+    # Lecture en flux : (valeur, position de fin) pour chaque enregistrement complet, sans
+    # charger tout le fichier. S'arrête au premier enregistrement incomplet ou illisible
+    # (fin de fichier tronquée par un arrêt pendant une écriture).
+    fin = 0
+    while True:
+        entete = fichier.read(_I.size)
+        if len(entete) < _I.size:
+            return
+        (taille,) = _I.unpack(entete)
+        octets = fichier.read(taille)
+        if len(octets) < taille:
+            return
+        try:
+            valeur = decoder(octets)
+        except ValueError:
+            return
+        fin += _I.size + taille
+        yield valeur, fin
+
+
+def extremites(fichier):
+    # (premier, dernier) enregistrements complets et lisibles, ou (None, None). Seuls ces
+    # deux-là sont décodés : les autres ne sont que sautés (lecture de leur taille puis seek).
+    # Un dernier enregistrement tronqué ou illisible est ignoré, comme par lire_enregistrements.
+    fichier.seek(0, 2)
+    taille_fichier = fichier.tell()
+    positions = []
+    position = 0
+    while position + _I.size <= taille_fichier:
+        fichier.seek(position)
+        (taille,) = _I.unpack(fichier.read(_I.size))
+        if position + _I.size + taille > taille_fichier:
+            break
+        positions.append((position + _I.size, taille))
+        position += _I.size + taille
+
+    def lire(debut, taille):
+        fichier.seek(debut)
+        try:
+            return decoder(fichier.read(taille))
+        except ValueError:
+            return None
+
+    premier = lire(*positions[0]) if positions else None
+    if premier is None:
+        return None, None
+    for debut, taille in reversed(positions[1:]):
+        dernier = lire(debut, taille)
+        if dernier is not None:
+            return premier, dernier
+    return premier, premier
@@ -0,0 +1,267 @@
+import argparse
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import requests
+
+from api import ClientAPI
+from combat import ACTIONS_PAR_TYPE, EQUIPES
+
+# Test de charge du serveur : des paires de bots jouent des parties complètes
+# (create_game, join_game, submit_team, submit_map, puis make_move / game_state).
+# Exemple : python charge.py --parties 2000 --concurrence 100 --processus 4 --sortie base.json
+# puis, après une modification du serveur : python charge.py ... --comparer base.json
+
+# Centiles rapportés pour chaque route
+CENTILES = (50, 95, 99)
+
+
+class ClientMesure(ClientAPI):
+    # ClientAPI qui chronomètre chaque requête : {route: [(durée, code HTTP ou 0 si exception)]}
+    def __init__(self, url, mesures):
+        super().__init__(url, essais=0)
+        self.mesures = mesures
+
+    def _mesurer(self, chemin, envoi):
+        route = '/' + chemin.split('/')[1]
+        debut = time.perf_counter()
+        try:
+            response = envoi()
+        except requests.RequestException:
+            self.mesures.setdefault(route, []).append((time.perf_counter() - debut, 0))
+            raise
+        self.mesures.setdefault(route, []).append((time.perf_counter() - debut, response.status_code))
+        return response
+
+    def get(self, chemin, attente=0, **kwargs):
+        return self._mesurer(chemin, lambda: super(ClientMesure, self).get(chemin, attente, **kwargs))
+
+    def post(self, chemin, donnees):
+        return self._mesurer(chemin, lambda: super(ClientMesure, self).post(chemin, donnees))
+
+
+def equipe(nom):
+    return {
+        'nom': nom,
+        'personnages': [
+            {'type': classe, 'nom': perso, 'classe': classe, 'pv': pv, 'pv_max': pv, 'vivant': True, 'arme': arme}
+            for perso, classe, pv, arme in EQUIPES[nom]
+        ]
+    }
+
+
+def coup_aleatoire(game, cle, rng):
+    allies = game[cle]['personnages']
+    ennemis = game['equipe2' if cle == 'equipe1' else 'equipe1']['personnages']
+    i = rng.choice([k for k, p in enumerate(allies) if p['vivant']])
+    action = rng.choice(list(ACTIONS_PAR_TYPE[allies[i]['type']].values()))
+    cibles = allies if action.cible == 'allie' else ennemis
+    return i, action.cle, rng.choice([k for k, p in enumerate(cibles) if p['vivant']])
+
+
+def jouer_partie(url, mesures, rng, tours_max=500):
+    # Une partie entre deux bots ; chaque tour : le joueur actif relit l'état puis joue.
+    # Renvoie True si la partie est allée jusqu'au bout.
+    hote, invite = ClientMesure(url, mesures), ClientMesure(url, mesures)
+    ids = (str(uuid.uuid4())[:8], str(uuid.uuid4())[:8])
+    try:
+        response = hote.create_game(ids[0])
+        if response.status_code != 200:
+            return False
+        game_id = response.json()['game_id']
+        noms = list(EQUIPES)
+        if invite.join_game(game_id, ids[1]).status_code != 200:
+            return False
+        if hote.submit_team(game_id, ids[0], equipe(noms[0])).status_code != 200:
+            return False
+        if invite.submit_team(game_id, ids[1], equipe(noms[1])).status_code != 200:
+            return False
+        if hote.submit_map(game_id, ids[0], "Quartier Yvetot").status_code != 200:
+            return False
+        joueurs = {noms[0]: (hote, ids[0], 'equipe1'), noms[1]: (invite, ids[1], 'equipe2')}
+        for _ in range(tours_max):
+            response = hote.etat(game_id)
+            if response.status_code != 200:
+                return False
+            game = hote.donnees(response)
+            if game['status'] == 'finished':
+                return True
+            client, player_id, cle = joueurs[game['equipe_active_nom']]
+            if client is not hote and client.etat(game_id).status_code != 200:
+                return False
+            if client.make_move(game_id, player_id, *coup_aleatoire(game, cle, rng)).status_code != 200:
+                return False
+        return False
+    except requests.RequestException:
+        return False
+    finally:
+        hote.fermer()
+        invite.fermer()
+
+
+def _lot(arguments):
+    # Dans un processus : `n` parties, `concurrence` à la fois (un thread par partie)
+    url, n, concurrence, graine = arguments
+    mesures = {}
+    verrou = threading.Lock()
+    terminees = [0]
+
+    def partie(k):
+        locales = {}
+        ok = jouer_partie(url, locales, random.Random(graine * 1_000_003 + k))
+        with verrou:
+            for route, valeurs in locales.items():
+                mesures.setdefault(route, []).extend(valeurs)
+            terminees[0] += ok
+
+    with ThreadPoolExecutor(max_workers=concurrence) as executeur:
+        list(executeur.map(partie, range(n)))
+    return mesures, terminees[0]
+
+
+def memoire_processus(pid):
+    # Mémoire résidente (Mo) d'un processus, lue dans /proc (Linux) ; None ailleurs
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for ligne in f:
+                if ligne.startswith('VmRSS:'):
+                    return round(int(ligne.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+
+
+def port_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def lancer_serveur(store):
+    # Serveur local (server.py) sur un port libre ; renvoie (processus, url)
+    port = port_libre()
+    env = dict(os.environ, ASSISTES_PORT=str(port), ASSISTES_STORE=store)
+    processus = subprocess.Popen([sys.executable, 'server.py'], env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            requests.get(f"{url}/game_state/-", timeout=1)
+            return processus, url
+        except requests.RequestException:
+            time.sleep(0.1)
+    processus.kill()
+    raise RuntimeError("Le serveur de test n'a pas démarré")
+
+
+def centile(valeurs_triees, p):
+    if not valeurs_triees:
+        return None
+    return valeurs_triees[min(len(valeurs_triees) - 1, int(len(valeurs_triees) * p / 100))]
+
+
+def rapport(mesures, parties, terminees, duree, memoire_avant, memoire_apres):
+    routes = {}
+    total = erreurs_total = 0
+    for route, valeurs in sorted(mesures.items()):
+        durees = sorted(d for d, _ in valeurs)
+        erreurs = sum(1 for _, code in valeurs if code == 0 or code >= 500)
+        total += len(valeurs)
+        erreurs_total += erreurs
+        routes[route] = {
+            'requetes': len(valeurs),
+            'par_seconde': round(len(valeurs) / duree, 1),
+            'taux_erreur': round(erreurs / len(valeurs), 4),
+            **{f'p{p}_ms': round(centile(durees, p) * 1000, 2) for p in CENTILES},
+        }
+    return {
+        'parties': parties,
+        'parties_terminees': terminees,
+        'duree_s': round(duree, 2),
+        'requetes': total,
+        'requetes_par_seconde': round(total / duree, 1),
+        'parties_par_seconde': round(terminees / duree, 2),
+        'taux_erreur': round(erreurs_total / total, 4) if total else 0,
+        'memoire_serveur_mo': {
+            'avant': memoire_avant,
+            'apres': memoire_apres,
+            'croissance': None if memoire_avant is None or memoire_apres is None else round(memoire_apres - memoire_avant, 1),
+        },
+        'routes': routes,
+    }
+
+
+def comparer(reference, actuel):
+    # Écarts relatifs (en %) des métriques principales par rapport à une référence
+    def ecart(a, b):
+        return None if not a or b is None else round(100 * (b - a) / a, 1)
+
+    resultat = {'requetes_par_seconde': ecart(reference['requetes_par_seconde'], actuel['requetes_par_seconde']), 'routes': {}}
+    for route, mesure in actuel['routes'].items():
+        base = reference['routes'].get(route)
+        if base:
+            resultat['routes'][route] = {f'p{p}_ms': ecart(base[f'p{p}_ms'], mesure[f'p{p}_ms']) for p in CENTILES}
+    return resultat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test de charge du serveur avec des bots")
+    parser.add_argument('--url', help="serveur déjà lancé (défaut : un server.py local démarré pour le test)")
+    parser.add_argument('--pid', type=int, help="PID du serveur --url, pour mesurer sa mémoire")
+    parser.add_argument('--store', default='memoire', help="ASSISTES_STORE du serveur local")
+    parser.add_argument('--parties', type=int, default=200)
+    parser.add_argument('--concurrence', type=int, default=20, help="parties simultanées par processus")
+    parser.add_argument('--processus', type=int, default=1)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--sortie', help="écrit le rapport JSON dans ce fichier (référence)")
+    parser.add_argument('--comparer', help="rapport JSON de référence à comparer")
+    args = parser.parse_args()
+
+    serveur = None
+    url, pid = args.url, args.pid
+    if url is None:
+        serveur, url = lancer_serveur(args.store)
+        pid = serveur.pid
+    try:
+        memoire_avant = memoire_processus(pid) if pid else None
+        lots = [
+            (url, args.parties // args.processus + (1 if k < args.parties % args.processus else 0), args.concurrence, args.graine + k)
+            for k in range(args.processus)
+        ]
+        debut = time.perf_counter()
+        if args.processus == 1:
+            resultats = list(map(_lot, lots))
+        else:
+            with ProcessPoolExecutor(max_workers=args.processus) as executeur:
+                resultats = list(executeur.map(_lot, lots))
+        duree = time.perf_counter() - debut
+        memoire_apres = memoire_processus(pid) if pid else None
+    finally:
+        if serveur is not None:
+            serveur.terminate()
+            serveur.wait()
+
+    mesures = {}
+    for mesures_lot, _ in resultats:
+        for route, valeurs in mesures_lot.items():
+            mesures.setdefault(route, []).extend(valeurs)
+    resultat = rapport(mesures, args.parties, sum(t for _, t in resultats), duree, memoire_avant, memoire_apres)
+    if args.comparer:
+        with open(args.comparer, encoding='utf-8') as f:
+            resultat['ecarts_pourcent'] = comparer(json.load(f), resultat)
+    texte = json.dumps(resultat, ensure_ascii=False, indent=2)
+    if args.sortie:
+        with open(args.sortie, 'w', encoding='utf-8') as f:
+            f.write(texte)
+    print(texte)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,12 +2,22 @@ import sys
 import os
 import json
 import random
+import re
 import time
+import atexit
+import threading
 import requests
 import uuid
+import binaire
+from combat import ACTIONS, ACTIONS_PAR_TYPE, ACTIONS_PAR_METHODE, EQUIPES, resoudre, rng_coup
+from ia import IA
+from api import ATTENTE_LONG_POLL, SERVER_URL, ClientAPI
 
-# URL du serveur
-SERVER_URL = "http://localhost:5000"
+# Accès au serveur (session HTTP partagée, délais et nouvelles tentatives : voir api.py)
+api = ClientAPI(SERVER_URL)
+
+# Temps de réflexion (en secondes) de l'ordinateur par coup
+BUDGET_IA = 1.0
 
 # --- Chargement/Sauvegarde des paramètres ---
 SETTINGS_FILE = "settings.json"
@@ -23,8 +33,26 @@ def save_settings(settings):
     with open(SETTINGS_FILE, 'w') as f:
         json.dump(settings, f, indent=4)
 
+# --- Session en ligne ---
+# Le player_id est conservé entre deux lancements : il sert de jeton pour reprendre
+# une partie en cours (/resume) si le client a été fermé ou s'est arrêté.
+SESSION_FILE = "session.json"
+
+def joueur_session():
+    try:
+        with open(SESSION_FILE, 'r') as f:
+            return json.load(f)["player_id"]
+    except:
+        player_id = uuid.uuid4().hex
+        with open(SESSION_FILE, 'w') as f:
+            json.dump({"player_id": player_id}, f, indent=4)
+        return player_id
+
 # --- Classes pour les personnages et équipes ---
 class Personnage:
+    # __slots__ : pas de __dict__ par personnage (parties simulées, bots en masse)
+    __slots__ = ('nom', 'classe', 'pv_max', 'pv', 'vivant', 'arme')
+
     def __init__(self, nom, classe, pv=100, arme="arme par défaut"):
         self.nom = nom
         self.classe = classe
@@ -58,6 +86,38 @@ class Personnage:
             jeu.stats[equipe_soigneur]["soins_effectues"] += soins_reels
         return f"{self.nom} a récupéré {soins_reels} points de vie ! Il a maintenant {self.pv} PV."
 
+    def executer(self, action_key, cible, jeu=None):
+        # Résout l'action via le moteur partagé (combat.py) et applique le résultat
+        rng = jeu.rng_coup() if jeu else random
+        resultat = resoudre(ACTIONS[(self.__class__.__name__, action_key)], self.pv, cible.pv, cible.pv_max, cible.vivant, rng)
+        cible_vivante, acteur_vivant = cible.vivant, self.vivant
+        cible.pv = resultat.pv_cible
+        cible.vivant = cible_vivante and cible.pv > 0
+        self.pv = resultat.pv_acteur
+        self.vivant = acteur_vivant and self.pv > 0
+        if jeu:
+            equipe_acteur = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
+            equipe_cible = "equipe1" if cible in jeu.equipe1.personnages else "equipe2"
+            jeu.stats[equipe_acteur]["degats_infliges"] += resultat.degats
+            jeu.stats[equipe_acteur]["soins_effectues"] += resultat.soins
+            if cible_vivante and not cible.vivant:
+                jeu.stats[equipe_cible]["morts"] += 1
+            if acteur_vivant and not self.vivant:
+                jeu.stats[equipe_acteur]["morts"] += 1
+            jeu.noter_coup(self, action_key, cible, resultat)
+        return resultat
+
+    def message_degats(self, degats):
+        if not self.vivant:
+            return f"{self.nom} est mort !"
+        return f"{self.nom} a subi {degats} points de dégâts ! Il lui reste {self.pv} PV."
+
+    def get_actions(self):
+        return {
+            cle: (action.nom, getattr(self, action.methode))
+            for cle, action in ACTIONS_PAR_TYPE.get(self.__class__.__name__, {}).items()
+        }
+
     def __str__(self):
         status = "Mort" if not self.vivant else f"{self.pv}/{self.pv_max} PV"
         return f"{self.nom} ({self.classe} - {self.arme}) - {status}"
@@ -75,14 +135,28 @@ class Personnage:
 
     @staticmethod
     def from_dict(data):
-        cls_map = {"Warrior": Warrior, "Druide": Druide, "Archer": Archer}
-        cls = cls_map.get(data["type"], Personnage)
+        cls = CLASSES.get(data["type"], Personnage)
         perso = cls(data["nom"], pv=data["pv_max"], arme=data["arme"])
         perso.pv = data["pv"]
         perso.vivant = data["vivant"]
         return perso
 
+    @staticmethod
+    def depuis_champs(type_, nom, classe, pv, pv_max, vivant, arme):
+        # Personnage lu au format binaire (binaire.decoder), sans dictionnaire intermédiaire
+        cls = CLASSES.get(type_, Personnage)
+        perso = cls(nom, pv=pv_max, arme=arme)
+        perso.pv = pv
+        perso.vivant = vivant
+        return perso
+
+    def mettre_a_jour(self, data):
+        # Seuls les PV changent en cours de partie
+        self.pv = data["pv"]
+        self.vivant = data["vivant"]
+
 class Warrior(Personnage):
+    __slots__ = ()
     PHRASES_ATTAQUE = {
         "Tic-Tac Man": {
             "basique": "Tic-Tac Man fait tournoyer son tronc rageusement",
@@ -112,13 +186,9 @@ class Warrior(Personnage):
     def attaque_basique(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas attaquer !"
-        degats = random.randint(35, 50)
         phrase = Warrior.PHRASES_ATTAQUE.get(self.nom, {}).get("basique", f"{self.nom} attaque {cible.nom} avec son {self.arme}")
-        if jeu:
-            equipe_attaquant = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
-            jeu.stats[equipe_attaquant]["degats_infliges"] += degats
-        cible.subir_degats(degats, jeu)
-        message = f"{phrase}, infligeant {degats} points de dégâts à {cible.nom} ({cible.pv} PV restants) !"
+        resultat = self.executer("1", cible, jeu)
+        message = f"{phrase}, infligeant {resultat.degats} points de dégâts à {cible.nom} ({cible.pv} PV restants) !"
         if not cible.vivant:
             message += f"\n{cible.nom} est mort !"
         return message
@@ -126,29 +196,18 @@ class Warrior(Personnage):
     def attaque_puissante(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas attaquer !"
-        degats = random.randint(45, 60)
-        degats_self = random.randint(3, 8)
         phrase = Warrior.PHRASES_ATTAQUE.get(self.nom, {}).get("puissante", f"{self.nom} utilise une attaque puissante sur {cible.nom}")
-        if jeu:
-            equipe_attaquant = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
-            jeu.stats[equipe_attaquant]["degats_infliges"] += degats
-        cible.subir_degats(degats, jeu)
-        message = f"{phrase}, infligeant {degats} points de dégâts à {cible.nom} ({cible.pv} PV restants) !"
+        resultat = self.executer("2", cible, jeu)
+        message = f"{phrase}, infligeant {resultat.degats} points de dégâts à {cible.nom} ({cible.pv} PV restants) !"
         if not cible.vivant:
             message += f"\n{cible.nom} est mort !"
-        self.subir_degats(degats_self, jeu)
-        message += f"\n{self.nom} subit un contrecoup de {degats_self} points de dégâts ({self.pv} PV restants) !"
+        message += f"\n{self.nom} subit un contrecoup de {resultat.contrecoup} points de dégâts ({self.pv} PV restants) !"
         if not self.vivant:
             message += f"\n{self.nom} est mort !"
         return message
 
-    def get_actions(self):
-        return {
-            "1": ("Attaque basique", self.attaque_basique),
-            "2": ("Attaque puissante", self.attaque_puissante),
-        }
-
 class Druide(Personnage):
+    __slots__ = ()
     PHRASES_DRUIDE = {
         "Sbaver-Man": {
             "attaque": "Sbaver-Man libère un torrent de bave corrosive !",
@@ -170,31 +229,25 @@ class Druide(Personnage):
     def soin_puissant(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas soigner !"
-        soins = random.randint(35, 55)
         phrase = Druide.PHRASES_DRUIDE.get(self.nom, {}).get("soin", f"{self.nom} soigne {cible.nom} avec son {self.arme} !")
         message = f"{phrase}\n"
-        message += cible.soigner(soins, jeu)
+        if not cible.vivant:
+            return message + f"{cible.nom} est mort et ne peut pas être soigné !"
+        resultat = self.executer("1", cible, jeu)
+        message += f"{cible.nom} a récupéré {resultat.soins} points de vie ! Il a maintenant {cible.pv} PV."
         return message
 
     def attaque_naturelle(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas attaquer !"
-        degats = random.randint(25, 40)
         phrase = Druide.PHRASES_DRUIDE.get(self.nom, {}).get("attaque", f"{self.nom} attaque {cible.nom} avec la force de la nature !")
-        if jeu:
-            equipe_attaquant = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
-            jeu.stats[equipe_attaquant]["degats_infliges"] += degats
+        resultat = self.executer("2", cible, jeu)
         message = f"{phrase}\n"
-        message += cible.subir_degats(degats, jeu)
+        message += cible.message_degats(resultat.degats)
         return message
 
-    def get_actions(self):
-        return {
-            "1": ("Soin puissant", self.soin_puissant),
-            "2": ("Attaque naturelle", self.attaque_naturelle)
-        }
-
 class Archer(Personnage):
+    __slots__ = ()
     PHRASES_ARCHER = {
         "L'oeil de con": {
             "simple": "L'oeil de con décoche une flèche bancale mais rapide.",
@@ -212,40 +265,34 @@ class Archer(Personnage):
     def tir_simple(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas attaquer !"
-        degats = random.randint(50, 70)
         phrase = Archer.PHRASES_ARCHER.get(self.nom, {}).get("simple", f"{self.nom} tire une flèche sur {cible.nom} !")
-        if jeu:
-            equipe_attaquant = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
-            jeu.stats[equipe_attaquant]["degats_infliges"] += degats
+        resultat = self.executer("1", cible, jeu)
         message = f"{phrase}\n"
-        message += cible.subir_degats(degats, jeu)
+        message += cible.message_degats(resultat.degats)
         return message
 
     def tir_precis(self, cible, jeu=None):
         if not self.vivant:
             return f"{self.nom} est mort et ne peut pas attaquer !"
-        critique = random.random() < 0.3
-        degats = random.randint(60, 80)
-        if critique:
-            degats = int(degats * 1.5)
+        resultat = self.executer("2", cible, jeu)
+        if resultat.critique:
             phrase = Archer.PHRASES_ARCHER.get(self.nom, {}).get("precis", f"{self.nom} réalise un tir critique sur {cible.nom} !")
             phrase = "🎯 TIR CRITIQUE ! " + phrase
         else:
             phrase = Archer.PHRASES_ARCHER.get(self.nom, {}).get("precis", f"{self.nom} vise avec précision.")
-        if jeu:
-            equipe_attaquant = "equipe1" if self in jeu.equipe1.personnages else "equipe2"
-            jeu.stats[equipe_attaquant]["degats_infliges"] += degats
         message = f"{phrase}\n"
-        message += cible.subir_degats(degats, jeu)
+        message += cible.message_degats(resultat.degats)
         return message
 
-    def get_actions(self):
-        return {
-            "1": ("Tir simple", self.tir_simple),
-            "2": ("Tir précis", self.tir_precis),
-        }
+CLASSES = {"Warrior": Warrior, "Druide": Druide, "Archer": Archer}
+
+def spec_action(action):
+    # Description (combat.py) d'une action obtenue par get_actions()
+    return ACTIONS_PAR_METHODE[(action.__self__.__class__.__name__, action.__name__)]
 
 class Equipe:
+    __slots__ = ('nom', 'personnages')
+
     def __init__(self, nom, personnages):
         self.nom = nom
         self.personnages = personnages
@@ -270,41 +317,73 @@ class Equipe:
 
     @staticmethod
     def from_dict(data):
-        persos = [Personnage.from_dict(p) for p in data["personnages"]]
+        # data : dictionnaire, ou octets au format binaire (personnages construits au décodage)
+        if isinstance(data, bytes):
+            data = binaire.decoder(data, personnage=Personnage.depuis_champs)
+        persos = [p if isinstance(p, Personnage) else Personnage.from_dict(p) for p in data["personnages"]]
         return Equipe(data["nom"], persos)
 
+    def correspond(self, data):
+        # Même équipe (nom et composition) : une mise à jour sur place suffit
+        return (
+            data["nom"] == self.nom and len(data["personnages"]) == len(self.personnages) and
+            all(p["nom"] == perso.nom for p, perso in zip(data["personnages"], self.personnages))
+        )
+
+    def mettre_a_jour(self, data):
+        for perso, p in zip(self.personnages, data["personnages"]):
+            perso.mettre_a_jour(p)
+
+    @staticmethod
+    def synchroniser(equipe, data):
+        # Met à jour `equipe` sur place si possible, sinon la reconstruit
+        if not data:
+            return None
+        if equipe is not None and equipe.correspond(data):
+            equipe.mettre_a_jour(data)
+            return equipe
+        return Equipe.from_dict(data)
+
 class LoadGamePanel:
+    # Sauvegardes par page, les plus récentes d'abord
+    PAR_PAGE = 10
+
     def __init__(self):
         self.save_files = self.get_save_files()
         self.selected_save = 0
+        self.page = 0
 
     def get_save_files(self):
-        save_dir = "saves"
-        if not os.path.exists(save_dir):
-            return []
-        return [f for f in os.listdir(save_dir) if f.endswith('.json')]
+        # [(fichier, résumé)] lus dans l'index des sauvegardes, pas dans les sauvegardes
+        sauvegardes = IndexSauvegardes.lister()
+        return sorted(sauvegardes.items(), key=lambda s: s[1]["mtime"], reverse=True)
 
     def display(self):
         if not self.save_files:
             print("Aucune sauvegarde trouvée.")
             return
-        print("\nCharger une partie :")
-        for i, save_file in enumerate(self.save_files):
-            try:
-                with open(os.path.join("saves", save_file), 'r') as f:
-                    data = json.load(f)
-                    save_name = data.get("save_name", save_file)
-            except:
-                save_name = save_file
+        pages = -(-len(self.save_files) // self.PAR_PAGE)
+        print(f"\nCharger une partie (page {self.page + 1}/{pages}) :")
+        debut = self.page * self.PAR_PAGE
+        for i, (save_file, resume) in enumerate(self.save_files[debut:debut + self.PAR_PAGE], debut):
             prefix = "> " if i == self.selected_save else "  "
-            print(f"{prefix}{i + 1}. {save_name}")
-        print("\nUtilisez les touches 1, 2, ... pour sélectionner une sauvegarde, 'r' pour revenir.")
+            date = time.strftime("%d/%m/%Y %H:%M", time.localtime(resume["mtime"]))
+            equipes = " vs ".join(resume["equipes"])
+            print(f"{prefix}{i + 1}. {resume['nom']} - tour {resume['tour'] or '?'}, {resume['map'] or 'carte non choisie'} ({equipes}) - {date}")
+        print("\nUtilisez les touches 1, 2, ... pour sélectionner une sauvegarde, 's'/'p' pour changer de page,")
+        print("'a' pour actualiser, 'r' pour revenir.")
 
     def load_game(self, save_file):
         try:
-            with open(os.path.join("saves", save_file), 'r') as f:
-                save_data = json.load(f)
-            jeu = Jeu.from_dict(save_data)
+            chemin = os.path.join("saves", save_file)
+            if save_file.endswith(SauvegardeJeu.JOURNAUX):
+                jeu = SauvegardeJeu.reconstruire(SauvegardeJeu.lire(chemin))
+                jeu.emplacement = save_file
+            else:
+                # Ancien format : un état complet par fichier
+                with open(chemin, 'r') as f:
+                    save_data = json.load(f)
+                jeu = Jeu.from_dict(save_data)
             return GamePanel(jeu, mode='local')
         except Exception as e:
             print(f"Erreur lors du chargement de la partie : {e}")
@@ -313,11 +392,23 @@ class LoadGamePanel:
     def handle_input(self, choice):
         if choice == 'r':
             return False
+        if choice == 's':
+            if (self.page + 1) * self.PAR_PAGE < len(self.save_files):
+                self.page += 1
+            return True
+        if choice == 'p':
+            self.page = max(0, self.page - 1)
+            return True
+        if choice == 'a':
+            self.save_files = self.get_save_files()
+            self.page = 0
+            return True
         try:
             index = int(choice) - 1
             if 0 <= index < len(self.save_files):
                 self.selected_save = index
-                panel = self.load_game(self.save_files[self.selected_save])
+                # Seule la sauvegarde choisie est lue
+                panel = self.load_game(self.save_files[self.selected_save][0])
                 if panel:
                     return panel
             else:
@@ -386,14 +477,14 @@ class SettingsPanel:
 class LocalGameModePanel:
     def __init__(self):
         self.selected_mode = 0
-        self.modes = ["Classique", "Personnalisé"]
+        self.modes = ["Classique", "Personnalisé", "Contre l'ordinateur"]
 
     def display(self):
         print("\nNouvelle partie locale - Sélection du mode :")
         for i, mode in enumerate(self.modes):
             prefix = "> " if i == self.selected_mode else "  "
             print(f"{prefix}{i + 1}. {mode}")
-        print("\nUtilisez les touches 1-2 pour sélectionner un mode, 'r' pour revenir.")
+        print("\nUtilisez les touches 1-3 pour sélectionner un mode, 'r' pour revenir.")
 
     def handle_input(self, choice):
         if choice == 'r':
@@ -404,8 +495,10 @@ class LocalGameModePanel:
                 self.selected_mode = index
                 if index == 0:
                     return TeamSelectionPanel()
-                else:
+                elif index == 1:
                     return CustomTeamSelectionPanel()
+                else:
+                    return TeamSelectionPanel(adversaire_ia=True)
             else:
                 print("Choix invalide.")
         except ValueError:
@@ -414,55 +507,201 @@ class LocalGameModePanel:
 
 class OnlineGameModePanel:
     def __init__(self):
-        self.player_id = str(uuid.uuid4())[:8]
+        self.player_id = joueur_session()
         self.game_id = None
         self.mode = None  # 'host' ou 'join'
+        # Partie en cours de ce joueur sur le serveur (réponse de /resume), ou None.
+        # Lue une fois ici puis sur demande ('a') : pas de requête à chaque affichage du menu,
+        # qui resterait figé le temps des nouvelles tentatives si le serveur ne répond pas.
+        self.reprise = None
+        self.actualiser_reprise()
+
+    def actualiser_reprise(self):
+        try:
+            response = api.resume(self.player_id)
+            self.reprise = response.json() if response.status_code == 200 else None
+        except requests.RequestException:
+            self.reprise = None
 
     def display(self):
         print("\nMode en ligne :")
         print("1. Héberger une partie")
         print("2. Rejoindre une partie")
-        print("\nEntrez 1 ou 2, ou 'r' pour revenir.")
+        print("3. Jouer contre un bot du serveur")
+        print("4. Recherche rapide d'un adversaire")
+        print("5. Parcourir les parties ouvertes")
+        if self.reprise:
+            print(f"6. Reprendre la partie en cours ({self.reprise['game_id']})")
+        print(f"\nEntrez un numéro de 1 à {6 if self.reprise else 5}, 'a' pour rechercher une partie à reprendre,")
+        print("ou 'r' pour revenir.")
+
+    def reprendre(self):
+        # Reprise d'une partie après un redémarrage du client, selon l'étape où elle en est
+        self.game_id = self.reprise['game_id']
+        player_team = self.reprise['player_team']
+        etat = self.reprise['etat']
+        self.mode = 'host' if player_team == 'equipe1' else 'join'
+        if etat['status'] == 'waiting_player2':
+            return self.attendre_adversaire()
+        selection = TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team=player_team)
+        if etat['status'] == 'waiting_teams' and not etat[player_team]:
+            return selection
+        if etat['status'] != 'ongoing':
+            return selection.attendre_equipes()
+        # Partie en cours : le GamePanel part de l'instantané, sans relire l'état complet
+        jeu = Jeu()
+        jeu.mettre_a_jour(etat)
+        panneau = GamePanel(jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=player_team)
+        panneau.appliquer_etat(etat)
+        print("Partie reprise !")
+        return panneau
+
+    def attendre_adversaire(self):
+        # L'hôte attend qu'un second joueur rejoigne la partie (Ctrl+C pour annuler)
+        print("En attente d’un second joueur... (Ctrl+C pour annuler)")
+        version = None
+        try:
+            while True:
+                response = api.etat(self.game_id, version)
+                if response.status_code != 200:
+                    print("Erreur lors de la récupération de l’état")
+                    return True
+                game = api.donnees(response)
+                if game['status'] == 'waiting_teams':
+                    print("Un joueur a rejoint ! Veuillez sélectionner votre équipe.")
+                    return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team='equipe1')
+                version = game['version']
+        except KeyboardInterrupt:
+            # Partie retirée du lobby et de la file du matchmaking
+            api.leave_game(self.game_id, self.player_id)
+            print("\nPartie annulée.")
+            return True
 
     def handle_input(self, choice):
         if choice == 'r':
             return False
+        if choice == 'a':
+            self.actualiser_reprise()
+            return True
         try:
             choice = int(choice)
             if choice == 1:
                 self.mode = 'host'
-                response = requests.post(f"{SERVER_URL}/create_game", json={'player_id': self.player_id})
+                response = api.create_game(self.player_id)
                 if response.status_code != 200:
                     print(f"Erreur : {response.json()['error']}")
                     return True
                 self.game_id = response.json()['game_id']
                 print(f"Partie créée avec l’ID : {self.game_id}")
-                print("En attente d’un second joueur...")
-                while True:
-                    response = requests.get(f"{SERVER_URL}/game_state/{self.game_id}")
-                    if response.status_code != 200:
-                        print("Erreur lors de la récupération de l’état")
-                        return True
-                    game = response.json()
-                    if game['status'] == 'waiting_teams':
-                        print("Un joueur a rejoint ! Veuillez sélectionner votre équipe.")
-                        return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team='equipe1')
-                    time.sleep(0.5)
+                return self.attendre_adversaire()
             elif choice == 2:
                 self.mode = 'join'
                 self.game_id = input("Entrez l’ID de la partie : ").strip()
-                response = requests.post(f"{SERVER_URL}/join_game", json={'game_id': self.game_id, 'player_id': self.player_id})
+                response = api.join_game(self.game_id, self.player_id)
                 if response.status_code != 200:
                     print(f"Erreur : {response.json()['error']}")
                     return True
                 print("Partie rejointe ! Veuillez sélectionner votre équipe.")
                 return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team='equipe2')
+            elif choice == 3:
+                self.mode = 'host'
+                response = api.create_game(self.player_id)
+                if response.status_code != 200:
+                    print(f"Erreur : {response.json()['error']}")
+                    return True
+                self.game_id = response.json()['game_id']
+                response = api.add_bot(self.game_id, self.player_id)
+                if response.status_code != 200:
+                    print(f"Erreur : {response.json()['error']}")
+                    return True
+                print(response.json()['message'])
+                return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team='equipe1')
+            elif choice == 4:
+                # Le serveur apparie avec le plus ancien joueur en attente, ou nous met en file
+                response = api.matchmaking(self.player_id)
+                if response.status_code != 200:
+                    print(f"Erreur : {response.json()['error']}")
+                    return True
+                self.game_id = response.json()['game_id']
+                if response.json()['player_team'] == 'equipe1':
+                    self.mode = 'host'
+                    return self.attendre_adversaire()
+                self.mode = 'join'
+                print("Adversaire trouvé ! Veuillez sélectionner votre équipe.")
+                return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=self.game_id, player_team='equipe2')
+            elif choice == 5:
+                return LobbyPanel(self.player_id)
+            elif choice == 6 and self.reprise:
+                return self.reprendre()
             else:
                 print("Choix invalide.")
         except ValueError:
             print("Entrée invalide. Veuillez entrer un numéro ou 'r'.")
         return True
 
+class LobbyPanel:
+    # Liste paginée des parties en attente d'un second joueur
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.page = 1
+        self.parties = []
+        self.total = 0
+        self.par_page = 0
+
+    def display(self):
+        clear_screen()
+        try:
+            response = api.lobby(self.page, player_id=self.player_id)
+        except requests.RequestException as e:
+            print(f"Erreur de connexion au serveur : {e}")
+            self.parties = []
+            print("\n'a' pour réessayer, ou 'r' pour revenir.")
+            return
+        if response.status_code != 200:
+            print(f"Erreur : {response.json()['error']}")
+            return
+        data = response.json()
+        self.parties, self.total, self.par_page = data['parties'], data['total'], data['par_page']
+        pages = max(1, -(-self.total // self.par_page))
+        print(f"\n{'='*50}")
+        print(f"Parties ouvertes - page {self.page}/{pages}".center(50))
+        print(f"{'='*50}\n")
+        if not self.parties:
+            print("Aucune partie en attente d'adversaire.")
+        for i, partie in enumerate(self.parties, 1):
+            print(f"{i}. Partie {partie['game_id']}")
+        print("-"*50)
+        print("\nEntrez le numéro d'une partie pour la rejoindre, 's' page suivante, 'p' page précédente,")
+        print("'a' pour actualiser, ou 'r' pour revenir.")
+
+    def handle_input(self, choice):
+        if choice == 'r':
+            return OnlineGameModePanel()
+        if choice == 's':
+            if self.page * self.par_page < self.total:
+                self.page += 1
+            return True
+        if choice == 'p':
+            self.page = max(1, self.page - 1)
+            return True
+        if choice == 'a':
+            return True
+        try:
+            choix = int(choice)
+            if not 1 <= choix <= len(self.parties):
+                print("Choix invalide.")
+                return True
+            game_id = self.parties[choix - 1]['game_id']
+            response = api.join_game(game_id, self.player_id)
+            if response.status_code != 200:
+                print(f"Erreur : {response.json()['error']}")
+                return True
+            print("Partie rejointe ! Veuillez sélectionner votre équipe.")
+            return TeamSelectionPanel(mode='online', player_id=self.player_id, game_id=game_id, player_team='equipe2')
+        except ValueError:
+            print("Entrée invalide.")
+        return True
+
 class MapSelectionPanel:
     def __init__(self, jeu, mode='local', player_id=None, game_id=None, player_team=None):
         self.jeu = jeu
@@ -493,7 +732,8 @@ class MapSelectionPanel:
 
     def handle_input(self, choice):
         if choice == 'r':
-            return TeamSelectionPanel(mode=self.mode, player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
+            return TeamSelectionPanel(mode=self.mode, player_id=self.player_id, game_id=self.game_id, player_team=self.player_team,
+                                      adversaire_ia=self.jeu.ia is not None)
         try:
             choix = int(choice)
             if 1 <= choix <= len(self.maps):
@@ -503,16 +743,15 @@ class MapSelectionPanel:
                     if self.player_team != 'equipe1':
                         print("Seul le joueur 1 peut sélectionner la carte.")
                         return True
-                    response = requests.post(f"{SERVER_URL}/submit_map", json={
-                        'game_id': self.game_id,
-                        'player_id': self.player_id,
-                        'map': self.jeu.map
-                    })
+                    response = api.submit_map(self.game_id, self.player_id, self.jeu.map)
                     if response.status_code != 200:
                         print(f"Erreur : {response.json()['error']}")
                         return True
                     print(response.json()['message'])
                     return GamePanel(self.jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
+                # Emplacement de sauvegarde : saves/<nom>.journal, un même nom remplace l'ancienne partie
+                nom = input("Nom de l'emplacement de sauvegarde (Entrée : automatique) : ")
+                self.jeu.emplacement = SauvegardeJeu.fichier(nom)
                 return GamePanel(self.jeu, mode='local')
             else:
                 print(f"Veuillez entrer un nombre entre 1 et {len(self.maps)}.")
@@ -522,8 +761,9 @@ class MapSelectionPanel:
         return True
 
 class TeamSelectionPanel:
-    def __init__(self, mode='local', player_id=None, game_id=None, player_team=None):
+    def __init__(self, mode='local', player_id=None, game_id=None, player_team=None, adversaire_ia=False):
         self.jeu = Jeu()
+        self.adversaire_ia = adversaire_ia
         self.current_player = "Joueur 1" if player_team == 'equipe1' else "Joueur 2"
         self.equipes_disponibles = list(Jeu.EQUIPES_PERSONNAGES.keys())
         self.equipe_choisie = None
@@ -535,7 +775,8 @@ class TeamSelectionPanel:
     def display(self):
         clear_screen()
         print(f"\n{'='*50}")
-        print(f"Mode {'En ligne' if self.mode == 'online' else 'Classique'} - Sélection de l'équipe pour {self.current_player}".center(50))
+        nom_mode = 'En ligne' if self.mode == 'online' else ("Contre l'ordinateur" if self.adversaire_ia else 'Classique')
+        print(f"Mode {nom_mode} - Sélection de l'équipe pour {self.current_player}".center(50))
         print(f"{'='*50}\n")
         print("Choisissez une équipe prédéfinie :")
         print("-"*50)
@@ -547,6 +788,35 @@ class TeamSelectionPanel:
         print("-"*50)
         print("\nEntrez le numéro de l'équipe (1-{})".format(len(self.equipes_disponibles)))
 
+    def attendre_equipes(self):
+        # En ligne, une fois notre équipe soumise : attend celle de l'adversaire, puis la carte
+        print("En attente de l’autre joueur...")
+        version = None
+        while True:
+            response = api.etat(self.game_id, version)
+            if response.status_code != 200:
+                print(f"Erreur : {response.json()['error']}")
+                return True
+            game = api.donnees(response)
+            version = game['version']
+            if game['status'] in ('waiting_map', 'ongoing'):
+                self.jeu.equipe1 = Equipe.from_dict(game['equipe1'])
+                self.jeu.equipe2 = Equipe.from_dict(game['equipe2'])
+                if self.player_team == 'equipe1':
+                    return MapSelectionPanel(self.jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
+                else:
+                    print("En attente de la sélection de la carte par le Joueur 1...")
+                    game_state = game
+                    while game_state['status'] != 'ongoing':
+                        response = api.etat(self.game_id, version)
+                        if response.status_code != 200:
+                            print(f"Erreur : {response.json()['error']}")
+                            return True
+                        game_state = api.donnees(response)
+                        version = game_state['version']
+                    self.jeu.map = game_state['map']
+                    return GamePanel(self.jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
+
     def handle_input(self, choice):
         try:
             choix = int(choice)
@@ -555,42 +825,22 @@ class TeamSelectionPanel:
                 equipe = self.jeu.selectionner_equipe(self.current_player, equipe_choisie=self.equipe_choisie)
                 equipe.nom = self.equipe_choisie
                 if self.mode == 'online':
-                    response = requests.post(f"{SERVER_URL}/submit_team", json={
-                        'game_id': self.game_id,
-                        'player_id': self.player_id,
-                        'equipe': equipe.to_dict()
-                    })
+                    response = api.submit_team(self.game_id, self.player_id, equipe.to_dict())
                     if response.status_code != 200:
                         print(f"Erreur : {response.json()['error']}")
                         return True
                     print(response.json()['message'])
-                    print("En attente de l’autre joueur...")
-                    while True:
-                        response = requests.get(f"{SERVER_URL}/game_state/{self.game_id}")
-                        if response.status_code != 200:
-                            print(f"Erreur : {response.json()['error']}")
-                            return True
-                        game = response.json()
-                        if game['status'] == 'waiting_map':
-                            self.jeu.equipe1 = Equipe.from_dict(game['equipe1'])
-                            self.jeu.equipe2 = Equipe.from_dict(game['equipe2'])
-                            if self.player_team == 'equipe1':
-                                return MapSelectionPanel(self.jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
-                            else:
-                                print("En attente de la sélection de la carte par le Joueur 1...")
-                                while True:
-                                    response = requests.get(f"{SERVER_URL}/game_state/{self.game_id}")
-                                    if response.status_code != 200:
-                                        print(f"Erreur : {response.json()['error']}")
-                                        return True
-                                    game_state = response.json()
-                                    if game_state['status'] == 'ongoing':
-                                        self.jeu.map = game_state['map']
-                                        return GamePanel(self.jeu, mode='online', player_id=self.player_id, game_id=self.game_id, player_team=self.player_team)
-                                    time.sleep(0.5)
-                        time.sleep(0.5)
+                    return self.attendre_equipes()
                 else:
-                    if self.current_player == "Joueur 1":
+                    if self.current_player == "Joueur 1" and self.adversaire_ia:
+                        # L'ordinateur prend une autre équipe et joue en second
+                        self.jeu.equipe1 = equipe
+                        autre = next((e for e in self.equipes_disponibles if e != self.equipe_choisie), self.equipe_choisie)
+                        self.jeu.equipe2 = self.jeu.selectionner_equipe("Ordinateur", equipe_choisie=autre)
+                        self.jeu.initialiser_jeu(self.jeu.equipe1, self.jeu.equipe2)
+                        self.jeu.ia = IA(BUDGET_IA)
+                        return MapSelectionPanel(self.jeu, mode='local')
+                    elif self.current_player == "Joueur 1":
                         self.jeu.equipe1 = equipe
                         self.current_player = "Joueur 2"
                         return True
@@ -692,49 +942,106 @@ class GamePanel:
         self.game_id = game_id
         self.player_team = player_team
         self.last_action_message = None
+        self.version = None
+        self.statut = None
+        self.equipe_active_nom = None
+
+    def synchroniser(self, attente=ATTENTE_LONG_POLL):
+        # Premier appel : état complet. Ensuite seulement les changements depuis self.version,
+        # appliqués sur le Jeu local. Renvoie None en cas d'erreur, False si rien n'a changé.
+        response = api.etat(self.game_id, self.version, delta=True, attente=attente)
+        if response.status_code != 200:
+            print(f"Erreur : {response.json()['error']}")
+            return None
+        data = api.donnees(response)
+        if self.version is None:
+            self.appliquer_etat(data)
+            return True
+        if data['version'] == self.version:
+            return False
+        self.jeu.appliquer_delta(data)
+        self.statut = data['champs'].get('status', self.statut)
+        self.equipe_active_nom = data['champs'].get('equipe_active_nom', self.equipe_active_nom)
+        self.version = data['version']
+        return True
+
+    def appliquer_etat(self, data):
+        # État complet (premier appel, ou instantané reçu de /resume)
+        self.jeu.mettre_a_jour(data)
+        self.statut = data['status']
+        self.equipe_active_nom = data['equipe_active_nom']
+        self.version = data['version']
+
+    def est_notre_tour(self):
+        return (
+            (self.player_team == 'equipe1' and self.equipe_active_nom == self.jeu.equipe1.nom) or
+            (self.player_team == 'equipe2' and self.equipe_active_nom == self.jeu.equipe2.nom)
+        )
+
+    def appliquer_evenement(self, evenement):
+        donnees = evenement['data']
+        if evenement['type'] == 'coup':
+            self.last_action_message = donnees['message']
+        if evenement['id'] != self.version + 1:
+            # Événement(s) manqué(s) : on rattrape l'état complet via le delta
+            return self.synchroniser(attente=0) is not None
+        if evenement['type'] == 'coup':
+            for p in donnees['personnages']:
+                getattr(self.jeu, p['equipe']).personnages[p['index']].mettre_a_jour(p)
+            self.jeu.tour_actuel = donnees['tour_actuel']
+            self.jeu.stats = donnees['stats']
+            self.equipe_active_nom = donnees['equipe_active_nom']
+            self.jeu.definir_equipe_active(self.equipe_active_nom)
+        self.statut = donnees['status']
+        self.version = evenement['id']
+        return True
 
     def display(self):
         if self.mode == 'online':
-            response = requests.get(f"{SERVER_URL}/game_state/{self.game_id}")
-            if response.status_code != 200:
-                print(f"Erreur : {response.json()['error']}")
-                return True
-            game_state = response.json()
-            self.jeu = Jeu.from_dict(game_state)
-
-            if game_state['status'] == 'waiting_player2':
-                print("En attente d’un second joueur...")
-                time.sleep(0.5)
-                return True
-            if game_state['status'] == 'waiting_teams':
-                print("En attente de la sélection des équipes...")
-                time.sleep(0.5)
+            if self.synchroniser(attente=0) is None:
                 return True
-            if game_state['status'] == 'waiting_map' and self.player_team != 'equipe1':
-                print("En attente de la sélection de la carte par le Joueur 1...")
-                time.sleep(0.5)
-                return True
-            if game_state['status'] == 'finished':
-                self.afficher_vainqueur(game_state)
-                return False
-
-            is_player_turn = (
-                (self.player_team == 'equipe1' and game_state['equipe_active_nom'] == self.jeu.equipe1.nom) or
-                (self.player_team == 'equipe2' and game_state['equipe_active_nom'] == self.jeu.equipe2.nom)
-            )
-
-            self.jeu.afficher_etat()
-            if is_player_turn:
-                print("🎮 À votre tour ! Choisissez un personnage, une action et une cible.")
-            else:
-                print(f"⏳ En attente du tour de l’équipe {game_state['equipe_active_nom']}...")
-            if self.last_action_message:
-                print(f"\nDernière action : {self.last_action_message}")
+            # Le serveur pousse les coups adverses (SSE) : plus de boucle sur /game_state
+            flux = None
+            try:
+                while True:
+                    if self.statut == 'finished':
+                        self.afficher_vainqueur(self.jeu.to_dict())
+                        return False
+                    if self.statut == 'waiting_player2':
+                        print("En attente d’un second joueur...")
+                    elif self.statut == 'waiting_teams':
+                        print("En attente de la sélection des équipes...")
+                    elif self.statut == 'waiting_map' and self.player_team != 'equipe1':
+                        print("En attente de la sélection de la carte par le Joueur 1...")
+                    else:
+                        is_player_turn = self.est_notre_tour()
+                        self.jeu.afficher_etat()
+                        if is_player_turn:
+                            print("🎮 À votre tour ! Choisissez un personnage, une action et une cible.")
+                        else:
+                            print(f"⏳ En attente du tour de l’équipe {self.equipe_active_nom}...")
+                        if self.last_action_message:
+                            print(f"\nDernière action : {self.last_action_message}")
+                        if is_player_turn:
+                            return True
 
-            if not is_player_turn:
-                time.sleep(0.5)
-                return True
-            return True
+                    if flux is None:
+                        flux = api.evenements(self.game_id, self.version)
+                    try:
+                        evenement = next(flux, None)
+                    except requests.RequestException as e:
+                        print(f"Erreur de connexion : {e}")
+                        return True
+                    if evenement is None:
+                        # Flux fermé par le serveur : on resynchronise puis on se réabonne
+                        flux = None
+                        if self.synchroniser(attente=0) is None:
+                            return True
+                    elif not self.appliquer_evenement(evenement):
+                        return True
+            finally:
+                if flux is not None:
+                    flux.close()
         else:
             self.jeu.tour_de_jeu()
             return True
@@ -767,23 +1074,15 @@ class GamePanel:
 
     def handle_input(self, choice):
         if self.mode == 'online':
-            response = requests.get(f"{SERVER_URL}/game_state/{self.game_id}")
-            if response.status_code != 200:
-                print(f"Erreur : {response.json()['error']}")
+            if self.synchroniser(attente=0) is None:
                 return True
-            game_state = response.json()
-            self.jeu = Jeu.from_dict(game_state)
 
-            if game_state['status'] == 'finished':
-                self.afficher_vainqueur(game_state)
+            if self.statut == 'finished':
+                self.afficher_vainqueur(self.jeu.to_dict())
                 return False
 
-            is_player_turn = (
-                (self.player_team == 'equipe1' and game_state['equipe_active_nom'] == self.jeu.equipe1.nom) or
-                (self.player_team == 'equipe2' and game_state['equipe_active_nom'] == self.jeu.equipe2.nom)
-            )
-            if not is_player_turn:
-                print(f"Ce n’est pas votre tour ! En attente de l’équipe {game_state['equipe_active_nom']}.")
+            if not self.est_notre_tour():
+                print(f"Ce n’est pas votre tour ! En attente de l’équipe {self.equipe_active_nom}.")
                 return True
 
             personnage = self.jeu.choisir_personnage()
@@ -796,26 +1095,14 @@ class GamePanel:
                 print("Aucune cible disponible !")
                 return True
 
-            personnage_index = self.jeu.equipe_active.membres_vivants().index(personnage)
-            action_key = None
-            for k, (nom_action, func) in personnage.get_actions().items():
-                if func.__name__ == action.__name__:
-                    action_key = k
-                    break
-            if not action_key:
-                print("Erreur : Action non trouvée.")
-                return True
+            # Le serveur indexe la liste complète des personnages (morts compris)
+            personnage_index = self.jeu.equipe_active.personnages.index(personnage)
+            action_key = spec_action(action).cle
 
-            cible_equipe = self.jeu.equipe_active if action == Druide.soin_puissant else self.jeu.equipe_inactive
-            cible_index = cible_equipe.membres_vivants().index(cible)
+            cible_equipe = self.jeu.equipe_active if spec_action(action).cible == 'allie' else self.jeu.equipe_inactive
+            cible_index = cible_equipe.personnages.index(cible)
 
-            response = requests.post(f"{SERVER_URL}/make_move", json={
-                'game_id': self.game_id,
-                'player_id': self.player_id,
-                'personnage_index': personnage_index,
-                'action_key': action_key,
-                'cible_index': cible_index
-            })
+            response = api.make_move(self.game_id, self.player_id, personnage_index, action_key, cible_index)
             if response.status_code != 200:
                 print(f"Erreur : {response.json()['error']}")
                 return True
@@ -834,21 +1121,12 @@ class GamePanel:
             return True
 
 class Jeu:
+    __slots__ = ('equipe1', 'equipe2', 'tour_actuel', 'equipe_active', 'equipe_inactive', 'map', 'stats', 'ia',
+                 'dernier_coup', 'coups_journal', 'graine', 'emplacement')
+
     EQUIPES_PERSONNAGES = {
-        "Pilules Bleues": [
-            ("Natasha", Druide, 90, "bouche"),
-            ("Collette", Druide, 90, "seringue"),
-            ("Dr. Colon", Warrior, 130, "coloscope"),
-            ("Bruno le Clown", Archer, 85, "ballon"),
-            ("Dr. Morbide", Warrior, 130, "mains")
-        ],
-        "4 Fantastiques et Demi": [
-            ("Tic-Tac Man", Warrior, 130, "tronc"),
-            ("UK", Warrior, 130, "crâne"),
-            ("Tony Start", Warrior, 130, "pile électrique"),
-            ("Sbaver-Man", Druide, 90, "salive"),
-            ("L'oeil de con", Archer, 85, "arc")
-        ]
+        nom_equipe: [(nom, CLASSES[classe], pv, arme) for nom, classe, pv, arme in membres]
+        for nom_equipe, membres in EQUIPES.items()
     }
 
     def __init__(self):
@@ -862,6 +1140,16 @@ class Jeu:
             "equipe1": {"degats_infliges": 0, "soins_effectues": 0, "morts": 0},
             "equipe2": {"degats_infliges": 0, "soins_effectues": 0, "morts": 0}
         }
+        # Joueur artificiel de l'équipe 2 (partie contre l'ordinateur), sinon None
+        self.ia = None
+        # Dernier coup joué, tel qu'il sera écrit dans le journal de sauvegarde
+        self.dernier_coup = None
+        # Coups écrits dans le journal depuis le dernier instantané (None : journal pas commencé)
+        self.coups_journal = None
+        # Graine de la partie, sauvegardée avec elle : tirages reproductibles (voir rng_coup)
+        self.graine = random.getrandbits(64)
+        # Fichier de sauvegarde dans saves/ (ex. partie.journal), nommé au premier coup sinon
+        self.emplacement = None
 
     def selectionner_equipe(self, joueur="Joueur", equipe_choisie=None):
         if equipe_choisie is None:
@@ -925,11 +1213,16 @@ class Jeu:
             "equipe_active_nom": self.equipe_active.nom if self.equipe_active else None,
             "map": self.map,
             "save_name": f"Partie_{self.tour_actuel}",
-            "stats": self.stats
+            "stats": self.stats,
+            "adversaire_ia": self.ia is not None,
+            "graine": self.graine
         }
 
     @staticmethod
     def from_dict(data):
+        # data : dictionnaire (to_dict), ou octets au format binaire
+        if isinstance(data, bytes):
+            data = binaire.decoder(data, personnage=Personnage.depuis_champs)
         jeu = Jeu()
         jeu.equipe1 = Equipe.from_dict(data["equipe1"]) if data["equipe1"] else None
         jeu.equipe2 = Equipe.from_dict(data["equipe2"]) if data["equipe2"] else None
@@ -939,14 +1232,83 @@ class Jeu:
             "equipe1": {"degats_infliges": 0, "soins_effectues": 0, "morts": 0},
             "equipe2": {"degats_infliges": 0, "soins_effectues": 0, "morts": 0}
         })
-        if jeu.equipe1 and data["equipe_active_nom"] == jeu.equipe1.nom:
-            jeu.equipe_active = jeu.equipe1
-            jeu.equipe_inactive = jeu.equipe2
-        elif jeu.equipe2:
-            jeu.equipe_active = jeu.equipe2
-            jeu.equipe_inactive = jeu.equipe1
+        jeu.definir_equipe_active(data["equipe_active_nom"])
+        if data.get("adversaire_ia"):
+            jeu.ia = IA(BUDGET_IA)
+        # Anciennes sauvegardes : nouvelle graine
+        jeu.graine = data.get("graine", jeu.graine)
         return jeu
 
+    def mettre_a_jour(self, data):
+        # Applique un état complet du serveur sans recréer équipes et personnages
+        self.equipe1 = Equipe.synchroniser(self.equipe1, data["equipe1"])
+        self.equipe2 = Equipe.synchroniser(self.equipe2, data["equipe2"])
+        self.tour_actuel = data["tour_actuel"]
+        self.map = data["map"]
+        if "stats" in data:
+            self.stats = data["stats"]
+        self.definir_equipe_active(data["equipe_active_nom"])
+
+    def rng_coup(self):
+        # Un coup par tour : le numéro du tour identifie le coup
+        return rng_coup(self.graine, self.tour_actuel)
+
+    def position(self, perso):
+        # ('equipe1' ou 'equipe2', index) d'un personnage
+        cle = "equipe1" if perso in self.equipe1.personnages else "equipe2"
+        return cle, getattr(self, cle).personnages.index(perso)
+
+    def noter_coup(self, acteur, action_key, cible, resultat):
+        # Appelé par Personnage.executer : le coup, ses tirages et les PV qui en résultent
+        self.dernier_coup = {
+            "type": "coup",
+            "acteur": list(self.position(acteur)),
+            "action": action_key,
+            "cible": list(self.position(cible)),
+            "critique": resultat.critique,
+            "degats": resultat.degats,
+            "contrecoup": resultat.contrecoup,
+            "soins": resultat.soins,
+            "personnages": [[*self.position(p), p.pv, p.vivant] for p in (acteur, cible)],
+        }
+
+    def appliquer_coup(self, coup):
+        # Rejoue un coup du journal (PV obtenus, statistiques, tour suivant)
+        for cle, index, pv, vivant in coup["personnages"]:
+            perso = getattr(self, cle).personnages[index]
+            perso.pv = pv
+            perso.vivant = vivant
+        self.stats = coup["stats"]
+        self.tour_actuel = coup["tour_actuel"]
+        self.definir_equipe_active(coup["equipe_active_nom"])
+
+    def definir_equipe_active(self, nom):
+        if self.equipe1 and nom == self.equipe1.nom:
+            self.equipe_active = self.equipe1
+            self.equipe_inactive = self.equipe2
+        elif self.equipe2:
+            self.equipe_active = self.equipe2
+            self.equipe_inactive = self.equipe1
+
+    def appliquer_delta(self, delta):
+        # Applique une réponse delta du serveur (/game_state?since=...&delta=1) sur place
+        champs = delta["champs"]
+        nom_actif = self.equipe_active.nom if self.equipe_active else None
+        for cle in ("equipe1", "equipe2"):
+            if cle in champs:
+                setattr(self, cle, Equipe.synchroniser(getattr(self, cle), champs[cle]))
+        for cle, modifies in delta["personnages"].items():
+            personnages = getattr(self, cle).personnages
+            for index, valeurs in modifies.items():
+                personnages[int(index)].mettre_a_jour(valeurs)
+        if "tour_actuel" in champs:
+            self.tour_actuel = champs["tour_actuel"]
+        if "map" in champs:
+            self.map = champs["map"]
+        if "stats" in champs:
+            self.stats = champs["stats"]
+        self.definir_equipe_active(champs.get("equipe_active_nom", nom_actif))
+
     def changer_tour(self):
         self.tour_actuel += 1
         self.equipe_active, self.equipe_inactive = self.equipe_inactive, self.equipe_active
@@ -999,8 +1361,7 @@ class Jeu:
                 print(f"Veuillez entrer un choix valide ({', '.join(actions.keys())}")
 
     def choisir_cible(self, action):
-        actions_soin = [Druide.soin_puissant]
-        if action in actions_soin:
+        if spec_action(action).cible == 'allie':
             cibles = self.equipe_active.membres_vivants()
             equipe_cible = self.equipe_active
             cible_type = "allié"
@@ -1026,25 +1387,41 @@ class Jeu:
             except ValueError:
                 print("Veuillez entrer un nombre valide")
 
+    def coup_ordinateur(self):
+        # Coup de l'IA pour l'équipe active, traduit en (personnage, méthode d'action, cible)
+        personnage_index, action_key, cible_index = self.ia.choisir_coup(
+            self.equipe_active.to_dict(), self.equipe_inactive.to_dict()
+        )
+        personnage = self.equipe_active.personnages[personnage_index]
+        action = personnage.get_actions()[action_key][1]
+        cible_equipe = self.equipe_active if spec_action(action).cible == 'allie' else self.equipe_inactive
+        return personnage, action, cible_equipe.personnages[cible_index]
+
     def tour_de_jeu(self):
         self.afficher_etat()
-        personnage = self.choisir_personnage()
-        if not personnage:
-            print("Pas de personnage disponible.")
-            return
-        action = self.choisir_action(personnage)
-        cible = self.choisir_cible(action)
-        if not cible:
-            print("Aucune cible disponible.")
-            return
+        if self.ia is not None and self.equipe_active is self.equipe2:
+            print(f"🤖 L'ordinateur réfléchit pour l'équipe {self.equipe_active.nom}...")
+            personnage, action, cible = self.coup_ordinateur()
+        else:
+            personnage = self.choisir_personnage()
+            if not personnage:
+                print("Pas de personnage disponible.")
+                return
+            action = self.choisir_action(personnage)
+            cible = self.choisir_cible(action)
+            if not cible:
+                print("Aucune cible disponible.")
+                return
         clear_screen()
         self.afficher_etat()
+        if self.coups_journal is None:
+            SauvegardeJeu.sauvegarder(self)
         resultat = action(cible, self)
         print("\nRésultat de l’action:")
         print(resultat)
-        SauvegardeJeu.sauvegarder(self)
-        input("\nAppuyez sur Entrée pour continuer...")
         self.changer_tour()
+        SauvegardeJeu.enregistrer_coup(self)
+        input("\nAppuyez sur Entrée pour continuer...")
 
     def est_termine(self):
         return not self.equipe1.est_vivante() or not self.equipe2.est_vivante()
@@ -1078,27 +1455,308 @@ class Jeu:
             print("Merci d'avoir joué !")
             return False
 
+class EcrivainSauvegardes:
+    # Thread d'écriture des sauvegardes : le tour de jeu ne fait que mettre en file des
+    # entrées déjà sérialisées (octets) et n'attend jamais le disque. Les écritures en attente d'un
+    # même fichier sont regroupées en une seule ; un nouveau journal (remplacer=True)
+    # annule les ajouts encore en attente de l'ancien.
+    def __init__(self):
+        self.condition = threading.Condition()
+        # {chemin: {'remplacer': bool, 'lignes': [octets], 'index': (etat, tour) ou None}}
+        self.en_attente = {}
+        self.en_cours = False
+        self.thread = None
+
+    def ecrire(self, chemin, lignes, index=None, remplacer=False):
+        with self.condition:
+            attente = self.en_attente.get(chemin)
+            if attente is None or remplacer:
+                attente = self.en_attente[chemin] = {'remplacer': remplacer, 'lignes': [], 'index': None}
+            attente['lignes'].extend(lignes)
+            if index is not None:
+                attente['index'] = index
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._boucle, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def vider(self):
+        # Attend que tout ce qui a été mis en file soit sur le disque
+        with self.condition:
+            while self.en_attente or self.en_cours:
+                self.condition.wait()
+
+    def _boucle(self):
+        while True:
+            with self.condition:
+                while not self.en_attente:
+                    self.condition.wait()
+                lot, self.en_attente = self.en_attente, {}
+                self.en_cours = True
+            try:
+                for chemin, attente in lot.items():
+                    try:
+                        self._ecrire(chemin, attente)
+                    except Exception as e:
+                        # Une sauvegarde en échec ne doit ni arrêter le thread ni bloquer
+                        # vider() (appelé à la sortie et avant chaque lecture des sauvegardes)
+                        print(f"❌ Erreur lors de la sauvegarde : {e}")
+            finally:
+                with self.condition:
+                    self.en_cours = False
+                    self.condition.notify_all()
+
+    def _ecrire(self, chemin, attente):
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        donnees = b"".join(attente['lignes'])
+        if attente['remplacer']:
+            # Écriture dans un fichier temporaire puis renommage : l'ancienne sauvegarde
+            # reste intacte tant que la nouvelle n'est pas complète sur le disque
+            temporaire = chemin + ".tmp"
+            with open(temporaire, 'wb') as f:
+                f.write(donnees)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporaire, chemin)
+        else:
+            # Ajout en fin de journal : une entrée interrompue est coupée au chargement
+            with open(chemin, 'ab') as f:
+                f.write(donnees)
+        if attente['index'] is not None:
+            IndexSauvegardes.mettre_a_jour(chemin, *attente['index'])
+
+ecrivain_sauvegardes = EcrivainSauvegardes()
+atexit.register(ecrivain_sauvegardes.vider)
+
 class SauvegardeJeu:
-    FICHIER_SAUVEGARDE = "saves/sauvegarde_jeu.json"
+    # Journal de la partie, une ligne JSON par entrée, uniquement complété en fin de fichier :
+    # un instantané complet au début, puis un coup par tour (quelques centaines d'octets),
+    # et un nouvel instantané tous les INTERVALLE_INSTANTANE coups.
+    # Chargement : dernier instantané + coups suivants. Le journal complet permet de revoir
+    # la partie, et une ligne tronquée par un arrêt brutal est simplement ignorée.
+    # Un journal par emplacement nommé : saves/<emplacement>.journal. Les écritures passent
+    # par ecrivain_sauvegardes (thread d'écriture).
+    # ASSISTES_FORMAT_SAUVEGARDE=binaire : nouveaux journaux au format binaire (.jbin,
+    # enregistrements de binaire.py, plusieurs fois plus petits). Une partie chargée
+    # continue dans le format de son fichier.
+    DOSSIER = "saves"
+    EMPLACEMENT_DEFAUT = "sauvegarde_jeu"
+    INTERVALLE_INSTANTANE = 20
+    FORMAT = os.environ.get('ASSISTES_FORMAT_SAUVEGARDE', 'json')
+    EXTENSIONS = {'json': '.journal', 'binaire': '.jbin'}
+    JOURNAUX = tuple(EXTENSIONS.values())
+
+    @staticmethod
+    def fichier(nom):
+        # Nom saisi -> nom de fichier sûr (vide : nom daté), avec l'extension du format
+        nom = re.sub(r"[^\w-]+", "_", nom.strip()).strip("_")
+        return (nom or time.strftime("partie_%Y%m%d_%H%M%S")) + SauvegardeJeu.EXTENSIONS[SauvegardeJeu.FORMAT]
+
+    @staticmethod
+    def chemin(emplacement=None):
+        return os.path.join(SauvegardeJeu.DOSSIER, emplacement or SauvegardeJeu.fichier(SauvegardeJeu.EMPLACEMENT_DEFAUT))
+
+    @staticmethod
+    def _ligne(entree, chemin):
+        if chemin.endswith('.jbin'):
+            return binaire.enregistrement(entree)
+        return (json.dumps(entree, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
 
     @staticmethod
     def sauvegarder(jeu):
-        os.makedirs(os.path.dirname(SauvegardeJeu.FICHIER_SAUVEGARDE), exist_ok=True)
-        with open(SauvegardeJeu.FICHIER_SAUVEGARDE, 'w', encoding='utf-8') as f:
-            json.dump(jeu.to_dict(), f, indent=4)
+        # Commence un nouveau journal à partir de l'état courant (remplace celui de l'emplacement)
+        if jeu.emplacement is None:
+            jeu.emplacement = SauvegardeJeu.fichier("")
+        chemin = SauvegardeJeu.chemin(jeu.emplacement)
+        etat = jeu.to_dict()
+        ecrivain_sauvegardes.ecrire(chemin, [SauvegardeJeu._ligne({"type": "instantane", "etat": etat}, chemin)],
+                                    index=(etat, jeu.tour_actuel), remplacer=True)
+        jeu.coups_journal = 0
+
+    @staticmethod
+    def enregistrer_coup(jeu):
+        # Après chaque tour : le coup, l'état qui en résulte (stats, tour suivant)
+        chemin = SauvegardeJeu.chemin(jeu.emplacement)
+        lignes = [SauvegardeJeu._ligne({
+            **jeu.dernier_coup,
+            "stats": jeu.stats,
+            "tour_actuel": jeu.tour_actuel,
+            "equipe_active_nom": jeu.equipe_active.nom,
+        }, chemin)]
+        index = None
+        jeu.coups_journal += 1
+        if jeu.coups_journal >= SauvegardeJeu.INTERVALLE_INSTANTANE:
+            etat = jeu.to_dict()
+            lignes.append(SauvegardeJeu._ligne({"type": "instantane", "etat": etat}, chemin))
+            index = (etat, jeu.tour_actuel)
+            jeu.coups_journal = 0
+        ecrivain_sauvegardes.ecrire(chemin, lignes, index=index)
         print("💾 Sauvegarde effectuée.")
 
     @staticmethod
-    def charger():
+    def lire(chemin=None):
+        # Entrées valides du journal, dans l'ordre. Une fin de fichier incomplète (arrêt
+        # pendant une écriture) est coupée pour que les coups suivants s'ajoutent proprement.
+        ecrivain_sauvegardes.vider()
+        chemin = chemin or SauvegardeJeu.chemin()
+        entrees = []
+        valide = 0
+        with open(chemin, 'rb+') as f:
+            if chemin.endswith('.jbin'):
+                # Lecture en flux des enregistrements binaires
+                for entree, valide in binaire.lire_enregistrements(f):
+                    entrees.append(entree)
+                f.truncate(valide)
+                return entrees
+            for ligne in f:
+                if not ligne.endswith(b"\n"):
+                    break
+                try:
+                    entrees.append(json.loads(ligne))
+                except ValueError:
+                    break
+                valide += len(ligne)
+            f.truncate(valide)
+        return entrees
+
+    @staticmethod
+    def reconstruire(entrees):
+        # Jeu au dernier instantané, puis coups suivants rejoués
+        dernier = max(i for i, e in enumerate(entrees) if e["type"] == "instantane")
+        jeu = Jeu.from_dict(entrees[dernier]["etat"])
+        for coup in entrees[dernier + 1:]:
+            jeu.appliquer_coup(coup)
+        jeu.coups_journal = len(entrees) - dernier - 1
+        return jeu
+
+    @staticmethod
+    def rejouer(chemin=None):
+        # Revoir la partie : le Jeu après chaque coup depuis le premier instantané
+        entrees = SauvegardeJeu.lire(chemin)
+        jeu = Jeu.from_dict(entrees[0]["etat"])
+        for entree in entrees[1:]:
+            if entree["type"] == "coup":
+                jeu.appliquer_coup(entree)
+                yield jeu, entree
+
+    @staticmethod
+    def charger(emplacement=None):
         try:
-            with open(SauvegardeJeu.FICHIER_SAUVEGARDE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            jeu = SauvegardeJeu.reconstruire(SauvegardeJeu.lire(SauvegardeJeu.chemin(emplacement)))
+            # Les coups suivants s'ajoutent au même emplacement
+            jeu.emplacement = emplacement or SauvegardeJeu.fichier(SauvegardeJeu.EMPLACEMENT_DEFAUT)
             print("✅ Sauvegarde chargée avec succès.")
-            return Jeu.from_dict(data)
-        except FileNotFoundError:
+            return jeu
+        except (FileNotFoundError, ValueError):
             print("❌ Aucun fichier de sauvegarde trouvé.")
             return None
 
+class IndexSauvegardes:
+    # saves/index.json : {fichier: résumé} avec nom, tour, carte, équipes, date et taille
+    # de chaque sauvegarde. Le menu de chargement liste et trie les sauvegardes à partir
+    # de ce seul fichier. Une entrée dont la date ou la taille ne correspond plus au fichier
+    # (coups ajoutés depuis, sauvegarde copiée à la main...) est recalculée à la lecture.
+    DOSSIER = "saves"
+    FICHIER = "saves/index.json"
+
+    @staticmethod
+    def lire():
+        try:
+            with open(IndexSauvegardes.FICHIER, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def ecrire(index):
+        temporaire = IndexSauvegardes.FICHIER + ".tmp"
+        with open(temporaire, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temporaire, IndexSauvegardes.FICHIER)
+
+    @staticmethod
+    def resumer(etat, tour, chemin):
+        # Nom affiché : l'emplacement pour un journal, save_name pour l'ancien format
+        infos = os.stat(chemin)
+        fichier = os.path.basename(chemin)
+        return {
+            "nom": os.path.splitext(fichier)[0] if fichier.endswith(SauvegardeJeu.JOURNAUX) else etat.get("save_name", fichier),
+            "tour": tour,
+            "map": etat.get("map"),
+            "equipes": [etat[cle]["nom"] for cle in ("equipe1", "equipe2") if etat.get(cle)],
+            "mtime": infos.st_mtime,
+            "taille": infos.st_size,
+        }
+
+    @staticmethod
+    def resumer_fichier(chemin):
+        # Résumé lu dans la sauvegarde elle-même : pour un journal, seules la première
+        # ligne (instantané) et la dernière (tour courant) sont lues
+        if chemin.endswith('.jbin'):
+            # Journal binaire : seuls le premier et le dernier enregistrement sont décodés,
+            # les autres sont sautés grâce à leur taille
+            with open(chemin, 'rb') as f:
+                premiere, derniere = binaire.extremites(f)
+            if premiere is None:
+                raise ValueError("Journal binaire vide")
+            tour = derniere["etat"]["tour_actuel"] if derniere["type"] == "instantane" else derniere["tour_actuel"]
+            return IndexSauvegardes.resumer(premiere["etat"], tour, chemin)
+        if not chemin.endswith('.journal'):
+            with open(chemin, 'r') as f:
+                etat = json.load(f)
+            return IndexSauvegardes.resumer(etat, etat.get("tour_actuel"), chemin)
+        with open(chemin, 'rb') as f:
+            etat = json.loads(f.readline())["etat"]
+            f.seek(max(0, os.fstat(f.fileno()).st_size - 8192))
+            lignes = f.read().splitlines()
+        tour = etat.get("tour_actuel")
+        for ligne in reversed(lignes):
+            try:
+                derniere = json.loads(ligne)
+            except ValueError:
+                continue
+            tour = derniere["etat"]["tour_actuel"] if derniere["type"] == "instantane" else derniere["tour_actuel"]
+            break
+        return IndexSauvegardes.resumer(etat, tour, chemin)
+
+    @staticmethod
+    def mettre_a_jour(chemin, etat, tour):
+        # Après une écriture de SauvegardeJeu (thread d'écriture) : résumé de l'état écrit
+        index = IndexSauvegardes.lire()
+        index[os.path.basename(chemin)] = IndexSauvegardes.resumer(etat, tour, chemin)
+        IndexSauvegardes.ecrire(index)
+
+    @staticmethod
+    def lister():
+        # Index à jour : entrées des fichiers disparus retirées, entrées périmées recalculées
+        ecrivain_sauvegardes.vider()
+        if not os.path.exists(IndexSauvegardes.DOSSIER):
+            return {}
+        index = IndexSauvegardes.lire()
+        fichiers = {
+            f for f in os.listdir(IndexSauvegardes.DOSSIER)
+            if f.endswith(('.json',) + SauvegardeJeu.JOURNAUX) and f != os.path.basename(IndexSauvegardes.FICHIER)
+        }
+        modifie = False
+        for fichier in set(index) - fichiers:
+            del index[fichier]
+            modifie = True
+        for fichier in fichiers:
+            chemin = os.path.join(IndexSauvegardes.DOSSIER, fichier)
+            infos = os.stat(chemin)
+            entree = index.get(fichier)
+            if entree and entree["mtime"] == infos.st_mtime and entree["taille"] == infos.st_size:
+                continue
+            try:
+                index[fichier] = IndexSauvegardes.resumer_fichier(chemin)
+            except (OSError, ValueError, KeyError):
+                index[fichier] = {"nom": fichier, "tour": None, "map": None, "equipes": [],
+                                  "mtime": infos.st_mtime, "taille": infos.st_size}
+            modifie = True
+        if modifie:
+            IndexSauvegardes.ecrire(index)
+        return index
+
 def nouvelle_partie_locale():
     return LocalGameModePanel()
 
@@ -1137,7 +1795,6 @@ def display_main_menu(selected_option):
     print("\nUtilisez les touches 1-5 pour sélectionner une option.")
 
 def main():
-    random.seed(time.time())
     settings_panel = SettingsPanel()
     selected_option = 0
     current_panel = None
@@ -1165,17 +1822,21 @@ def main():
             except ValueError:
                 print("Entrée invalide. Veuillez entrer un numéro.")
         else:
-            current_panel.display()
-            if isinstance(current_panel, GamePanel) and current_panel.jeu and current_panel.jeu.est_termine():
-                result = current_panel.handle_input(None)
-                if result is not True:
-                    current_panel = result
-            else:
-                prompt = getattr(current_panel, 'input_prompt', "Entrez votre choix : ")
-                choice = input(prompt).strip()
-                result = current_panel.handle_input(choice)
-                if result is not True:
-                    current_panel = result
+            try:
+                current_panel.display()
+                if isinstance(current_panel, GamePanel) and current_panel.jeu and current_panel.jeu.est_termine():
+                    result = current_panel.handle_input(None)
+                    if result is not True:
+                        current_panel = result
+                else:
+                    prompt = getattr(current_panel, 'input_prompt', "Entrez votre choix : ")
+                    choice = input(prompt).strip()
+                    result = current_panel.handle_input(choice)
+                    if result is not True:
+                        current_panel = result
+            except requests.RequestException as e:
+                # Serveur injoignable ou trop lent (délais dans api.py) : on reste sur le panneau
+                print(f"Erreur de connexion au serveur : {e}")
 
 def clear_screen():
     os.system('cls' if os.name == 'nt' else 'clear')
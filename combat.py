@@ -0,0 +1,101 @@
+import random
+
+# Moteur de combat partagé par le serveur (make_move) et le client (Jeu.tour_de_jeu).
+# Chaque action est décrite une seule fois ; la résolution d'un coup est une recherche
+# dans la table ACTIONS suivie de quelques tirages et opérations arithmétiques.
+
+
+class Action:
+    __slots__ = ('type', 'cle', 'nom', 'methode', 'cible', 'degats', 'soins',
+                 'contrecoup', 'chance_critique', 'multiplicateur_critique')
+
+    def __init__(self, type, cle, nom, methode, cible='ennemi', degats=None, soins=None,
+                 contrecoup=None, chance_critique=0.0, multiplicateur_critique=1.5):
+        self.type = type
+        self.cle = cle
+        self.nom = nom
+        self.methode = methode
+        self.cible = cible
+        self.degats = degats
+        self.soins = soins
+        self.contrecoup = contrecoup
+        self.chance_critique = chance_critique
+        self.multiplicateur_critique = multiplicateur_critique
+
+
+class Resultat:
+    __slots__ = ('action', 'degats', 'soins', 'contrecoup', 'critique', 'pv_cible', 'pv_acteur')
+
+    def __init__(self, action, degats, soins, contrecoup, critique, pv_cible, pv_acteur):
+        self.action = action
+        self.degats = degats
+        self.soins = soins
+        self.contrecoup = contrecoup
+        self.critique = critique
+        self.pv_cible = pv_cible
+        self.pv_acteur = pv_acteur
+
+
+# Intervalles (min, max) inclus, comme random.randint
+CATALOGUE = [
+    Action('Warrior', '1', "Attaque basique", 'attaque_basique', degats=(35, 50)),
+    Action('Warrior', '2', "Attaque puissante", 'attaque_puissante', degats=(45, 60), contrecoup=(3, 8)),
+    Action('Druide', '1', "Soin puissant", 'soin_puissant', cible='allie', soins=(35, 55)),
+    Action('Druide', '2', "Attaque naturelle", 'attaque_naturelle', degats=(25, 40)),
+    Action('Archer', '1', "Tir simple", 'tir_simple', degats=(50, 70)),
+    Action('Archer', '2', "Tir précis", 'tir_precis', degats=(60, 80), chance_critique=0.3),
+]
+
+# Tables de dispatch précalculées
+ACTIONS = {(a.type, a.cle): a for a in CATALOGUE}
+ACTIONS_PAR_TYPE = {}
+for _action in CATALOGUE:
+    ACTIONS_PAR_TYPE.setdefault(_action.type, {})[_action.cle] = _action
+ACTIONS_PAR_METHODE = {(a.type, a.methode): a for a in CATALOGUE}
+
+# Équipes prédéfinies : (nom, classe, pv, arme)
+EQUIPES = {
+    "Pilules Bleues": [
+        ("Natasha", "Druide", 90, "bouche"),
+        ("Collette", "Druide", 90, "seringue"),
+        ("Dr. Colon", "Warrior", 130, "coloscope"),
+        ("Bruno le Clown", "Archer", 85, "ballon"),
+        ("Dr. Morbide", "Warrior", 130, "mains")
+    ],
+    "4 Fantastiques et Demi": [
+        ("Tic-Tac Man", "Warrior", 130, "tronc"),
+        ("UK", "Warrior", 130, "crâne"),
+        ("Tony Start", "Warrior", 130, "pile électrique"),
+        ("Sbaver-Man", "Druide", 90, "salive"),
+        ("L'oeil de con", "Archer", 85, "arc")
+    ]
+}
+
+
+def rng_coup(graine, numero):
+    # Générateur propre à un coup d'une partie, dérivé de la graine de la partie et du
+    # numéro du coup : une partie se rejoue à l'identique avec sa graine et ses coups,
+    # sans état de générateur à sauvegarder. Sans graine (parties créées avant) : `random`.
+    if graine is None:
+        return random
+    return random.Random(f"{graine}-{numero}")
+
+
+def resoudre(action, pv_acteur, pv_cible, pv_max_cible, cible_vivante, rng=random):
+    # Tire les jets de l'action et renvoie les nouveaux PV de la cible et de l'acteur.
+    # Ordre des tirages : critique, dégâts, contrecoup, soins.
+    critique = bool(action.chance_critique) and rng.random() < action.chance_critique
+    degats = soins = contrecoup = 0
+    if action.degats:
+        degats = rng.randint(*action.degats)
+        if critique:
+            degats = int(degats * action.multiplicateur_critique)
+        pv_cible = max(0, pv_cible - degats)
+    if action.contrecoup:
+        contrecoup = rng.randint(*action.contrecoup)
+        pv_acteur = max(0, pv_acteur - contrecoup)
+    if action.soins and cible_vivante:
+        avant = pv_cible
+        pv_cible = min(pv_max_cible, pv_cible + rng.randint(*action.soins))
+        soins = pv_cible - avant
+    return Resultat(action, degats, soins, contrecoup, critique, pv_cible, pv_acteur)
@@ -0,0 +1,170 @@
+import time
+
+from combat import ACTIONS_PAR_TYPE
+
+# Joueur artificiel : recherche expectiminimax à profondeur croissante sous budget de temps.
+# L'état de recherche est compact : un couple de tuples de PV (un par camp, les morts à 0).
+# Types et PV max ne changent pas pendant une partie et restent dans le Plateau.
+
+# Valeur d'une partie gagnée (les évaluations intermédiaires restent dans [-3, 3])
+GAGNE = 100
+
+# Nombre de tranches utilisées pour représenter un jet de dés dans les nœuds de hasard
+NB_TRANCHES = 3
+
+
+class TempsEcoule(Exception):
+    pass
+
+
+def tranches(intervalle):
+    # Découpe un intervalle randint en NB_TRANCHES tranches : [(probabilité, valeur moyenne)]
+    if not intervalle:
+        return [(1.0, 0)]
+    valeurs = list(range(intervalle[0], intervalle[1] + 1))
+    n = len(valeurs)
+    resultat = []
+    for k in range(NB_TRANCHES):
+        tranche = valeurs[k * n // NB_TRANCHES:(k + 1) * n // NB_TRANCHES]
+        if tranche:
+            resultat.append((len(tranche) / n, round(sum(tranche) / len(tranche))))
+    return resultat
+
+
+def issues(action):
+    # Issues représentatives d'une action : [(probabilité, dégâts, contrecoup, soins)]
+    contrecoup = round(sum(action.contrecoup) / 2) if action.contrecoup else 0
+    resultat = []
+    critiques = [(action.chance_critique, True), (1 - action.chance_critique, False)] if action.chance_critique else [(1.0, False)]
+    for p_critique, critique in critiques:
+        for p, degats in tranches(action.degats):
+            if critique:
+                degats = int(degats * action.multiplicateur_critique)
+            if action.soins:
+                for p_soins, soins in tranches(action.soins):
+                    resultat.append((p_critique * p * p_soins, degats, contrecoup, soins))
+            else:
+                resultat.append((p_critique * p, degats, contrecoup, 0))
+    return resultat
+
+
+ISSUES = {action: issues(action) for actions in ACTIONS_PAR_TYPE.values() for action in actions.values()}
+
+
+class Plateau:
+    __slots__ = ('types', 'pv_max')
+
+    def __init__(self, types, pv_max):
+        self.types = types
+        self.pv_max = pv_max
+
+    @staticmethod
+    def depuis_equipes(equipe_active, equipe_inactive):
+        # Équipes au format Equipe.to_dict() / serveur ; le camp 0 est celui qui joue.
+        # Renvoie le plateau et l'état initial de la recherche.
+        equipes = (equipe_active['personnages'], equipe_inactive['personnages'])
+        plateau = Plateau(
+            tuple(tuple(p['type'] for p in e) for e in equipes),
+            tuple(tuple(p['pv_max'] for p in e) for e in equipes),
+        )
+        pv = tuple(tuple(p['pv'] if p['vivant'] else 0 for p in e) for e in equipes)
+        return plateau, pv
+
+    def coups(self, pv, camp):
+        # Coups légaux (index acteur, action, index cible). Deux acteurs de même classe
+        # sont interchangeables pour une action sans contrecoup : un seul est gardé.
+        allies, ennemis = pv[camp], pv[1 - camp]
+        resultat = []
+        vus = set()
+        for i, hp in enumerate(allies):
+            if hp <= 0:
+                continue
+            for action in ACTIONS_PAR_TYPE.get(self.types[camp][i], {}).values():
+                cle = (i, action.cle) if action.contrecoup else (self.types[camp][i], action.cle)
+                if cle in vus:
+                    continue
+                vus.add(cle)
+                if action.cible == 'allie':
+                    cibles = [j for j, h in enumerate(allies) if 0 < h < self.pv_max[camp][j]]
+                else:
+                    cibles = [j for j, h in enumerate(ennemis) if h > 0]
+                resultat.extend((i, action, j) for j in cibles)
+        return resultat
+
+    def appliquer(self, pv, camp, coup, issue):
+        i, action, j = coup
+        _, degats, contrecoup, soins = issue
+        allies, ennemis = list(pv[camp]), pv[1 - camp]
+        if action.cible == 'allie':
+            allies[j] = min(self.pv_max[camp][j], allies[j] + soins)
+        else:
+            ennemis = list(ennemis)
+            ennemis[j] = max(0, ennemis[j] - degats)
+            ennemis = tuple(ennemis)
+        if contrecoup:
+            allies[i] = max(0, allies[i] - contrecoup)
+        allies = tuple(allies)
+        return (allies, ennemis) if camp == 0 else (ennemis, allies)
+
+    def evaluer(self, pv, moi):
+        score = 0.0
+        for camp, signe in ((moi, 1), (1 - moi, -1)):
+            vivants = sum(1 for h in pv[camp] if h > 0)
+            score += signe * (sum(pv[camp]) / sum(self.pv_max[camp]) + 0.5 * vivants / len(pv[camp]))
+        return score
+
+
+class IA:
+    def __init__(self, budget=1.0, profondeur_max=8):
+        self.budget = budget
+        self.profondeur_max = profondeur_max
+        self.noeuds = 0
+        self.profondeur_atteinte = 0
+
+    def choisir_coup(self, equipe_active, equipe_inactive):
+        # Renvoie (personnage_index, action_key, cible_index) pour l'équipe active,
+        # avec des index dans la liste complète des personnages (comme make_move)
+        plateau, pv = Plateau.depuis_equipes(equipe_active, equipe_inactive)
+        i, action, j = self.rechercher(plateau, pv)
+        return i, action.cle, j
+
+    def rechercher(self, plateau, pv):
+        self.plateau = plateau
+        self.limite = time.perf_counter() + self.budget
+        self.noeuds = 0
+        self.profondeur_atteinte = 0
+        coups = plateau.coups(pv, 0)
+        meilleur = coups[0]
+        for profondeur in range(1, self.profondeur_max + 1):
+            try:
+                valeurs = {coup: self._esperance(pv, 0, coup, profondeur) for coup in coups}
+            except TempsEcoule:
+                break
+            # Le meilleur coup de cette profondeur est exploré en premier à la suivante
+            coups.sort(key=valeurs.get, reverse=True)
+            meilleur = coups[0]
+            self.profondeur_atteinte = profondeur
+            if abs(valeurs[meilleur]) >= GAGNE:
+                break
+        return meilleur
+
+    def _esperance(self, pv, camp, coup, profondeur):
+        plateau = self.plateau
+        return sum(
+            issue[0] * self._valeur(plateau.appliquer(pv, camp, coup, issue), 1 - camp, profondeur - 1)
+            for issue in ISSUES[coup[1]]
+        )
+
+    def _valeur(self, pv, camp, profondeur):
+        # Valeur du point de vue du camp 0 (celui qui cherche), `camp` ayant le trait
+        self.noeuds += 1
+        if not self.noeuds & 1023 and time.perf_counter() > self.limite:
+            raise TempsEcoule
+        if not any(pv[1]):
+            return GAGNE + profondeur
+        if not any(pv[0]):
+            return -GAGNE - profondeur
+        if profondeur == 0:
+            return self.plateau.evaluer(pv, 0)
+        valeurs = (self._esperance(pv, camp, coup, profondeur) for coup in self.plateau.coups(pv, camp))
+        return max(valeurs) if camp == 0 else min(valeurs)
@@ -0,0 +1,149 @@
+import threading
+from bisect import bisect_left
+
+# Métriques du serveur au format texte de Prometheus (route /metrics), sans dépendance.
+#
+# Coût sur le chemin critique : toutes les séries (route, code, seau) ont un emplacement
+# fixe dans une seule liste de nombres partagée, réservé à la déclaration de la métrique :
+# une mesure est quelques incréments sous un verrou, sans allocation ni étiquette construite.
+# Pas de copie par thread : le serveur Flask (threaded=True) crée un thread par requête,
+# chaque copie coûterait une allocation et une prise du verrou global par requête.
+
+TYPE_CONTENU = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Bornes (en secondes) des seaux des histogrammes de durée. Les long-polls (/game_state,
+# /events) durent jusqu'à ATTENTE_MAX : les derniers seaux les couvrent.
+BORNES_DUREE = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Codes HTTP comptés individuellement ; les autres sont regroupés par classe (4xx, 5xx...)
+CODES = (200, 201, 204, 304, 400, 401, 403, 404, 405, 409, 413, 415, 429, 500, 502, 503, 504)
+CLASSES = ('1xx', '2xx', '3xx', '4xx', '5xx')
+INDEX_CODES = {
+    code: CODES.index(code) if code in CODES else len(CODES) + code // 100 - 1 for code in range(100, 600)
+}
+ETIQUETTES_CODES = tuple(str(code) for code in CODES) + CLASSES
+
+
+class Compteurs:
+    # Valeurs de toutes les métriques. Les incréments se font sous `verrou` (section de
+    # quelques opérations, jamais d'appel bloquant) : `x += 1` n'est pas atomique.
+    def __init__(self):
+        self.valeurs = []
+        self.verrou = threading.Lock()
+
+    def reserver(self, nombre):
+        # Emplacements d'une nouvelle métrique (la liste garde la même identité)
+        with self.verrou:
+            debut = len(self.valeurs)
+            self.valeurs.extend([0] * nombre)
+        return debut
+
+    def totaux(self):
+        with self.verrou:
+            return list(self.valeurs)
+
+
+compteurs = Compteurs()
+
+
+class Histogramme:
+    # Seaux non cumulés (cumulés à l'exposition), seau +Inf, puis la somme des durées
+    def __init__(self, bornes=BORNES_DUREE):
+        self.bornes = bornes
+        self.debut = compteurs.reserver(len(bornes) + 2)
+
+    def observer(self, duree):
+        seau = self.debut + bisect_left(self.bornes, duree)
+        somme = self.debut + len(self.bornes) + 1
+        valeurs = compteurs.valeurs
+        with compteurs.verrou:
+            valeurs[seau] += 1
+            valeurs[somme] += duree
+
+    def nombre(self, totaux):
+        return sum(totaux[self.debut:self.debut + len(self.bornes) + 1])
+
+    def exposer(self, nom, etiquettes, totaux):
+        prefixe = f'{etiquettes},' if etiquettes else ''
+        lignes = []
+        cumul = 0
+        for i, borne in enumerate(self.bornes):
+            cumul += totaux[self.debut + i]
+            lignes.append(f'{nom}_bucket{{{prefixe}le="{borne}"}} {cumul}')
+        cumul += totaux[self.debut + len(self.bornes)]
+        lignes.append(f'{nom}_bucket{{{prefixe}le="+Inf"}} {cumul}')
+        suffixe = f'{{{etiquettes}}}' if etiquettes else ''
+        lignes.append(f'{nom}_sum{suffixe} {totaux[self.debut + len(self.bornes) + 1]}')
+        lignes.append(f'{nom}_count{suffixe} {cumul}')
+        return lignes
+
+
+class Route:
+    # Par route : histogramme des durées et nombre de réponses par code
+    def __init__(self, nom):
+        self.nom = nom
+        self.duree = Histogramme()
+        self.debut_codes = compteurs.reserver(len(ETIQUETTES_CODES))
+
+    def observer(self, duree, code):
+        histogramme = self.duree
+        seau = histogramme.debut + bisect_left(histogramme.bornes, duree)
+        somme = histogramme.debut + len(histogramme.bornes) + 1
+        index_code = self.debut_codes + INDEX_CODES.get(code, len(ETIQUETTES_CODES) - 1)
+        valeurs = compteurs.valeurs
+        with compteurs.verrou:
+            valeurs[seau] += 1
+            valeurs[somme] += duree
+            valeurs[index_code] += 1
+
+    def codes(self, totaux):
+        # [(étiquette du code, nombre)] des codes déjà renvoyés
+        return [
+            (etiquette, totaux[self.debut_codes + i])
+            for i, etiquette in enumerate(ETIQUETTES_CODES) if totaux[self.debut_codes + i]
+        ]
+
+
+routes = {}
+
+
+def route(nom):
+    if nom not in routes:
+        routes[nom] = Route(nom)
+    return routes[nom]
+
+
+def exposer(histogrammes=(), jauges=()):
+    # Texte de /metrics : requêtes et durées par route, erreurs par code, puis les
+    # histogrammes [(nom, aide, Histogramme)] et jauges [(nom, aide, [(étiquettes, valeur)])]
+    totaux = compteurs.totaux()
+    lignes = [
+        '# HELP assistes_requetes_total Requêtes HTTP traitées, par route et code de réponse',
+        '# TYPE assistes_requetes_total counter',
+    ]
+    erreurs = {}
+    for nom, mesures in routes.items():
+        for code, nombre in mesures.codes(totaux):
+            lignes.append(f'assistes_requetes_total{{route="{nom}",code="{code}"}} {nombre}')
+            if code[0] in '45':
+                erreurs[code] = erreurs.get(code, 0) + nombre
+    lignes += [
+        '# HELP assistes_erreurs_total Réponses en erreur (4xx, 5xx), par code',
+        '# TYPE assistes_erreurs_total counter',
+    ]
+    lignes += [f'assistes_erreurs_total{{code="{code}"}} {nombre}' for code, nombre in sorted(erreurs.items())]
+    lignes += [
+        '# HELP assistes_duree_requete_secondes Durée de traitement des requêtes, par route',
+        '# TYPE assistes_duree_requete_secondes histogram',
+    ]
+    for nom, mesures in routes.items():
+        if mesures.duree.nombre(totaux):
+            lignes += mesures.duree.exposer('assistes_duree_requete_secondes', f'route="{nom}"', totaux)
+    for nom, aide, histogramme in histogrammes:
+        lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} histogram']
+        lignes += histogramme.exposer(nom, '', totaux)
+    for nom, aide, valeurs in jauges:
+        lignes += [f'# HELP {nom} {aide}', f'# TYPE {nom} gauge']
+        for etiquettes, valeur in valeurs:
+            lignes.append(f'{nom}{{{etiquettes}}} {valeur}' if etiquettes else f'{nom} {valeur}')
+    return '\n'.join(lignes) + '\n'
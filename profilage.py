@@ -0,0 +1,136 @@
+import cProfile
+import io
+import itertools
+import marshal
+import os
+import pstats
+import sys
+import threading
+import time
+
+# Profilage à la demande du serveur (routes /admin/profilage et /admin/echantillonnage).
+#
+# - Par requête : une requête sur `periode` (éventuellement limitée à certaines routes)
+#   est exécutée sous cProfile ; les statistiques s'additionnent jusqu'à la
+#   réinitialisation. Désactivé (actif = False), le coût est un test de booléen par requête.
+# - Par échantillonnage : pendant N secondes, les piles de tous les threads du processus
+#   sont relevées à intervalle régulier (sys._current_frames), sans instrumenter le code.
+#   Résultat au format « piles repliées » (une pile par ligne, « a;b;c nombre »), lu par
+#   flamegraph.pl, speedscope ou inferno. Rien ne tourne en dehors d'une demande.
+
+actif = False
+periode = 0
+routes = None
+_compteur = itertools.count()
+_verrou = threading.Lock()
+_stats = None
+_requetes = 0
+
+_verrou_echantillonnage = threading.Lock()
+
+TRIS = ('cumulative', 'tottime', 'calls', 'ncalls', 'time', 'filename', 'name')
+
+
+def configurer(nouvelle_periode, nouvelles_routes=None, reinitialiser=False):
+    # periode : 1 requête profilée sur `periode` (0 : arrêt) ; routes : noms des routes
+    # concernées (comme dans /metrics), None pour toutes
+    global actif, periode, routes, _stats, _requetes
+    with _verrou:
+        periode = nouvelle_periode
+        routes = frozenset(nouvelles_routes) if nouvelles_routes is not None else None
+        if reinitialiser:
+            _stats = None
+            _requetes = 0
+        actif = periode > 0
+
+
+def commencer(route):
+    # Profil démarré pour cette requête si elle fait partie de l'échantillon, sinon None
+    if routes is not None and route not in routes:
+        return None
+    if periode <= 0 or next(_compteur) % periode:
+        return None
+    profil = cProfile.Profile()
+    try:
+        profil.enable()
+    except ValueError:
+        # Python 3.12+ : un seul profileur actif à la fois dans le processus
+        return None
+    return profil
+
+
+def terminer(profil):
+    global _stats, _requetes
+    profil.disable()
+    with _verrou:
+        if _stats is None:
+            _stats = pstats.Stats(profil)
+        else:
+            _stats.add(profil)
+        _requetes += 1
+
+
+def executer(route, fonction, *args):
+    # fonction(*args), profilée si la requête fait partie de l'échantillon
+    profil = commencer(route)
+    try:
+        return fonction(*args)
+    finally:
+        if profil is not None:
+            terminer(profil)
+
+
+def etat():
+    return {'actif': actif, 'periode': periode, 'routes': sorted(routes) if routes is not None else None,
+            'requetes_profilees': _requetes}
+
+
+def rapport(tri='cumulative', limite=40):
+    # Statistiques cumulées en texte (format de pstats), les `limite` premières fonctions
+    with _verrou:
+        if _stats is None:
+            return "Aucune requête profilée.\n"
+        sortie = io.StringIO()
+        _stats.stream = sortie
+        print(f"{_requetes} requête(s) profilée(s)", file=sortie)
+        _stats.sort_stats(tri).print_stats(limite)
+        return sortie.getvalue()
+
+
+def export_pstats():
+    # Même contenu qu'un fichier de pstats.Stats.dump_stats (snakeviz, pstats.Stats(fichier))
+    with _verrou:
+        return marshal.dumps(_stats.stats) if _stats is not None else None
+
+
+def _nom_cadre(cadre):
+    code = cadre.f_code
+    # Pas d'espace : le dernier espace d'une ligne sépare la pile de son nombre
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}".replace(' ', '_')
+
+
+def echantillonner(duree, intervalle=0.005):
+    # Piles repliées de tous les threads (sauf celui-ci) pendant `duree` secondes.
+    # None si un échantillonnage est déjà en cours.
+    if not _verrou_echantillonnage.acquire(blocking=False):
+        return None
+    try:
+        moi = threading.get_ident()
+        piles = {}
+        fin = time.monotonic() + duree
+        while time.monotonic() < fin:
+            noms = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, cadre in sys._current_frames().items():
+                if ident == moi:
+                    continue
+                pile = []
+                while cadre is not None:
+                    pile.append(_nom_cadre(cadre))
+                    cadre = cadre.f_back
+                pile.append(noms.get(ident, f"thread-{ident}").replace(' ', '_'))
+                cle = ';'.join(reversed(pile))
+                piles[cle] = piles.get(cle, 0) + 1
+            time.sleep(intervalle)
+        return ''.join(f"{pile} {nombre}\n" for pile, nombre in sorted(piles.items()))
+    finally:
+        _verrou_echantillonnage.release()
@@ -1,11 +1,250 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
+from contextlib import contextmanager
+from copy import deepcopy
+from functools import wraps
+from binaire import TYPE_MIME as TYPE_BINAIRE, encoder as encoder_binaire
+from combat import ACTIONS, ACTIONS_PAR_TYPE, EQUIPES, resoudre, rng_coup
+from ia import IA, Plateau
+from stockage import creer_store
+import json
+import metriques
+import os
+import profilage
+import secrets
+import time
 import uuid
-import random
+import threading
+
+# Encodeur JSON : orjson s'il est installé (plusieurs fois plus rapide), sinon json
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encoder_json(objet):
+    if orjson is not None:
+        return orjson.dumps(objet, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(objet, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
 
 app = Flask(__name__)
 
-# Stockage des parties en mémoire
-games = {}
+# Stockage des parties : en mémoire par défaut, ou partagé entre workers
+# (ex. ASSISTES_STORE=sqlite:///parties.db, ou sqlite:///parties.db?format=binaire
+# pour des états plus compacts)
+games = creer_store(os.environ.get('ASSISTES_STORE', 'memoire'))
+
+# Temps de réflexion (en secondes) du bot serveur par coup
+BUDGET_BOT = 0.5
+
+# Statuts possibles d'une partie (jauges de /metrics)
+STATUTS = ('waiting_player2', 'waiting_teams', 'waiting_map', 'ongoing', 'finished')
+
+# Durée de jouer_coup dans /make_move : validation, tirages et enregistrement du coup
+duree_coup = metriques.Histogramme()
+
+# Jeton des routes /admin (profilage), à passer en en-tête « Authorization: Bearer <jeton> ».
+# Sans jeton configuré, ces routes n'existent pas (404).
+JETON_ADMIN = os.environ.get('ASSISTES_ADMIN_TOKEN')
+
+# Durée maximale (en secondes) d'un échantillonnage demandé à /admin/echantillonnage
+ECHANTILLONNAGE_MAX = 60
+
+# Intervalle (en secondes) entre deux purges des parties expirées
+INTERVALLE_PURGE = 60
+derniere_purge = time.monotonic()
+# Une seule purge à la fois : les autres requêtes passent sans attendre
+verrou_purge = threading.Lock()
+
+# Verrous par partie, répartis en bandes : deux parties de la même bande se partagent
+# un verrou, les autres avancent en parallèle. Chaque bande est aussi la Condition qui
+# réveille les clients en attente (long-poll, SSE) de ses parties. RLock : une transition
+# peut reprendre le verrou qu'elle détient déjà (partie_modifiee).
+NB_VERROUS = 64
+verrous_parties = [threading.Condition(threading.RLock()) for _ in range(NB_VERROUS)]
+
+def verrou_partie(game_id):
+    return verrous_parties[hash(game_id) % NB_VERROUS]
+
+@contextmanager
+def transition(game_id):
+    # Verrou de la partie dans ce processus + transaction du stockage entre processus
+    with verrou_partie(game_id), games.transaction():
+        yield
+
+def sous_verrou(action):
+    # Exécute toute l'action sous le verrou de la partie désignée par `game_id`
+    @wraps(action)
+    def action_verrouillee(data):
+        game_id = data.get('game_id') if isinstance(data, dict) else None
+        if not isinstance(game_id, str):
+            return action(data)
+        with transition(game_id):
+            return action(data)
+    return action_verrouillee
+
+# Lobby : nombre de parties par page (par défaut, maximum)
+PAR_PAGE = 20
+PAR_PAGE_MAX = 100
+
+# Matchmaking : nombre de parties en tête de file examinées avant d'en créer une
+# (une partie de la file peut avoir été prise entre-temps, ou appartenir au demandeur)
+CANDIDATS_MATCHMAKING = 8
+
+# Sérialise « chercher une partie ou en créer une » : sans lui, deux demandes simultanées
+# peuvent ne rien trouver et créer chacune leur partie, deux joueurs attendant alors séparément.
+# Pris avant les verrous de parties, jamais l'inverse. Propre au processus : entre workers
+# d'un stockage partagé, deux créations simultanées restent possibles (rares).
+verrou_matchmaking = threading.Lock()
+
+# Durée maximale (en secondes) pendant laquelle /game_state peut bloquer
+ATTENTE_MAX = 25
+
+# Avec un stockage partagé, les écritures des autres workers ne nous réveillent pas :
+# les clients en attente revérifient alors la version à cet intervalle (en secondes)
+INTERVALLE_VERIFICATION = 0.25
+
+# Fonctions appelées avec le game_id après chaque transition, depuis le thread qui l'a faite
+# (server_asgi.py s'y abonne pour réveiller ses attentes asynchrones)
+observateurs = []
+
+# État public encodé de chaque partie, pour sa dernière version servie :
+# {game_id: (version, {binaire: octets})}. Une partie qui n'a pas changé n'est pas ré-encodée.
+cache_etats = {}
+
+# Champs dont on suit la version pour les réponses delta
+CHAMPS_SUIVIS = ('status', 'player2_id', 'equipe1', 'equipe2', 'tour_actuel', 'equipe_active_nom', 'map', 'stats')
+
+def partie_modifiee(game_id, game, *champs, personnages=(), evenement=None, coup=None):
+    # Incrémente la version de la partie, note quels champs/personnages ont changé
+    # et l'enregistre dans le stockage.
+    # Publie au plus un événement par version : `evenement` s'il est fourni, sinon le
+    # nouveau statut si celui-ci a changé. L'id de l'événement est la version.
+    # `coup` (acteur, action, cible, tirages) : la transition est ajoutée au journal des
+    # coups avec les champs et PV qui en résultent, sans réécrire tout l'état.
+    verrou = verrou_partie(game_id)
+    with verrou:
+        game['version'] += 1
+        versions = game['_versions']
+        for champ in champs:
+            versions[champ] = game['version']
+        for equipe, index in personnages:
+            versions['personnages'][equipe][index] = game['version']
+        if evenement is None and 'status' in champs:
+            evenement = ('statut', {'status': game['status']})
+        if coup is None:
+            games.put(game_id, game)
+        else:
+            games.ajouter_coup(game_id, game, {
+                'id': game['version'],
+                **coup,
+                'champs': {champ: deepcopy(game[champ]) for champ in champs},
+                'personnages': [
+                    [cle, i, game[cle]['personnages'][i]['pv'], game[cle]['personnages'][i]['vivant']]
+                    for cle, i in personnages
+                ],
+            })
+        cache_etats.pop(game_id, None)
+        if evenement is not None:
+            type_evenement, donnees = evenement
+            games.ajouter_evenement(game_id, {'id': game['version'], 'type': type_evenement, 'data': donnees})
+        verrou.notify_all()
+    for observateur in observateurs:
+        observateur(game_id)
+
+def attendre_changement(game_id, since, timeout):
+    # Bloque jusqu'à ce que la version de la partie diffère de `since` (ou jusqu'au timeout).
+    # Renvoie la version courante, ou None si la partie n'existe plus.
+    fin = time.monotonic() + timeout
+    verrou = verrou_partie(game_id)
+    with verrou:
+        while True:
+            version = games.version(game_id)
+            reste = fin - time.monotonic()
+            if version is None or version != since or reste <= 0:
+                return version
+            verrou.wait(min(reste, INTERVALLE_VERIFICATION) if games.partage else reste)
+
+def purger_si_necessaire():
+    global derniere_purge
+    if time.monotonic() - derniere_purge < INTERVALLE_PURGE or not verrou_purge.acquire(blocking=False):
+        return
+    try:
+        # Revérifié sous le verrou : une purge a pu se terminer juste avant
+        if time.monotonic() - derniere_purge < INTERVALLE_PURGE:
+            return
+        derniere_purge = time.monotonic()
+        if games.purger():
+            for game_id in list(cache_etats):
+                if game_id not in games:
+                    cache_etats.pop(game_id, None)
+    finally:
+        verrou_purge.release()
+
+def evenement_coup(game, message, personnages):
+    # Résultat d'un coup : le message et les PV des personnages touchés
+    return ('coup', {
+        'message': message,
+        'personnages': [
+            {'equipe': cle, 'index': i, 'pv': game[cle]['personnages'][i]['pv'], 'vivant': game[cle]['personnages'][i]['vivant']}
+            for cle, i in personnages
+        ],
+        'tour_actuel': game['tour_actuel'],
+        'equipe_active_nom': game['equipe_active_nom'],
+        'status': game['status'],
+        # Copie : les stats de la partie sont modifiées sur place par les coups suivants,
+        # l'événement conservé (rattrapage via since / Last-Event-ID) doit rester celui émis
+        'stats': deepcopy(game['stats'])
+    })
+
+# Champs jamais envoyés aux joueurs (état, delta, /resume). La graine permettrait de
+# prévoir les tirages des coups suivants : elle n'est révélée qu'avec le rejeu d'une
+# partie terminée. Les player_id servent de jeton de session : les connaître suffit
+# pour jouer ou reprendre la partie à la place du joueur.
+CHAMPS_PRIVES = ('_versions', 'graine', 'player1_id', 'player2_id', 'bot_id')
+
+def etat_public(game):
+    return {k: v for k, v in game.items() if k not in CHAMPS_PRIVES}
+
+def etat_encode(game_id, version, binaire=False):
+    # Octets JSON (ou binaires) de l'état public à cette version (appelant : verrou de la partie détenu)
+    en_cache = cache_etats.get(game_id)
+    if en_cache is None or en_cache[0] != version:
+        en_cache = cache_etats[game_id] = (version, {})
+    octets = en_cache[1].get(binaire)
+    if octets is None:
+        game = games.get(game_id)
+        octets = en_cache[1][binaire] = (encoder_binaire if binaire else encoder_json)(etat_public(game))
+    return octets
+
+def accepte_binaire(accept):
+    # Format négocié : binaire (binaire.py) si le client l'annonce dans son en-tête Accept
+    return TYPE_BINAIRE in accept
+
+def type_etat(binaire, code):
+    # Les erreurs restent en JSON quel que soit le format demandé
+    return TYPE_BINAIRE if binaire and code == 200 else 'application/json'
+
+def reponse_json(octets, status=200, headers=None, mimetype='application/json'):
+    return Response(octets, status=status, mimetype=mimetype, headers=headers)
+
+def delta_partie(game, since):
+    # Uniquement ce qui a changé depuis la version `since` détenue par le client
+    versions = game['_versions']
+    delta = {'version': game['version'], 'since': since, 'champs': {}, 'personnages': {}}
+    for champ in CHAMPS_SUIVIS:
+        if versions[champ] > since and champ not in CHAMPS_PRIVES:
+            delta['champs'][champ] = game[champ]
+    for cle in ('equipe1', 'equipe2'):
+        if cle in delta['champs'] or not game[cle]:
+            continue
+        modifies = {
+            i: {'pv': p['pv'], 'vivant': p['vivant']}
+            for i, (p, v) in enumerate(zip(game[cle]['personnages'], versions['personnages'][cle]))
+            if v > since
+        }
+        if modifies:
+            delta['personnages'][cle] = modifies
+    return delta
 
 # Liste des cartes disponibles
 MAPS = [
@@ -15,117 +254,267 @@ MAPS = [
     "Restaurant Flunch"
 ]
 
-@app.route('/create_game', methods=['POST'])
-def create_game():
-    data = request.json
+def stats_vides():
+    return {'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0}
+
+# --- Actions : data -> (réponse, code HTTP), communes à Flask et à l'ASGI (server_asgi.py) ---
+
+def creer_partie(data):
     if not data or 'player_id' not in data:
-        return jsonify({'error': 'player_id requis'}), 400
+        return {'error': 'player_id requis'}, 400
     
+    purger_si_necessaire()
     game_id = str(uuid.uuid4())[:8]
-    games[game_id] = {
+    games.put(game_id, {
         'status': 'waiting_player2',
         'player1_id': data['player_id'],
         'player2_id': None,
+        'bot_id': None,
         'equipe1': None,
         'equipe2': None,
         'tour_actuel': 1,
         'equipe_active_nom': None,
         'map': None,
-        'stats': {
-            data['player_id']: {'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0},
-            'equipe2': {'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0}
-        }
-    }
-    return jsonify({'game_id': game_id})
+        'version': 0,
+        'graine': secrets.randbits(64),
+        # Par place (joueur1, joueur2) jusqu'à ce que les équipes soient soumises,
+        # puis par nom d'équipe ; jamais par player_id (voir CHAMPS_PRIVES)
+        'stats': {'joueur1': stats_vides(), 'joueur2': stats_vides()},
+        '_versions': {**dict.fromkeys(CHAMPS_SUIVIS, 0), 'personnages': {'equipe1': [], 'equipe2': []}}
+    })
+    return {'game_id': game_id}, 200
 
-@app.route('/join_game', methods=['POST'])
-def join_game():
-    data = request.json
+@sous_verrou
+def rejoindre_partie(data):
     if not data or 'game_id' not in data or 'player_id' not in data:
-        return jsonify({'error': 'game_id et player_id requis'}), 400
+        return {'error': 'game_id et player_id requis'}, 400
     
     game_id = data['game_id']
-    if game_id not in games:
-        return jsonify({'error': 'Partie non trouvée'}), 404
-    if games[game_id]['player2_id']:
-        return jsonify({'error': 'Partie déjà pleine'}), 400
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
+    if game['player2_id']:
+        return {'error': 'Partie déjà pleine'}, 400
+    if data['player_id'] == game['player1_id']:
+        # Sinon les deux places auraient le même joueur : la partie ne pourrait jamais commencer
+        return {'error': 'Impossible de rejoindre sa propre partie'}, 400
     
-    games[game_id]['player2_id'] = data['player_id']
-    games[game_id]['status'] = 'waiting_teams'
-    games[game_id]['stats'][data['player_id']] = {'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0}
-    return jsonify({'message': 'Partie rejointe avec succès'})
+    game['player2_id'] = data['player_id']
+    game['status'] = 'waiting_teams'
+    partie_modifiee(game_id, game, 'player2_id', 'status')
+    return {'message': 'Partie rejointe avec succès'}, 200
 
-@app.route('/submit_team', methods=['POST'])
-def submit_team():
-    data = request.json
+def chercher_adversaire(data):
+    # File d'attente : les parties en attente d'un second joueur, dans l'ordre de création
+    # (index par statut du stockage). La plus ancienne est rejointe ; s'il n'y en a
+    # aucune, une partie est créée et prend place en fin de file.
+    if not data or 'player_id' not in data:
+        return {'error': 'player_id requis'}, 400
+
+    with verrou_matchmaking:
+        return chercher_ou_creer(data)
+
+def chercher_ou_creer(data):
+    # Appelant : verrou_matchmaking détenu. Le statut de chaque candidate est revérifié
+    # sous le verrou de la partie (elle a pu être rejointe ou annulée entre-temps).
+    # Un joueur déjà en file retrouve sa partie au lieu d'en créer une seconde (index par joueur)
+    for game_id in games.parties_du_joueur(data['player_id']):
+        game = games.get(game_id)
+        if game is not None and game['status'] == 'waiting_player2' and game['player1_id'] == data['player_id']:
+            return {'game_id': game_id, 'player_team': 'equipe1'}, 200
+
+    for game_id in games.lister('waiting_player2', limite=CANDIDATS_MATCHMAKING):
+        with transition(game_id):
+            game = games.get(game_id)
+            if game is None or game['status'] != 'waiting_player2' or game['player1_id'] == data['player_id']:
+                continue
+            reponse, code = rejoindre_partie({'game_id': game_id, 'player_id': data['player_id']})
+            if code == 200:
+                return {'game_id': game_id, 'player_team': 'equipe2'}, 200
+    reponse, code = creer_partie(data)
+    if code != 200:
+        return reponse, code
+    return {'game_id': reponse['game_id'], 'player_team': 'equipe1'}, 200
+
+def lister_lobby(params):
+    # Parties ouvertes (en attente d'un second joueur), paginées, lues dans l'index par statut.
+    # ?player_id= : les parties créées par ce joueur sont omises (il ne peut pas les rejoindre).
+    page = max(params.get('page') or 1, 1)
+    par_page = min(max(params.get('par_page') or PAR_PAGE, 1), PAR_PAGE_MAX)
+    decalage = (page - 1) * par_page
+    propres = set()
+    if params.get('player_id'):
+        for game_id in games.parties_du_joueur(params['player_id']):
+            game = games.get(game_id)
+            if game is not None and game['status'] == 'waiting_player2' and game['player1_id'] == params['player_id']:
+                propres.add(game_id)
+    if propres:
+        # Rare (en général une partie au plus) : la file est relue depuis le début pour que
+        # les pages restent contiguës une fois ces parties retirées
+        ids = [g for g in games.lister('waiting_player2', limite=decalage + par_page + len(propres)) if g not in propres]
+        ids = ids[decalage:decalage + par_page]
+    else:
+        ids = games.lister('waiting_player2', limite=par_page, decalage=decalage)
+    parties = []
+    for game_id in ids:
+        game = games.get(game_id)
+        if game is not None:
+            # Pas de player_id : il sert de jeton de session (/resume)
+            parties.append({'game_id': game_id})
+    total = games.compter('waiting_player2') - len(propres)
+    return {'parties': parties, 'page': page, 'par_page': par_page, 'total': total}, 200
+
+def reprendre_partie(player_id):
+    # Reconnexion : la partie non terminée la plus récente du joueur (index par joueur),
+    # son camp et l'état public, en un seul aller-retour
+    for game_id in reversed(games.parties_du_joueur(player_id)):
+        with verrou_partie(game_id):
+            game = games.get(game_id)
+            if game is None or game['status'] == 'finished':
+                continue
+            player_team = 'equipe1' if game['player1_id'] == player_id else 'equipe2'
+            return {'game_id': game_id, 'player_team': player_team, 'etat': etat_public(game)}, 200
+    return {'error': 'Aucune partie en cours'}, 404
+
+@sous_verrou
+def quitter_partie(data):
+    # L'hôte abandonne une partie que personne n'a encore rejointe : elle quitte le lobby
+    if not data or 'game_id' not in data or 'player_id' not in data:
+        return {'error': 'game_id et player_id requis'}, 400
+
+    game_id = data['game_id']
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
+    if data['player_id'] != game['player1_id']:
+        return {'error': 'Seul le joueur 1 peut annuler la partie'}, 403
+    if game['status'] != 'waiting_player2':
+        return {'error': 'Partie déjà commencée'}, 400
+
+    games.delete(game_id)
+    cache_etats.pop(game_id, None)
+    verrou_partie(game_id).notify_all()
+    for observateur in observateurs:
+        observateur(game_id)
+    return {'message': 'Partie annulée'}, 200
+
+@sous_verrou
+def ajouter_bot(data):
+    # Le joueur 1 confie la seconde place à un bot serveur (voir ia.py)
+    if not data or 'game_id' not in data or 'player_id' not in data:
+        return {'error': 'game_id et player_id requis'}, 400
+
+    game_id = data['game_id']
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
+    if data['player_id'] != game['player1_id']:
+        return {'error': 'Seul le joueur 1 peut ajouter un bot'}, 403
+    if game['player2_id']:
+        return {'error': 'Partie déjà pleine'}, 400
+    if game['status'] != 'waiting_player2':
+        return {'error': 'Partie déjà commencée'}, 400
+
+    bot_id = 'bot-' + str(uuid.uuid4())[:4]
+    game['player2_id'] = game['bot_id'] = bot_id
+    game['status'] = 'waiting_teams'
+    partie_modifiee(game_id, game, 'player2_id', 'status')
+    return {'message': 'Un bot a rejoint la partie'}, 200
+
+@sous_verrou
+def soumettre_equipe(data):
     if not data or 'game_id' not in data or 'player_id' not in data or 'equipe' not in data:
-        return jsonify({'error': 'game_id, player_id et equipe requis'}), 400
+        return {'error': 'game_id, player_id et equipe requis'}, 400
     
     game_id = data['game_id']
-    if game_id not in games:
-        return jsonify({'error': 'Partie non trouvée'}), 404
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
     
-    game = games[game_id]
     if data['player_id'] == game['player1_id']:
-        game['equipe1'] = data['equipe']
-        game['stats'][game['equipe1']['nom']] = game['stats'].pop(game['player1_id'])
+        cle = 'equipe1'
     elif data['player_id'] == game['player2_id']:
-        game['equipe2'] = data['equipe']
-        game['stats'][game['equipe2']['nom']] = game['stats'].pop(game['player2_id'])
+        cle = 'equipe2'
     else:
-        return jsonify({'error': 'Joueur non autorisé'}), 403
+        return {'error': 'Joueur non autorisé'}, 403
+    # Une équipe par place, avant le choix de la carte : une seconde soumission
+    # remettrait la partie (PV, stats) à zéro
+    if game['status'] != 'waiting_teams':
+        return {'error': 'Les équipes ne peuvent plus être soumises'}, 400
+    if game[cle]:
+        return {'error': 'Équipe déjà soumise'}, 400
+    game[cle] = data['equipe']
+    game['_versions']['personnages'][cle] = [0] * len(data['equipe']['personnages'])
     
+    champs = [cle]
+    if game.get('bot_id') and not game['equipe2']:
+        game['equipe2'] = equipe_bot(game['equipe1']['nom'])
+        game['_versions']['personnages']['equipe2'] = [0] * len(game['equipe2']['personnages'])
+        champs.append('equipe2')
     if game['equipe1'] and game['equipe2']:
         game['status'] = 'waiting_map'
         game['equipe_active_nom'] = game['equipe1']['nom']
+        # Les deux noms connus : les stats passent des places aux noms d'équipe en une fois
+        # (une équipe nommée « joueur2 » ne peut pas écraser la place adverse)
+        stats = game['stats']
+        game['stats'] = {
+            game['equipe1']['nom']: stats.get('joueur1') or stats_vides(),
+            game['equipe2']['nom']: stats.get('joueur2') or stats_vides(),
+        }
+        champs += ['status', 'equipe_active_nom', 'stats']
     
-    return jsonify({'message': f"Équipe {data['equipe']['nom']} soumise avec succès"})
+    partie_modifiee(game_id, game, *champs)
+    return {'message': f"Équipe {data['equipe']['nom']} soumise avec succès"}, 200
 
-@app.route('/submit_map', methods=['POST'])
-def submit_map():
-    data = request.json
+@sous_verrou
+def soumettre_carte(data):
     if not data or 'game_id' not in data or 'player_id' not in data or 'map' not in data:
-        return jsonify({'error': 'game_id, player_id et map requis'}), 400
+        return {'error': 'game_id, player_id et map requis'}, 400
     
     game_id = data['game_id']
-    if game_id not in games:
-        return jsonify({'error': 'Partie non trouvée'}), 404
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
     
-    game = games[game_id]
     if data['player_id'] != game['player1_id']:
-        return jsonify({'error': 'Seul le joueur 1 peut choisir la carte'}), 403
+        return {'error': 'Seul le joueur 1 peut choisir la carte'}, 403
     if data['map'] not in MAPS:
-        return jsonify({'error': 'Carte invalide'}), 400
+        return {'error': 'Carte invalide'}, 400
     
     game['map'] = data['map']
     game['status'] = 'ongoing'
-    return jsonify({'message': f"Carte {data['map']} sélectionnée"})
+    partie_modifiee(game_id, game, 'map', 'status')
+    return {'message': f"Carte {data['map']} sélectionnée"}, 200
 
-@app.route('/game_state/<game_id>', methods=['GET'])
-def get_game_state(game_id):
-    if game_id not in games:
-        return jsonify({'error': 'Partie non trouvée'}), 404
-    return jsonify(games[game_id])
-
-@app.route('/make_move', methods=['POST'])
-def make_move():
-    data = request.json
+@sous_verrou
+def jouer(data):
     if not data or not all(k in data for k in ['game_id', 'player_id', 'personnage_index', 'action_key', 'cible_index']):
-        return jsonify({'error': 'Données incomplètes'}), 400
+        return {'error': 'Données incomplètes'}, 400
     
     game_id = data['game_id']
-    if game_id not in games:
-        return jsonify({'error': 'Partie non trouvée'}), 404
+    game = games.get(game_id)
+    if game is None:
+        return {'error': 'Partie non trouvée'}, 404
     
-    game = games[game_id]
+    debut = time.perf_counter()
+    reponse, code = jouer_coup(game_id, game, data['player_id'], data['personnage_index'],
+                               data['action_key'], data['cible_index'])
+    duree_coup.observer(time.perf_counter() - debut)
+    if code == 200 and doit_jouer_bot(game):
+        threading.Thread(target=tour_du_bot, args=(game_id,), daemon=True).start()
+    return reponse, code
+
+def jouer_coup(game_id, game, player_id, personnage_index, action_key, cible_index):
+    # Valide et applique un coup (appelant : verrou de la partie détenu).
+    # Renvoie (réponse, code HTTP) ; partagé par /make_move et le bot serveur.
     if game['status'] != 'ongoing':
-        return jsonify({'error': 'Partie non en cours'}), 400
+        return {'error': 'Partie non en cours'}, 400
 
     # Vérifier si c'est le tour du joueur
-    is_player1 = data['player_id'] == game['player1_id']
+    is_player1 = player_id == game['player1_id']
     is_player1_turn = game['equipe_active_nom'] == game['equipe1']['nom']
     if (is_player1 and not is_player1_turn) or (not is_player1 and is_player1_turn):
-        return jsonify({'error': 'Ce n’est pas votre tour'}), 403
+        return {'error': 'Ce n’est pas votre tour'}, 403
 
     # Sélectionner l'équipe active et inactive
     equipe_active = game['equipe1'] if is_player1_turn else game['equipe2']
@@ -133,118 +522,363 @@ def make_move():
 
     try:
         # Vérifier les indices
-        personnage_index = data['personnage_index']
-        cible_index = data['cible_index']
         if not (0 <= personnage_index < len(equipe_active['personnages'])):
-            return jsonify({'error': 'Index de personnage invalide'}), 400
+            return {'error': 'Index de personnage invalide'}, 400
         if not equipe_active['personnages'][personnage_index]['vivant']:
-            return jsonify({'error': 'Personnage mort'}), 400
+            return {'error': 'Personnage mort'}, 400
 
         perso = equipe_active['personnages'][personnage_index]
-        action_key = data['action_key']
+        if perso['type'] not in ACTIONS_PAR_TYPE:
+            return {'error': 'Type de personnage inconnu'}, 400
+        action = ACTIONS.get((perso['type'], action_key))
+        if action is None:
+            return {'error': f"Action invalide pour {perso['type']}"}, 400
 
         # Déterminer l'équipe cible (soin -> équipe active, attaque -> équipe inactive)
-        cible_equipe = equipe_active if (perso['type'] == 'Druide' and action_key == '1') else equipe_inactive
+        cible_equipe = equipe_active if action.cible == 'allie' else equipe_inactive
         if not (0 <= cible_index < len(cible_equipe['personnages'])):
-            return jsonify({'error': 'Index de cible invalide'}), 400
-        if not cible_equipe['personnages'][cible_index]['vivant'] and action_key != '1':
-            return jsonify({'error': 'Cible morte'}), 400
+            return {'error': 'Index de cible invalide'}, 400
+        if not cible_equipe['personnages'][cible_index]['vivant'] and action.cible != 'allie':
+            return {'error': 'Cible morte'}, 400
 
         cible = cible_equipe['personnages'][cible_index]
-        message = ""
-
-        # Appliquer l'action
-        if perso['type'] == 'Warrior':
-            if action_key == '1':  # Attaque basique
-                degats = random.randint(35, 50)
-                cible['pv'] = max(0, cible['pv'] - degats)
-                game['stats'][equipe_active['nom']]['degats_infliges'] += degats
-                message = f"{perso['nom']} inflige {degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
-                if cible['pv'] <= 0:
-                    cible['vivant'] = False
-                    game['stats'][cible_equipe['nom']]['morts'] += 1
-                    message += f" {cible['nom']} est mort !"
-            elif action_key == '2':  # Attaque puissante
-                degats = random.randint(45, 60)
-                degats_self = random.randint(3, 8)
-                cible['pv'] = max(0, cible['pv'] - degats)
-                perso['pv'] = max(0, perso['pv'] - degats_self)
-                game['stats'][equipe_active['nom']]['degats_infliges'] += degats
-                message = f"{perso['nom']} inflige {degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
-                if cible['pv'] <= 0:
-                    cible['vivant'] = False
-                    game['stats'][cible_equipe['nom']]['morts'] += 1
-                    message += f" {cible['nom']} est mort !"
-                message += f" {perso['nom']} subit {degats_self} dégâts de contrecoup ({perso['pv']} PV restants)."
-                if perso['pv'] <= 0:
-                    perso['vivant'] = False
-                    game['stats'][equipe_active['nom']]['morts'] += 1
-                    message += f" {perso['nom']} est mort !"
-            else:
-                return jsonify({'error': 'Action invalide pour Warrior'}), 400
-        elif perso['type'] == 'Druide':
-            if action_key == '1':  # Soin puissant
-                if cible['vivant']:
-                    soins = random.randint(35, 55)
-                    avant = cible['pv']
-                    cible['pv'] = min(cible['pv_max'], cible['pv'] + soins)
-                    game['stats'][equipe_active['nom']]['soins_effectues'] += (cible['pv'] - avant)
-                    message = f"{perso['nom']} soigne {cible['nom']} pour {cible['pv'] - avant} PV ({cible['pv']} PV)."
-                else:
-                    message = f"{cible['nom']} est mort et ne peut être soigné."
-            elif action_key == '2':  # Attaque naturelle
-                degats = random.randint(25, 40)
-                cible['pv'] = max(0, cible['pv'] - degats)
-                game['stats'][equipe_active['nom']]['degats_infliges'] += degats
-                message = f"{perso['nom']} inflige {degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
-                if cible['pv'] <= 0:
-                    cible['vivant'] = False
-                    game['stats'][cible_equipe['nom']]['morts'] += 1
-                    message += f" {cible['nom']} est mort !"
-            else:
-                return jsonify({'error': 'Action invalide pour Druide'}), 400
-        elif perso['type'] == 'Archer':
-            if action_key == '1':  # Tir simple
-                degats = random.randint(50, 70)
-                cible['pv'] = max(0, cible['pv'] - degats)
-                game['stats'][equipe_active['nom']]['degats_infliges'] += degats
-                message = f"{perso['nom']} inflige {degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
-                if cible['pv'] <= 0:
-                    cible['vivant'] = False
-                    game['stats'][cible_equipe['nom']]['morts'] += 1
-                    message += f" {cible['nom']} est mort !"
-            elif action_key == '2':  # Tir précis
-                critique = random.random() < 0.3
-                degats = random.randint(60, 80)
-                if critique:
-                    degats = int(degats * 1.5)
-                    message = f"🎯 CRITIQUE ! "
-                cible['pv'] = max(0, cible['pv'] - degats)
-                game['stats'][equipe_active['nom']]['degats_infliges'] += degats
-                message += f"{perso['nom']} inflige {degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
-                if cible['pv'] <= 0:
-                    cible['vivant'] = False
-                    game['stats'][cible_equipe['nom']]['morts'] += 1
-                    message += f" {cible['nom']} est mort !"
+        cle_active = 'equipe1' if is_player1_turn else 'equipe2'
+        cle_inactive = 'equipe2' if is_player1_turn else 'equipe1'
+        cle_cible = cle_active if cible_equipe is equipe_active else cle_inactive
+        personnages_modifies = [(cle_cible, cible_index)]
+
+        # Appliquer l'action (moteur partagé avec le client, voir combat.py)
+        # Tirages du coup n° version + 1 (id du coup dans le journal)
+        rng = rng_coup(game.get('graine'), game['version'] + 1)
+        resultat = resoudre(action, perso['pv'], cible['pv'], cible['pv_max'], cible['vivant'], rng)
+        stats_active = game['stats'][equipe_active['nom']]
+        stats_active['degats_infliges'] += resultat.degats
+        stats_active['soins_effectues'] += resultat.soins
+        cible['pv'] = resultat.pv_cible
+        message = "🎯 CRITIQUE ! " if resultat.critique else ""
+        if action.soins:
+            if cible['vivant']:
+                message += f"{perso['nom']} soigne {cible['nom']} pour {resultat.soins} PV ({cible['pv']} PV)."
             else:
-                return jsonify({'error': 'Action invalide pour Archer'}), 400
+                message += f"{cible['nom']} est mort et ne peut être soigné."
         else:
-            return jsonify({'error': 'Type de personnage inconnu'}), 400
+            message += f"{perso['nom']} inflige {resultat.degats} dégâts à {cible['nom']} ({cible['pv']} PV restants)."
+            if cible['vivant'] and cible['pv'] <= 0:
+                cible['vivant'] = False
+                game['stats'][cible_equipe['nom']]['morts'] += 1
+                message += f" {cible['nom']} est mort !"
+        if action.contrecoup:
+            perso['pv'] = resultat.pv_acteur
+            message += f" {perso['nom']} subit {resultat.contrecoup} dégâts de contrecoup ({perso['pv']} PV restants)."
+            personnages_modifies.append((cle_active, personnage_index))
+            if perso['pv'] <= 0:
+                perso['vivant'] = False
+                stats_active['morts'] += 1
+                message += f" {perso['nom']} est mort !"
+        coup = {
+            'acteur': [cle_active, personnage_index], 'action': action.cle, 'cible': [cle_cible, cible_index],
+            'critique': resultat.critique, 'degats': resultat.degats, 'contrecoup': resultat.contrecoup, 'soins': resultat.soins,
+        }
 
         # Vérifier si la partie est terminée
         equipe1_vivante = any(p['vivant'] for p in game['equipe1']['personnages'])
         equipe2_vivante = any(p['vivant'] for p in game['equipe2']['personnages'])
         if not equipe1_vivante or not equipe2_vivante:
             game['status'] = 'finished'
-            return jsonify({'message': message})
+            partie_modifiee(game_id, game, 'status', 'stats', personnages=personnages_modifies,
+                            evenement=evenement_coup(game, message, personnages_modifies), coup=coup)
+            return {'message': message}, 200
 
         # Changer le tour
         game['tour_actuel'] += 1
         game['equipe_active_nom'] = game['equipe2']['nom'] if is_player1_turn else game['equipe1']['nom']
+        partie_modifiee(game_id, game, 'tour_actuel', 'equipe_active_nom', 'stats', personnages=personnages_modifies,
+                        evenement=evenement_coup(game, message, personnages_modifies), coup=coup)
 
-        return jsonify({'message': message})
+        return {'message': message}, 200
     except Exception as e:
-        return jsonify({'error': f'Erreur lors de l’action : {str(e)}'}), 400
+        return {'error': f'Erreur lors de l’action : {str(e)}'}, 400
+
+def lire_etat(game_id, since=None, delta=False, etags=(), binaire=False):
+    # Réponse de /game_state une fois l'éventuelle attente terminée : (octets, code, en-têtes).
+    # Sous verrou : une transition en cours ne doit pas être sérialisée à moitié.
+    # binaire : corps au format binaire.py plutôt qu'en JSON (voir accepte_binaire).
+    with verrou_partie(game_id):
+        # delta : seulement les champs modifiés depuis `since`
+        if since is not None and delta:
+            game = games.get(game_id)
+            if game is None:
+                return encoder_json({'error': 'Partie non trouvée'}), 404, {}
+            return (encoder_binaire if binaire else encoder_json)(delta_partie(game, since)), 200, {'Vary': 'Accept'}
+
+        # État complet : ETag = version (et format) ; If-None-Match identique -> 304 sans corps
+        version = games.version(game_id)
+        if version is None:
+            return encoder_json({'error': 'Partie non trouvée'}), 404, {}
+        etag = f"{game_id}-{version}-b" if binaire else f"{game_id}-{version}"
+        if etag in etags:
+            return b'', 304, {'ETag': f'"{etag}"', 'Vary': 'Accept'}
+        return etat_encode(game_id, version, binaire), 200, {'ETag': f'"{etag}"', 'Vary': 'Accept'}
+
+def rejeu_partie(game_id):
+    # Équipes au début du combat et journal complet des coups : de quoi rejouer la partie
+    with verrou_partie(game_id):
+        game = games.get(game_id)
+        if game is None:
+            return {'error': 'Partie non trouvée'}, 404
+        if not game['equipe1'] or not game['equipe2']:
+            return {'error': 'Partie non commencée'}, 400
+        equipes = {}
+        for cle in ('equipe1', 'equipe2'):
+            equipes[cle] = {
+                'nom': game[cle]['nom'],
+                'personnages': [dict(p, pv=p['pv_max'], vivant=True) for p in game[cle]['personnages']],
+            }
+        rejeu = {'game_id': game_id, 'map': game['map'], **equipes, 'coups': games.coups(game_id)}
+        if game['status'] == 'finished':
+            # Chaque coup se vérifie avec combat.rng_coup(graine, id du coup)
+            rejeu['graine'] = game.get('graine')
+        return rejeu, 200
+
+def evenements_a_envoyer(game_id, depuis):
+    with verrou_partie(game_id):
+        return games.evenements_depuis(game_id, depuis)
+
+def message_sse(evenement):
+    return f"id: {evenement['id']}\nevent: {evenement['type']}\ndata: {json.dumps(evenement['data'])}\n\n"
+
+def equipe_bot(nom_adverse):
+    # Équipe prédéfinie du bot, différente de celle du joueur humain
+    nom = next((n for n in EQUIPES if n != nom_adverse), nom_adverse)
+    return {
+        'nom': nom,
+        'personnages': [
+            {'type': classe, 'nom': perso, 'classe': classe, 'pv': pv, 'pv_max': pv, 'vivant': True, 'arme': arme}
+            for perso, classe, pv, arme in EQUIPES[nom]
+        ]
+    }
+
+def doit_jouer_bot(game):
+    return bool(game.get('bot_id')) and game['status'] == 'ongoing' and game['equipe_active_nom'] == game['equipe2']['nom']
+
+def tour_du_bot(game_id):
+    # Le bot réfléchit hors verrou sur une copie compacte de l'état, puis rejoue
+    # son coup via jouer_coup si la partie n'a pas changé entre-temps
+    with verrou_partie(game_id):
+        game = games.get(game_id)
+        if game is None or not doit_jouer_bot(game):
+            return
+        plateau, pv = Plateau.depuis_equipes(game['equipe2'], game['equipe1'])
+        version = game['version']
+    i, action, j = IA(BUDGET_BOT).rechercher(plateau, pv)
+    with transition(game_id):
+        game = games.get(game_id)
+        if game is None or game['version'] != version:
+            return
+        jouer_coup(game_id, game, game['bot_id'], i, action.cle, j)
+
+def texte_metriques():
+    # /metrics : compteurs de ce processus, jauges lues dans le stockage au moment de la collecte
+    return metriques.exposer(
+        histogrammes=[('assistes_duree_coup_secondes', "Durée de résolution d'un coup dans /make_move", duree_coup)],
+        jauges=[
+            ('assistes_parties', 'Parties stockées, par statut', [(f'status="{s}"', games.compter(s)) for s in STATUTS]),
+            ('assistes_parties_stockees', 'Nombre de parties dans le stockage', [('', len(games))]),
+        ],
+    )
+
+# --- Administration : profilage à la demande (voir profilage.py) ---
+
+def admin_refuse(authorization):
+    # None si la requête porte le jeton d'administration, sinon (réponse, code)
+    if not JETON_ADMIN:
+        return {'error': 'Route inconnue'}, 404
+    jeton = (authorization or '').removeprefix('Bearer ').strip()
+    if not secrets.compare_digest(jeton.encode(), JETON_ADMIN.encode()):
+        return {'error': 'Accès refusé'}, 403
+    return None
+
+def configurer_profilage(data):
+    # {'periode': N} : profile 1 requête sur N (0 : arrêt) ; 'routes' : noms des routes
+    # à profiler (ceux de /metrics), toutes par défaut ; 'reinitialiser' : efface les stats
+    if not data or not isinstance(data.get('periode'), int) or data['periode'] < 0:
+        return {'error': 'periode (entier positif ou nul) requise'}, 400
+    routes = data.get('routes')
+    if routes is not None and (not isinstance(routes, list) or not all(isinstance(r, str) for r in routes)):
+        return {'error': 'routes doit être une liste de noms de routes'}, 400
+    profilage.configurer(data['periode'], routes, bool(data.get('reinitialiser')))
+    return profilage.etat(), 200
+
+def rapport_profilage(params):
+    # Statistiques cumulées : (octets, code, type de contenu). ?format=pstats : fichier
+    # binaire de pstats (snakeviz...), sinon texte trié par ?tri=, limité à ?limite= lignes
+    if params.get('format') == 'pstats':
+        octets = profilage.export_pstats()
+        if octets is None:
+            return encoder_json({'error': 'Aucune requête profilée'}), 404, 'application/json'
+        return octets, 200, 'application/octet-stream'
+    tri = params.get('tri') or 'cumulative'
+    limite = params.get('limite') or 40
+    if tri not in profilage.TRIS or not isinstance(limite, int) or limite <= 0:
+        return encoder_json({'error': f"tri parmi {', '.join(profilage.TRIS)}, limite entière positive"}), 400, 'application/json'
+    return profilage.rapport(tri, limite).encode(), 200, 'text/plain; charset=utf-8'
+
+def echantillonner(params):
+    # Échantillonnage des piles pendant ?duree= secondes : (octets, code, type de contenu)
+    duree = params.get('duree')
+    intervalle = params.get('intervalle') or 0.005
+    if duree is None or not 0 < duree <= ECHANTILLONNAGE_MAX or not 0.001 <= intervalle <= 1:
+        return encoder_json({'error': f'duree entre 0 et {ECHANTILLONNAGE_MAX} s, intervalle entre 0.001 et 1 s'}), 400, 'application/json'
+    piles = profilage.echantillonner(duree, intervalle)
+    if piles is None:
+        return encoder_json({'error': 'Échantillonnage déjà en cours'}), 409, 'application/json'
+    return piles.encode(), 200, 'text/plain; charset=utf-8'
+
+# --- Routes Flask ---
+
+def repondre(reponse, code):
+    return reponse_json(encoder_json(reponse), code)
+
+# Durée et code de chaque réponse, par route (voir metriques.py) ; profil cProfile
+# d'un échantillon des requêtes quand le profilage est activé (voir profilage.py)
+@app.before_request
+def debut_requete():
+    request.environ['assistes.debut'] = time.perf_counter()
+    if profilage.actif:
+        request.environ['assistes.profil'] = profilage.commencer(metriques_par_endpoint.get(request.endpoint, route_inconnue).nom)
+
+@app.after_request
+def mesurer_requete(response):
+    debut = request.environ.get('assistes.debut')
+    if debut is not None:
+        metriques_par_endpoint.get(request.endpoint, route_inconnue).observer(time.perf_counter() - debut, response.status_code)
+    profil = request.environ.pop('assistes.profil', None)
+    if profil is not None:
+        profilage.terminer(profil)
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(texte_metriques(), content_type=metriques.TYPE_CONTENU)
+
+@app.route('/admin/profilage', methods=['GET', 'POST'])
+def admin_profilage():
+    refus = admin_refuse(request.headers.get('Authorization'))
+    if refus is not None:
+        return repondre(*refus)
+    if request.method == 'POST':
+        return repondre(*configurer_profilage(request.get_json(silent=True)))
+    octets, code, type_contenu = rapport_profilage({
+        'format': request.args.get('format'), 'tri': request.args.get('tri'), 'limite': request.args.get('limite', type=int),
+    })
+    return Response(octets, status=code, content_type=type_contenu)
+
+@app.route('/admin/echantillonnage', methods=['GET'])
+def admin_echantillonnage():
+    refus = admin_refuse(request.headers.get('Authorization'))
+    if refus is not None:
+        return repondre(*refus)
+    octets, code, type_contenu = echantillonner({
+        'duree': request.args.get('duree', type=float), 'intervalle': request.args.get('intervalle', type=float),
+    })
+    return Response(octets, status=code, content_type=type_contenu)
+
+@app.route('/create_game', methods=['POST'])
+def create_game():
+    return repondre(*creer_partie(request.json))
+
+@app.route('/join_game', methods=['POST'])
+def join_game():
+    return repondre(*rejoindre_partie(request.json))
+
+@app.route('/matchmaking', methods=['POST'])
+def matchmaking():
+    return repondre(*chercher_adversaire(request.json))
+
+@app.route('/lobby', methods=['GET'])
+def lobby():
+    return repondre(*lister_lobby({
+        'page': request.args.get('page', type=int),
+        'par_page': request.args.get('par_page', type=int),
+        'player_id': request.args.get('player_id'),
+    }))
+
+@app.route('/resume/<player_id>', methods=['GET'])
+def resume(player_id):
+    return repondre(*reprendre_partie(player_id))
+
+@app.route('/leave_game', methods=['POST'])
+def leave_game():
+    return repondre(*quitter_partie(request.json))
+
+@app.route('/add_bot', methods=['POST'])
+def add_bot():
+    return repondre(*ajouter_bot(request.json))
+
+@app.route('/submit_team', methods=['POST'])
+def submit_team():
+    return repondre(*soumettre_equipe(request.json))
+
+@app.route('/submit_map', methods=['POST'])
+def submit_map():
+    return repondre(*soumettre_carte(request.json))
+
+@app.route('/make_move', methods=['POST'])
+def make_move():
+    return repondre(*jouer(request.json))
+
+@app.route('/game_state/<game_id>', methods=['GET'])
+def get_game_state(game_id):
+    # Long-poll : avec ?since=<version>, on bloque jusqu'à ce que la version change
+    since = request.args.get('since', type=int)
+    if since is not None:
+        timeout = min(request.args.get('timeout', ATTENTE_MAX, type=float), ATTENTE_MAX)
+        attendre_changement(game_id, since, timeout)
+    binaire = accepte_binaire(request.headers.get('Accept', ''))
+    octets, code, headers = lire_etat(game_id, since, bool(request.args.get('delta')), request.if_none_match, binaire)
+    return reponse_json(octets, code, headers, type_etat(binaire, code))
+
+@app.route('/replay/<game_id>', methods=['GET'])
+def replay(game_id):
+    return repondre(*rejeu_partie(game_id))
+
+@app.route('/events/<game_id>', methods=['GET'])
+def game_events(game_id):
+    # Canal Server-Sent Events : résultats des coups et changements de statut.
+    # Reprise possible via ?since=<version> ou l'en-tête Last-Event-ID.
+    version = games.version(game_id)
+    if version is None:
+        return jsonify({'error': 'Partie non trouvée'}), 404
+    depart = request.args.get('since', type=int)
+    if depart is None:
+        # En-tête absent ou invalide : reprise à la version courante
+        depart = request.headers.get('Last-Event-ID', version, type=int)
+
+    def flux():
+        dernier = depart
+        while True:
+            version = attendre_changement(game_id, dernier, ATTENTE_MAX)
+            if version is None:
+                return
+            a_envoyer = evenements_a_envoyer(game_id, dernier)
+            # Des événements plus récents que `version` ont pu arriver entre-temps
+            dernier = max([version] + [e['id'] for e in a_envoyer])
+            if not a_envoyer:
+                yield ": ping\n\n"
+                continue
+            for e in a_envoyer:
+                yield message_sse(e)
+                if e['data']['status'] == 'finished':
+                    return
+
+    return Response(stream_with_context(flux()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# Une métrique par route, nommée d'après le premier segment de son URL (make_move, game_state...)
+metriques_par_endpoint = {
+    regle.endpoint: metriques.route(regle.rule.split('/')[1]) for regle in app.url_map.iter_rules() if regle.endpoint != 'static'
+}
+route_inconnue = metriques.route('inconnue')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=int(os.environ.get('ASSISTES_PORT', 5000)), threaded=True)
\ No newline at end of file
@@ -0,0 +1,286 @@
+import asyncio
+import json
+import time
+from urllib.parse import parse_qs
+
+import metriques
+import profilage
+import server
+from server import ATTENTE_MAX, INTERVALLE_VERIFICATION, encoder_json, games
+
+# Même API que server.py (mêmes routes, même contrat JSON), en ASGI.
+# Les attentes (long-poll /game_state, flux /events) sont des coroutines et non plus
+# des threads : des milliers de clients en attente ne coûtent que quelques Ko chacun.
+# Les actions (server.creer_partie, server.jouer...) sont celles de server.py ; elles
+# prennent des verrous et accèdent au stockage, elles tournent donc dans des threads.
+#
+# Lancement (pip install uvicorn) :
+#   uvicorn server_asgi:app --host 0.0.0.0 --port 5000
+# Production, plusieurs workers : le stockage en mémoire est propre à chaque processus,
+# il faut un stockage partagé :
+#   ASSISTES_STORE=sqlite:///parties.db uvicorn server_asgi:app --host 0.0.0.0 --port 5000 --workers 4
+# ou avec gunicorn comme gestionnaire de processus :
+#   ASSISTES_STORE=sqlite:///parties.db gunicorn server_asgi:app -k uvicorn.workers.UvicornWorker -w 4 -b 0.0.0.0:5000
+
+ACTIONS_POST = {
+    '/create_game': server.creer_partie,
+    '/join_game': server.rejoindre_partie,
+    '/matchmaking': server.chercher_adversaire,
+    '/leave_game': server.quitter_partie,
+    '/add_bot': server.ajouter_bot,
+    '/submit_team': server.soumettre_equipe,
+    '/submit_map': server.soumettre_carte,
+    '/make_move': server.jouer,
+}
+
+
+class Attentes:
+    # Réveille les coroutines en attente sur une partie quand server.partie_modifiee
+    # signale une transition (depuis n'importe quel thread du processus)
+    def __init__(self):
+        self.boucle = None
+        self.abonnes = {}
+
+    def signaler(self, game_id):
+        if self.boucle is not None and game_id in self.abonnes:
+            self.boucle.call_soon_threadsafe(self._reveiller, game_id)
+
+    def _reveiller(self, game_id):
+        for evenement in self.abonnes.get(game_id, ()):
+            evenement.set()
+
+    async def attendre_changement(self, game_id, since, timeout):
+        # Équivalent asynchrone de server.attendre_changement
+        boucle = asyncio.get_running_loop()
+        fin = boucle.time() + timeout
+        while True:
+            # Abonnement avant la lecture de la version : pas de réveil perdu entre les deux
+            evenement = asyncio.Event()
+            abonnes = self.abonnes.setdefault(game_id, set())
+            abonnes.add(evenement)
+            try:
+                version = await version_partie(game_id)
+                reste = fin - boucle.time()
+                if version is None or version != since or reste <= 0:
+                    return version
+                try:
+                    await asyncio.wait_for(evenement.wait(), min(reste, INTERVALLE_VERIFICATION) if games.partage else reste)
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                abonnes.discard(evenement)
+                if not abonnes:
+                    self.abonnes.pop(game_id, None)
+
+
+attentes = Attentes()
+server.observateurs.append(attentes.signaler)
+
+
+async def version_partie(game_id):
+    if games.partage:
+        return await asyncio.to_thread(games.version, game_id)
+    return games.version(game_id)
+
+
+def entier(valeur, type=int):
+    # Comme request.args.get(..., type=int) côté Flask : None si absent ou invalide
+    try:
+        return type(valeur)
+    except (TypeError, ValueError):
+        return None
+
+
+def etags(valeur):
+    # En-tête If-None-Match -> ensemble des ETags sans guillemets
+    return {e.strip().removeprefix('W/').strip('"') for e in valeur.split(',') if e.strip()}
+
+
+async def repondre(send, code, corps=b'', headers=None, type_contenu='application/json'):
+    entetes = [(b'content-type', type_contenu.encode()), (b'content-length', str(len(corps)).encode())]
+    entetes += [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()]
+    await send({'type': 'http.response.start', 'status': code, 'headers': entetes})
+    await send({'type': 'http.response.body', 'body': corps})
+
+
+async def en_thread(route, fonction, *args):
+    # Action exécutée dans un thread, profilée (profilage.py) si le profilage est activé
+    if profilage.actif:
+        return await asyncio.to_thread(profilage.executer, route, fonction, *args)
+    return await asyncio.to_thread(fonction, *args)
+
+
+async def lire_corps(receive):
+    corps = b''
+    while True:
+        message = await receive()
+        corps += message.get('body', b'')
+        if not message.get('more_body'):
+            return corps
+
+
+async def action(send, receive, fonction, route):
+    corps = await lire_corps(receive)
+    try:
+        data = json.loads(corps) if corps else None
+    except ValueError:
+        data = None
+    reponse, code = await en_thread(route, fonction, data)
+    await repondre(send, code, encoder_json(reponse))
+
+
+async def lobby(send, params):
+    reponse, code = await asyncio.to_thread(
+        server.lister_lobby, {
+            'page': entier(params.get('page')), 'par_page': entier(params.get('par_page')),
+            'player_id': params.get('player_id'),
+        }
+    )
+    await repondre(send, code, encoder_json(reponse))
+
+
+async def resume(send, player_id):
+    reponse, code = await asyncio.to_thread(server.reprendre_partie, player_id)
+    await repondre(send, code, encoder_json(reponse))
+
+
+async def replay(send, game_id):
+    reponse, code = await asyncio.to_thread(server.rejeu_partie, game_id)
+    await repondre(send, code, encoder_json(reponse))
+
+
+async def metrics(send):
+    texte = await asyncio.to_thread(server.texte_metriques)
+    await repondre(send, 200, texte.encode(), type_contenu=metriques.TYPE_CONTENU)
+
+
+async def admin(send, receive, chemin, methode, params, entetes):
+    # Routes /admin de server.py (profilage à la demande)
+    refus = server.admin_refuse(entetes.get('authorization'))
+    if refus is not None:
+        return await repondre(send, refus[1], encoder_json(refus[0]))
+    if chemin == '/admin/profilage' and methode == 'POST':
+        return await action(send, receive, server.configurer_profilage, 'admin')
+    if chemin == '/admin/profilage' and methode == 'GET':
+        octets, code, type_contenu = server.rapport_profilage(
+            {'format': params.get('format'), 'tri': params.get('tri'), 'limite': entier(params.get('limite'))}
+        )
+        return await repondre(send, code, octets, type_contenu=type_contenu)
+    if chemin == '/admin/echantillonnage' and methode == 'GET':
+        octets, code, type_contenu = await asyncio.to_thread(
+            server.echantillonner, {'duree': entier(params.get('duree'), float), 'intervalle': entier(params.get('intervalle'), float)}
+        )
+        return await repondre(send, code, octets, type_contenu=type_contenu)
+    await repondre(send, 404, encoder_json({'error': 'Route inconnue'}))
+
+
+async def game_state(send, game_id, params, entetes):
+    since = entier(params.get('since'))
+    if since is not None:
+        timeout = entier(params.get('timeout'), float)
+        timeout = ATTENTE_MAX if timeout is None else min(max(timeout, 0), ATTENTE_MAX)
+        await attentes.attendre_changement(game_id, since, timeout)
+    binaire = server.accepte_binaire(entetes.get('accept', ''))
+    octets, code, headers = await en_thread(
+        'game_state', server.lire_etat, game_id, since, bool(params.get('delta')), etags(entetes.get('if-none-match', '')), binaire
+    )
+    await repondre(send, code, octets, headers, server.type_etat(binaire, code))
+
+
+async def events(send, receive, game_id, params, entetes):
+    version = await version_partie(game_id)
+    if version is None:
+        return await repondre(send, 404, encoder_json({'error': 'Partie non trouvée'}))
+    depart = entier(params.get('since'))
+    if depart is None:
+        depart = entier(entetes.get('last-event-id', version))
+    if depart is None:
+        depart = version
+
+    async def flux():
+        await send({'type': 'http.response.start', 'status': 200, 'headers': [
+            (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'), (b'x-accel-buffering', b'no'),
+        ]})
+        dernier = depart
+        while True:
+            version = await attentes.attendre_changement(game_id, dernier, ATTENTE_MAX)
+            if version is None:
+                break
+            a_envoyer = await asyncio.to_thread(server.evenements_a_envoyer, game_id, dernier)
+            dernier = max([version] + [e['id'] for e in a_envoyer])
+            if not a_envoyer:
+                await send({'type': 'http.response.body', 'body': b": ping\n\n", 'more_body': True})
+                continue
+            fini = False
+            for e in a_envoyer:
+                await send({'type': 'http.response.body', 'body': server.message_sse(e).encode(), 'more_body': True})
+                if e['data']['status'] == 'finished':
+                    fini = True
+                    break
+            if fini:
+                break
+        await send({'type': 'http.response.body', 'body': b''})
+
+    async def deconnexion():
+        while (await receive())['type'] != 'http.disconnect':
+            pass
+
+    # Le flux s'arrête dès que le client se déconnecte
+    taches = {asyncio.ensure_future(flux()), asyncio.ensure_future(deconnexion())}
+    _, restantes = await asyncio.wait(taches, return_when=asyncio.FIRST_COMPLETED)
+    for tache in restantes:
+        tache.cancel()
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                attentes.boucle = asyncio.get_running_loop()
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+    attentes.boucle = asyncio.get_running_loop()
+
+    # Mêmes métriques que server.py : durée et code de la réponse, par route
+    debut = time.perf_counter()
+    code = 500
+
+    async def envoyer(message):
+        nonlocal code
+        if message['type'] == 'http.response.start':
+            code = message['status']
+        await send(message)
+
+    try:
+        await router(scope, receive, envoyer)
+    finally:
+        mesure = metriques.routes.get(scope['path'].split('/', 2)[1], server.route_inconnue)
+        mesure.observer(time.perf_counter() - debut, code)
+
+
+async def router(scope, receive, send):
+    chemin, methode = scope['path'], scope['method']
+    params = {k: v[-1] for k, v in parse_qs(scope.get('query_string', b'').decode()).items()}
+    entetes = {k.decode().lower(): v.decode() for k, v in scope.get('headers', [])}
+    if methode == 'POST' and chemin in ACTIONS_POST:
+        return await action(send, receive, ACTIONS_POST[chemin], chemin[1:])
+    if methode == 'GET' and chemin == '/metrics':
+        return await metrics(send)
+    if chemin.startswith('/admin/'):
+        return await admin(send, receive, chemin, methode, params, entetes)
+    if methode == 'GET' and chemin == '/lobby':
+        return await lobby(send, params)
+    if methode == 'GET' and chemin.startswith('/resume/'):
+        return await resume(send, chemin[len('/resume/'):])
+    if methode == 'GET' and chemin.startswith('/replay/'):
+        return await replay(send, chemin[len('/replay/'):])
+    if methode == 'GET' and chemin.startswith('/game_state/'):
+        return await game_state(send, chemin[len('/game_state/'):], params, entetes)
+    if methode == 'GET' and chemin.startswith('/events/'):
+        return await events(send, receive, chemin[len('/events/'):], params, entetes)
+    await repondre(send, 404, encoder_json({'error': 'Route inconnue'}))
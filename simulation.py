@@ -0,0 +1,250 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from combat import CATALOGUE, EQUIPES, Action, resoudre
+
+# Simulation de parties sans interface ni sauvegarde, pour l'équilibrage.
+# Exemple : python simulation.py -n 200000 --politique1 focus --param Archer.2.chance_critique=0.2,0.3,0.4
+# Avec --moteur numpy (politique aléatoire seulement), voir simulation_vectorisee.py.
+
+# Garde-fou contre les parties qui ne se terminent jamais (soins infinis...)
+TOURS_MAX = 1000
+
+
+class Combattant:
+    __slots__ = ('type', 'pv', 'pv_max')
+
+    def __init__(self, type, pv, pv_max):
+        self.type = type
+        self.pv = pv
+        self.pv_max = pv_max
+
+
+def table_actions(surcharges=None):
+    # Table {classe: [actions]} avec d'éventuelles valeurs modifiées,
+    # ex. {'Warrior.1.degats': (40, 55), 'Archer.2.chance_critique': 0.4}
+    surcharges = surcharges or {}
+    table = {}
+    for action in CATALOGUE:
+        valeurs = {attribut: getattr(action, attribut) for attribut in Action.__slots__}
+        for cle, valeur in surcharges.items():
+            classe, action_key, attribut = cle.split('.')
+            if (classe, action_key) == (action.type, action.cle):
+                valeurs[attribut] = valeur
+        table.setdefault(action.type, []).append(Action(**valeurs))
+    return table
+
+
+def degats_moyens(action):
+    if not action.degats:
+        return 0
+    moyenne = sum(action.degats) / 2
+    return moyenne * (1 + action.chance_critique * (action.multiplicateur_critique - 1))
+
+
+# --- Politiques : (allies, ennemis, rng, actions) -> (index acteur, action, index cible) ---
+
+def politique_aleatoire(allies, ennemis, rng, actions):
+    acteur = rng.choice([i for i, c in enumerate(allies) if c.pv > 0])
+    action = rng.choice(actions[allies[acteur].type])
+    cibles = allies if action.cible == 'allie' else ennemis
+    return acteur, action, rng.choice([i for i, c in enumerate(cibles) if c.pv > 0])
+
+
+def politique_focus(allies, ennemis, rng, actions):
+    # Soigne l'allié le plus blessé s'il est sous la moitié de ses PV,
+    # sinon frappe l'ennemi le plus faible avec la meilleure attaque disponible
+    vivants = [i for i, c in enumerate(allies) if c.pv > 0]
+    blesse = min(vivants, key=lambda i: allies[i].pv / allies[i].pv_max)
+    if allies[blesse].pv * 2 < allies[blesse].pv_max:
+        for i in vivants:
+            for action in actions[allies[i].type]:
+                if action.cible == 'allie':
+                    return i, action, blesse
+    cible = min((i for i, c in enumerate(ennemis) if c.pv > 0), key=lambda i: ennemis[i].pv)
+    acteur, action = max(
+        ((i, a) for i in vivants for a in actions[allies[i].type] if a.cible != 'allie'),
+        key=lambda choix: degats_moyens(choix[1]) - (sum(choix[1].contrecoup) / 2 if choix[1].contrecoup else 0)
+    )
+    return acteur, action, cible
+
+
+POLITIQUES = {
+    'aleatoire': politique_aleatoire,
+    'focus': politique_focus,
+}
+
+
+def jouer_partie(equipe1, equipe2, politiques, rng, actions):
+    # Une partie complète ; l'équipe 1 commence, comme sur le serveur.
+    # Renvoie (vainqueur 0/1 ou None, tour_actuel, stats par équipe)
+    camps = (
+        [Combattant(classe, pv, pv) for _, classe, pv, _ in equipe1],
+        [Combattant(classe, pv, pv) for _, classe, pv, _ in equipe2],
+    )
+    stats = ({'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0},
+             {'degats_infliges': 0, 'soins_effectues': 0, 'morts': 0})
+    tour_actuel = 1
+    actif = 0
+    while True:
+        allies, ennemis = camps[actif], camps[1 - actif]
+        i, action, j = politiques[actif](allies, ennemis, rng, actions)
+        acteur = allies[i]
+        camp_cible = actif if action.cible == 'allie' else 1 - actif
+        cible = camps[camp_cible][j]
+        resultat = resoudre(action, acteur.pv, cible.pv, cible.pv_max, cible.pv > 0, rng)
+        stats[actif]['degats_infliges'] += resultat.degats
+        stats[actif]['soins_effectues'] += resultat.soins
+        if cible.pv > 0 and resultat.pv_cible <= 0:
+            stats[camp_cible]['morts'] += 1
+        cible.pv = resultat.pv_cible
+        if action.contrecoup:
+            if acteur.pv > 0 and resultat.pv_acteur <= 0:
+                stats[actif]['morts'] += 1
+            acteur.pv = resultat.pv_acteur
+
+        vivants1 = any(c.pv > 0 for c in camps[0])
+        vivants2 = any(c.pv > 0 for c in camps[1])
+        if not vivants1 or not vivants2:
+            vainqueur = None if vivants1 == vivants2 else (0 if vivants1 else 1)
+            return vainqueur, tour_actuel, stats
+        if tour_actuel >= TOURS_MAX:
+            return None, tour_actuel, stats
+        tour_actuel += 1
+        actif = 1 - actif
+
+
+def rapport_vide():
+    return {
+        'parties': 0,
+        'victoires': [0, 0],
+        'egalites': 0,
+        'tours': 0,
+        'degats_infliges': [0, 0],
+        'soins_effectues': [0, 0],
+        'morts': [0, 0],
+    }
+
+
+def fusionner(rapport, autre):
+    for cle in ('parties', 'egalites', 'tours'):
+        rapport[cle] += autre[cle]
+    for cle in ('victoires', 'degats_infliges', 'soins_effectues', 'morts'):
+        rapport[cle] = [a + b for a, b in zip(rapport[cle], autre[cle])]
+    return rapport
+
+
+def simuler(n, equipe1, equipe2, politique1='aleatoire', politique2='aleatoire', graine=None, surcharges=None):
+    rng = random.Random(graine)
+    actions = table_actions(surcharges)
+    politiques = (POLITIQUES[politique1], POLITIQUES[politique2])
+    membres1, membres2 = EQUIPES[equipe1], EQUIPES[equipe2]
+    rapport = rapport_vide()
+    for _ in range(n):
+        vainqueur, tours, stats = jouer_partie(membres1, membres2, politiques, rng, actions)
+        rapport['parties'] += 1
+        rapport['tours'] += tours
+        if vainqueur is None:
+            rapport['egalites'] += 1
+        else:
+            rapport['victoires'][vainqueur] += 1
+        for camp in (0, 1):
+            for cle in ('degats_infliges', 'soins_effectues', 'morts'):
+                rapport[cle][camp] += stats[camp][cle]
+    return rapport
+
+
+def _simuler_lot(arguments):
+    moteur, *reste = arguments
+    if moteur == 'numpy':
+        from simulation_vectorisee import simuler_vectorise
+        return simuler_vectorise(*reste)
+    return simuler(*reste)
+
+
+def _agreger(resultats):
+    rapport = rapport_vide()
+    for resultat in resultats:
+        fusionner(rapport, resultat)
+    return rapport
+
+
+def simuler_parallele(n, equipe1, equipe2, politique1='aleatoire', politique2='aleatoire',
+                      graine=0, surcharges=None, processus=None, moteur='python'):
+    # Répartit les n parties en lots sur plusieurs processus. Chaque lot a sa propre graine
+    # (graine + numéro du lot) : le résultat ne dépend pas de l'ordonnancement.
+    processus = processus or os.cpu_count() or 1
+    nb_lots = min(n, processus * 4) or 1
+    lots = [
+        (moteur, n // nb_lots + (1 if k < n % nb_lots else 0), equipe1, equipe2, politique1, politique2, graine + k, surcharges)
+        for k in range(nb_lots)
+    ]
+    if processus == 1:
+        return _agreger(map(_simuler_lot, lots))
+    with ProcessPoolExecutor(max_workers=processus) as executeur:
+        return _agreger(executeur.map(_simuler_lot, lots))
+
+
+def resume(rapport, equipe1, equipe2):
+    n = rapport['parties'] or 1
+    return {
+        'parties': rapport['parties'],
+        'taux_victoire': {equipe1: rapport['victoires'][0] / n, equipe2: rapport['victoires'][1] / n},
+        'taux_egalite': rapport['egalites'] / n,
+        'tour_actuel_moyen': rapport['tours'] / n,
+        'degats_infliges_moyens': {equipe1: rapport['degats_infliges'][0] / n, equipe2: rapport['degats_infliges'][1] / n},
+        'soins_effectues_moyens': {equipe1: rapport['soins_effectues'][0] / n, equipe2: rapport['soins_effectues'][1] / n},
+        'morts_moyennes': {equipe1: rapport['morts'][0] / n, equipe2: rapport['morts'][1] / n},
+    }
+
+
+def lire_valeur(texte):
+    # "40:55" -> (40, 55) ; "0.3" -> 0.3 ; "12" -> 12
+    if ':' in texte:
+        return tuple(int(v) for v in texte.split(':'))
+    return float(texte) if '.' in texte else int(texte)
+
+
+def grille(params):
+    # ["Archer.2.chance_critique=0.2,0.3", ...] -> liste de dictionnaires de surcharges
+    axes = []
+    for param in params:
+        cle, _, valeurs = param.partition('=')
+        axes.append([(cle, lire_valeur(v)) for v in valeurs.split(',')])
+    return [dict(combinaison) for combinaison in itertools.product(*axes)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulation de parties sans interface pour l'équilibrage")
+    equipes = list(EQUIPES)
+    parser.add_argument('-n', '--parties', type=int, default=10000)
+    parser.add_argument('--equipe1', choices=equipes, default=equipes[0])
+    parser.add_argument('--equipe2', choices=equipes, default=equipes[1])
+    parser.add_argument('--politique1', choices=POLITIQUES, default='aleatoire')
+    parser.add_argument('--politique2', choices=POLITIQUES, default='aleatoire')
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--processus', type=int, default=None, help="nombre de processus (défaut : tous les cœurs)")
+    parser.add_argument('--moteur', choices=('python', 'numpy'), default='python')
+    parser.add_argument('--param', action='append', default=[],
+                        help="Classe.action.attribut=v1,v2,... (intervalles : min:max)")
+    args = parser.parse_args()
+
+    for surcharges in grille(args.param):
+        debut = time.perf_counter()
+        rapport = simuler_parallele(args.parties, args.equipe1, args.equipe2, args.politique1, args.politique2,
+                                    args.graine, surcharges, args.processus, args.moteur)
+        duree = time.perf_counter() - debut
+        print(json.dumps({
+            'surcharges': surcharges,
+            **resume(rapport, args.equipe1, args.equipe2),
+            'parties_par_seconde': round(rapport['parties'] / duree),
+        }, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+import numpy as np
+
+from combat import EQUIPES
+from simulation import TOURS_MAX, fusionner, rapport_vide, table_actions
+
+# Moteur Monte-Carlo vectorisé : K parties jouées en parallèle dans des tableaux NumPy.
+# Toutes les parties avancent d'un coup à chaque pas, donc l'équipe active est la même
+# partout (l'équipe 1 aux pas pairs). Les parties terminées sont simplement masquées.
+# Seule la politique 'aleatoire' est vectorisée ; les règles sont celles de combat.py.
+
+# Nombre de parties par bloc (limite la mémoire : quelques Mo par bloc)
+TAILLE_BLOC = 100_000
+
+# Colonnes du tirage uniforme fait une seule fois par pas pour toutes les parties
+U_ACTEUR, U_ACTION, U_CIBLE, U_CRITIQUE, U_DEGATS, U_CONTRECOUP, U_SOINS = range(7)
+
+
+def parametres(actions):
+    # Tableaux (classe, action) des intervalles de la table d'actions ; une action sans
+    # dégâts/soins/contrecoup a l'intervalle (0, 0), qui donne toujours 0.
+    classes = list(actions)
+    nb_actions_max = max(len(liste) for liste in actions.values())
+    forme = (len(classes), nb_actions_max)
+    p = {nom: np.zeros(forme) for nom in (
+        'degats_min', 'degats_max', 'soins_min', 'soins_max', 'contrecoup_min', 'contrecoup_max',
+        'critique', 'multiplicateur'
+    )}
+    p['allie'] = np.zeros(forme, dtype=bool)
+    p['nb_actions'] = np.array([len(actions[c]) for c in classes])
+    for t, classe in enumerate(classes):
+        for a, action in enumerate(actions[classe]):
+            p['degats_min'][t, a], p['degats_max'][t, a] = action.degats or (0, 0)
+            p['soins_min'][t, a], p['soins_max'][t, a] = action.soins or (0, 0)
+            p['contrecoup_min'][t, a], p['contrecoup_max'][t, a] = action.contrecoup or (0, 0)
+            p['critique'][t, a] = action.chance_critique
+            p['multiplicateur'][t, a] = action.multiplicateur_critique
+            p['allie'][t, a] = action.cible == 'allie'
+    return classes, p
+
+
+def choisir_vivant(vivants, u):
+    # Pour chaque ligne, indice d'un membre vivant tiré uniformément à partir de u dans [0, 1)
+    nb = vivants.sum(axis=1)
+    rang = (u * nb).astype(np.int64)
+    return np.argmax(np.cumsum(vivants, axis=1) > rang[:, None], axis=1)
+
+
+def tirer(minimum, maximum, u):
+    # Équivalent vectorisé de random.randint(minimum, maximum)
+    return np.floor(minimum + u * (maximum - minimum + 1)).astype(np.int64)
+
+
+def simuler_bloc(k, types, pv_max, p, rng):
+    rapport = rapport_vide()
+    pv = np.broadcast_to(pv_max, (k,) + pv_max.shape).astype(np.int64)
+    degats = np.zeros((k, 2), dtype=np.int64)
+    soins = np.zeros((k, 2), dtype=np.int64)
+    morts = np.zeros((k, 2), dtype=np.int64)
+    parties = np.arange(k)
+
+    for tour in range(1, TOURS_MAX + 1):
+        if parties.size == 0:
+            break
+        actif = (tour - 1) % 2
+        n = parties.size
+        u = rng.random((n, 7))
+        etat = pv[parties]
+
+        # Acteur, action, cible
+        acteur = choisir_vivant(etat[:, actif] > 0, u[:, U_ACTEUR])
+        type_acteur = types[actif][acteur]
+        action = (u[:, U_ACTION] * p['nb_actions'][type_acteur]).astype(np.int64)
+        allie = p['allie'][type_acteur, action]
+        camp_cible = np.where(allie, actif, 1 - actif)
+        cible = choisir_vivant(etat[np.arange(n), camp_cible] > 0, u[:, U_CIBLE])
+
+        # Jets (même ordre logique que combat.resoudre)
+        critique = u[:, U_CRITIQUE] < p['critique'][type_acteur, action]
+        d = tirer(p['degats_min'][type_acteur, action], p['degats_max'][type_acteur, action], u[:, U_DEGATS])
+        d = np.where(critique, (d * p['multiplicateur'][type_acteur, action]).astype(np.int64), d)
+        c = tirer(p['contrecoup_min'][type_acteur, action], p['contrecoup_max'][type_acteur, action], u[:, U_CONTRECOUP])
+        s = tirer(p['soins_min'][type_acteur, action], p['soins_max'][type_acteur, action], u[:, U_SOINS])
+
+        # Application sur la cible : dégâts, ou soins plafonnés à pv_max
+        pv_cible = pv[parties, camp_cible, cible]
+        pv_max_cible = pv_max[camp_cible, cible]
+        apres = np.where(allie, np.minimum(pv_max_cible, pv_cible + s), np.maximum(0, pv_cible - d))
+        pv[parties, camp_cible, cible] = apres
+        degats[parties, actif] += d
+        soins[parties, actif] += np.where(allie, apres - pv_cible, 0)
+        morts[parties, camp_cible] += (pv_cible > 0) & (apres <= 0)
+
+        # Contrecoup sur l'acteur
+        pv_acteur = pv[parties, actif, acteur]
+        apres_acteur = np.maximum(0, pv_acteur - c)
+        pv[parties, actif, acteur] = apres_acteur
+        morts[parties, actif] += (pv_acteur > 0) & (apres_acteur <= 0)
+
+        # Fin de partie
+        vivants = (pv[parties] > 0).any(axis=2)
+        finies = ~vivants.all(axis=1)
+        if tour == TOURS_MAX:
+            finies[:] = True
+        if finies.any():
+            v1, v2 = vivants[finies, 0], vivants[finies, 1]
+            rapport['victoires'][0] += int((v1 & ~v2).sum())
+            rapport['victoires'][1] += int((v2 & ~v1).sum())
+            rapport['egalites'] += int((v1 == v2).sum())
+            rapport['tours'] += tour * int(finies.sum())
+            parties = parties[~finies]
+
+    rapport['parties'] = k
+    rapport['degats_infliges'] = degats.sum(axis=0).tolist()
+    rapport['soins_effectues'] = soins.sum(axis=0).tolist()
+    rapport['morts'] = morts.sum(axis=0).tolist()
+    return rapport
+
+
+def simuler_vectorise(n, equipe1, equipe2, politique1='aleatoire', politique2='aleatoire', graine=None, surcharges=None):
+    # Même signature et même rapport que simulation.simuler
+    if politique1 != 'aleatoire' or politique2 != 'aleatoire':
+        raise ValueError("Le moteur numpy ne gère que la politique 'aleatoire'")
+    classes, p = parametres(table_actions(surcharges))
+    membres = (EQUIPES[equipe1], EQUIPES[equipe2])
+    types = np.array([[classes.index(classe) for _, classe, _, _ in m] for m in membres])
+    pv_max = np.array([[pv for _, _, pv, _ in m] for m in membres], dtype=np.int64)
+    rng = np.random.default_rng(graine)
+
+    rapport = rapport_vide()
+    for debut in range(0, n, TAILLE_BLOC):
+        fusionner(rapport, simuler_bloc(min(TAILLE_BLOC, n - debut), types, pv_max, p, rng))
+    return rapport
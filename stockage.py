@@ -0,0 +1,462 @@
+import copy
+import itertools
+import json
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager, nullcontext
+from urllib.parse import parse_qs
+
+import binaire
+
+# Durée de vie (en secondes) d'une partie inactive, selon son statut.
+# Les statuts absents de ce dictionnaire ne sont jamais purgés.
+# Une partie commencée reste reprenable (/resume) tant qu'elle n'a pas expiré.
+TTL_PAR_STATUT = {
+    'finished': 10 * 60,
+    'waiting_player2': 30 * 60,
+    'waiting_teams': 60 * 60,
+    'waiting_map': 60 * 60,
+    'ongoing': 24 * 60 * 60,
+}
+
+# Nombre d'événements conservés par partie pour le canal /events
+TAILLE_JOURNAL = 64
+
+# Stockage SQLite : nombre de coups entre deux instantanés complets d'une partie.
+# Entre deux instantanés, un coup n'ajoute qu'une ligne au journal des coups.
+INTERVALLE_INSTANTANE = 16
+
+
+def appliquer_coup(game, coup):
+    # Rejoue un coup du journal (voir server.partie_modifiee) sur l'état d'une partie
+    version = coup['id']
+    versions = game['_versions']
+    for champ, valeur in coup['champs'].items():
+        game[champ] = copy.deepcopy(valeur)
+        versions[champ] = version
+    for cle, index, pv, vivant in coup['personnages']:
+        personnage = game[cle]['personnages'][index]
+        personnage['pv'] = pv
+        personnage['vivant'] = vivant
+        versions['personnages'][cle][index] = version
+    game['version'] = version
+
+
+class GameStore:
+    # Interface commune des stockages de parties utilisés par server.py.
+    # `partage` vaut True quand plusieurs processus (workers gunicorn) écrivent
+    # dans le même stockage : les attentes doivent alors revérifier la version.
+    partage = False
+
+    def __init__(self, ttl=None):
+        self.ttl = dict(TTL_PAR_STATUT if ttl is None else ttl)
+
+    def get(self, game_id):
+        raise NotImplementedError
+
+    def put(self, game_id, game):
+        raise NotImplementedError
+
+    def delete(self, game_id):
+        raise NotImplementedError
+
+    def version(self, game_id):
+        game = self.get(game_id)
+        return None if game is None else game['version']
+
+    def transaction(self):
+        # Rend atomique, entre processus, une lecture-modification-écriture de partie.
+        # Inutile en mémoire : le verrou de la partie côté serveur suffit.
+        return nullcontext()
+
+    def ajouter_coup(self, game_id, game, coup):
+        # Enregistre la partie après un coup : le coup est ajouté au journal des coups
+        # de la partie (append-only), l'état complet n'est pas forcément réécrit
+        raise NotImplementedError
+
+    def coups(self, game_id):
+        # Journal complet des coups de la partie, dans l'ordre (rejeu)
+        raise NotImplementedError
+
+    def lister(self, status, limite=None, decalage=0):
+        # Identifiants des parties ayant ce statut, les plus anciennes dans ce statut d'abord
+        raise NotImplementedError
+
+    def compter(self, status):
+        raise NotImplementedError
+
+    def parties_du_joueur(self, player_id):
+        # Identifiants des parties où ce joueur est player1_id ou player2_id,
+        # la plus récemment active en dernier
+        raise NotImplementedError
+
+    def inactives(self, avant, limite=None):
+        # Identifiants des parties sans activité depuis le timestamp `avant`, les plus anciennes d'abord
+        raise NotImplementedError
+
+    def ajouter_evenement(self, game_id, evenement):
+        raise NotImplementedError
+
+    def evenements_depuis(self, game_id, version):
+        raise NotImplementedError
+
+    def purger(self, maintenant=None):
+        # Supprime les parties dont le TTL (selon leur statut) est dépassé,
+        # renvoie le nombre de parties supprimées
+        raise NotImplementedError
+
+    def __contains__(self, game_id):
+        return self.version(game_id) is not None
+
+    def __len__(self):
+        raise NotImplementedError
+
+
+class MemoryGameStore(GameStore):
+    # Stockage dans le processus courant (un seul worker, perdu au redémarrage)
+    def __init__(self, ttl=None):
+        super().__init__(ttl)
+        self._parties = {}
+        self._evenements = {}
+        self._coups = {}
+        # Index secondaires, mis à jour à chaque put (toute transition passe par put) :
+        # - {game_id: timestamp}, réinséré à chaque activité : les plus anciennes en tête ;
+        # - {status: {game_id: None}} et {player_id: {game_id: None}} (dicts ordonnés utilisés
+        #   comme ensembles), avec les clés indexées de chaque partie, les parties étant
+        #   modifiées sur place.
+        # Les index sont modifiés sous les verrous de parties différentes : un verrou du
+        # stockage protège leurs mises à jour et leurs lectures (jamais d'itération à nu).
+        self._verrou = threading.RLock()
+        self._activite = {}
+        self._par_statut = {}
+        self._statut = {}
+        self._par_joueur = {}
+        self._joueurs = {}
+
+    def get(self, game_id):
+        return self._parties.get(game_id)
+
+    def put(self, game_id, game):
+        with self._verrou:
+            self._parties[game_id] = game
+            self._activite.pop(game_id, None)
+            self._activite[game_id] = time.time()
+            self._indexer(game_id, game['status'], (game['player1_id'], game['player2_id']))
+
+    def _indexer(self, game_id, status, joueurs):
+        # Appelant : verrou du stockage détenu
+        ancien = self._statut.get(game_id)
+        if ancien != status:
+            if ancien is not None:
+                self._par_statut[ancien].pop(game_id, None)
+            if status is None:
+                self._statut.pop(game_id, None)
+            else:
+                self._statut[game_id] = status
+                self._par_statut.setdefault(status, {})[game_id] = None
+        anciens = self._joueurs.get(game_id, ())
+        if anciens != joueurs:
+            for player_id in anciens:
+                if player_id is not None and player_id not in joueurs:
+                    parties = self._par_joueur[player_id]
+                    parties.pop(game_id, None)
+                    if not parties:
+                        del self._par_joueur[player_id]
+            for player_id in joueurs:
+                if player_id is not None:
+                    self._par_joueur.setdefault(player_id, {})[game_id] = None
+            if joueurs:
+                self._joueurs[game_id] = joueurs
+            else:
+                self._joueurs.pop(game_id, None)
+
+    def delete(self, game_id):
+        with self._verrou:
+            self._parties.pop(game_id, None)
+            self._activite.pop(game_id, None)
+            self._evenements.pop(game_id, None)
+            self._coups.pop(game_id, None)
+            self._indexer(game_id, None, ())
+
+    def ajouter_coup(self, game_id, game, coup):
+        # La partie est déjà modifiée sur place : seul le journal est à compléter
+        self._coups.setdefault(game_id, []).append(coup)
+        self.put(game_id, game)
+
+    def coups(self, game_id):
+        return list(self._coups.get(game_id, ()))
+
+    def lister(self, status, limite=None, decalage=0):
+        fin = None if limite is None else decalage + limite
+        with self._verrou:
+            return list(itertools.islice(self._par_statut.get(status, ()), decalage, fin))
+
+    def compter(self, status):
+        with self._verrou:
+            return len(self._par_statut.get(status, ()))
+
+    def parties_du_joueur(self, player_id):
+        with self._verrou:
+            return sorted(self._par_joueur.get(player_id, ()), key=self._activite.__getitem__)
+
+    def inactives(self, avant, limite=None):
+        with self._verrou:
+            ids = itertools.takewhile(lambda game_id: self._activite[game_id] < avant, self._activite)
+            return list(itertools.islice(ids, limite))
+
+    def ajouter_evenement(self, game_id, evenement):
+        journal = self._evenements.get(game_id)
+        if journal is None:
+            journal = self._evenements[game_id] = deque(maxlen=TAILLE_JOURNAL)
+        journal.append(evenement)
+
+    def evenements_depuis(self, game_id, version):
+        return [e for e in self._evenements.get(game_id, ()) if e['id'] > version]
+
+    def purger(self, maintenant=None):
+        maintenant = time.time() if maintenant is None else maintenant
+        if not self.ttl:
+            return 0
+        # Index par activité : seules les parties inactives depuis le plus court TTL sont lues
+        with self._verrou:
+            expirees = [
+                game_id for game_id in self.inactives(maintenant - min(self.ttl.values()))
+                if self._statut[game_id] in self.ttl and maintenant - self._activite[game_id] > self.ttl[self._statut[game_id]]
+            ]
+            for game_id in expirees:
+                self.delete(game_id)
+        return len(expirees)
+
+    def __len__(self):
+        return len(self._parties)
+
+
+def decoder(donnees):
+    # Colonnes etat/data de SQLiteGameStore : JSON (texte) ou format binaire (BLOB)
+    if isinstance(donnees, bytes):
+        return binaire.decoder(donnees)
+    return json.loads(donnees)
+
+
+class SQLiteGameStore(GameStore):
+    # Stockage SQLite partagé entre workers et conservé au redémarrage.
+    # Une connexion par thread, base en mode WAL pour les lectures concurrentes.
+    # format='binaire' : états, coups et événements écrits au format binaire.py (plus
+    # compacts) ; les lignes déjà écrites en JSON restent lisibles, et inversement.
+    partage = True
+
+    SCHEMA = (
+        """CREATE TABLE IF NOT EXISTS parties (
+            game_id TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            version INTEGER NOT NULL,
+            activite REAL NOT NULL,
+            etat TEXT NOT NULL,
+            player1_id TEXT,
+            player2_id TEXT,
+            version_etat INTEGER
+        )""",
+        """CREATE TABLE IF NOT EXISTS coups (
+            game_id TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (game_id, id)
+        )""",
+        """CREATE TABLE IF NOT EXISTS evenements (
+            game_id TEXT NOT NULL,
+            id INTEGER NOT NULL,
+            type TEXT NOT NULL,
+            data TEXT NOT NULL,
+            PRIMARY KEY (game_id, id)
+        )""",
+    )
+
+    # Index secondaires, créés après la migration des bases existantes
+    INDEX = (
+        "CREATE INDEX IF NOT EXISTS parties_status_activite ON parties (status, activite)",
+        "CREATE INDEX IF NOT EXISTS parties_activite ON parties (activite)",
+        "CREATE INDEX IF NOT EXISTS parties_player1 ON parties (player1_id)",
+        "CREATE INDEX IF NOT EXISTS parties_player2 ON parties (player2_id)",
+    )
+
+    def __init__(self, chemin, ttl=None, format='json'):
+        super().__init__(ttl)
+        if format not in ('json', 'binaire'):
+            raise ValueError(f"Format de stockage inconnu : {format}")
+        self.chemin = chemin
+        self.encoder = binaire.encoder if format == 'binaire' else json.dumps
+        self._local = threading.local()
+        cx = self._connexion()
+        for requete in self.SCHEMA:
+            cx.execute(requete)
+        self._migrer(cx)
+        for requete in self.INDEX:
+            cx.execute(requete)
+
+    def _migrer(self, cx):
+        # Bases créées par une version précédente : colonnes ajoutées puis remplies
+        colonnes = {ligne[1] for ligne in cx.execute('PRAGMA table_info(parties)')}
+        if 'player1_id' not in colonnes:
+            # Index par joueur : remplis depuis l'état
+            cx.execute('ALTER TABLE parties ADD COLUMN player1_id TEXT')
+            cx.execute('ALTER TABLE parties ADD COLUMN player2_id TEXT')
+            for game_id, etat in cx.execute('SELECT game_id, etat FROM parties').fetchall():
+                game = decoder(etat)
+                cx.execute('UPDATE parties SET player1_id = ?, player2_id = ? WHERE game_id = ?',
+                           (game['player1_id'], game['player2_id'], game_id))
+        if 'version_etat' not in colonnes:
+            # Journal des coups : l'état enregistré jusqu'ici est un instantané à jour
+            cx.execute('ALTER TABLE parties ADD COLUMN version_etat INTEGER')
+            cx.execute('UPDATE parties SET version_etat = version')
+
+    def _connexion(self):
+        cx = getattr(self._local, 'cx', None)
+        if cx is None:
+            cx = sqlite3.connect(self.chemin, timeout=30, isolation_level=None)
+            cx.execute('PRAGMA journal_mode=WAL')
+            cx.execute('PRAGMA synchronous=NORMAL')
+            self._local.cx = cx
+            self._local.profondeur = 0
+        return cx
+
+    @contextmanager
+    def transaction(self):
+        # BEGIN IMMEDIATE prend le verrou d'écriture de la base dès le début :
+        # deux workers ne peuvent pas lire puis réécrire la même partie en même temps.
+        # Les transactions imbriquées du même thread rejoignent la transaction ouverte.
+        cx = self._connexion()
+        if self._local.profondeur:
+            self._local.profondeur += 1
+            try:
+                yield
+            finally:
+                self._local.profondeur -= 1
+            return
+        cx.execute('BEGIN IMMEDIATE')
+        self._local.profondeur = 1
+        try:
+            yield
+        except BaseException:
+            cx.execute('ROLLBACK')
+            raise
+        else:
+            cx.execute('COMMIT')
+        finally:
+            self._local.profondeur = 0
+
+    def get(self, game_id):
+        # Dernier instantané, puis les coups joués depuis
+        cx = self._connexion()
+        ligne = cx.execute('SELECT etat, version_etat, version FROM parties WHERE game_id = ?', (game_id,)).fetchone()
+        if ligne is None:
+            return None
+        etat, version_etat, version = ligne
+        game = decoder(etat)
+        if version_etat != version:
+            for (data,) in cx.execute('SELECT data FROM coups WHERE game_id = ? AND id > ? ORDER BY id', (game_id, version_etat)):
+                appliquer_coup(game, decoder(data))
+        return game
+
+    def put(self, game_id, game):
+        self._connexion().execute(
+            'INSERT OR REPLACE INTO parties (game_id, status, version, activite, etat, player1_id, player2_id, version_etat) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (game_id, game['status'], game['version'], time.time(), self.encoder(game), game['player1_id'], game['player2_id'],
+             game['version'])
+        )
+
+    def delete(self, game_id):
+        cx = self._connexion()
+        cx.execute('DELETE FROM parties WHERE game_id = ?', (game_id,))
+        cx.execute('DELETE FROM evenements WHERE game_id = ?', (game_id,))
+        cx.execute('DELETE FROM coups WHERE game_id = ?', (game_id,))
+
+    def ajouter_coup(self, game_id, game, coup):
+        # Une ligne dans le journal ; l'état complet n'est réécrit que tous les
+        # INTERVALLE_INSTANTANE coups (et en fin de partie)
+        cx = self._connexion()
+        cx.execute('INSERT OR REPLACE INTO coups (game_id, id, data) VALUES (?, ?, ?)', (game_id, coup['id'], self.encoder(coup)))
+        if coup['id'] % INTERVALLE_INSTANTANE == 0 or game['status'] == 'finished':
+            self.put(game_id, game)
+        else:
+            cx.execute('UPDATE parties SET status = ?, version = ?, activite = ? WHERE game_id = ?',
+                       (game['status'], game['version'], time.time(), game_id))
+
+    def coups(self, game_id):
+        lignes = self._connexion().execute('SELECT data FROM coups WHERE game_id = ? ORDER BY id', (game_id,))
+        return [decoder(data) for (data,) in lignes]
+
+    def version(self, game_id):
+        ligne = self._connexion().execute('SELECT version FROM parties WHERE game_id = ?', (game_id,)).fetchone()
+        return None if ligne is None else ligne[0]
+
+    def lister(self, status, limite=None, decalage=0):
+        # Index (status, activite) : pas de parcours de la table
+        lignes = self._connexion().execute(
+            'SELECT game_id FROM parties WHERE status = ? ORDER BY activite LIMIT ? OFFSET ?',
+            (status, -1 if limite is None else limite, decalage)
+        )
+        return [ligne[0] for ligne in lignes]
+
+    def compter(self, status):
+        return self._connexion().execute('SELECT COUNT(*) FROM parties WHERE status = ?', (status,)).fetchone()[0]
+
+    def parties_du_joueur(self, player_id):
+        lignes = self._connexion().execute(
+            'SELECT game_id, activite FROM parties WHERE player1_id = ? '
+            'UNION SELECT game_id, activite FROM parties WHERE player2_id = ? ORDER BY activite',
+            (player_id, player_id)
+        )
+        return [ligne[0] for ligne in lignes]
+
+    def inactives(self, avant, limite=None):
+        lignes = self._connexion().execute(
+            'SELECT game_id FROM parties WHERE activite < ? ORDER BY activite LIMIT ?',
+            (avant, -1 if limite is None else limite)
+        )
+        return [ligne[0] for ligne in lignes]
+
+    def ajouter_evenement(self, game_id, evenement):
+        cx = self._connexion()
+        cx.execute(
+            'INSERT OR REPLACE INTO evenements (game_id, id, type, data) VALUES (?, ?, ?, ?)',
+            (game_id, evenement['id'], evenement['type'], self.encoder(evenement['data']))
+        )
+        cx.execute('DELETE FROM evenements WHERE game_id = ? AND id <= ?', (game_id, evenement['id'] - TAILLE_JOURNAL))
+
+    def evenements_depuis(self, game_id, version):
+        lignes = self._connexion().execute(
+            'SELECT id, type, data FROM evenements WHERE game_id = ? AND id > ? ORDER BY id',
+            (game_id, version)
+        )
+        return [{'id': id_, 'type': type_, 'data': decoder(data)} for id_, type_, data in lignes]
+
+    def purger(self, maintenant=None):
+        maintenant = time.time() if maintenant is None else maintenant
+        cx = self._connexion()
+        supprimees = 0
+        for status, ttl in self.ttl.items():
+            supprimees += cx.execute(
+                'DELETE FROM parties WHERE status = ? AND activite < ?', (status, maintenant - ttl)
+            ).rowcount
+        if supprimees:
+            cx.execute('DELETE FROM evenements WHERE game_id NOT IN (SELECT game_id FROM parties)')
+            cx.execute('DELETE FROM coups WHERE game_id NOT IN (SELECT game_id FROM parties)')
+        return supprimees
+
+    def __len__(self):
+        return self._connexion().execute('SELECT COUNT(*) FROM parties').fetchone()[0]
+
+
+def creer_store(url='memoire', ttl=None):
+    # 'memoire' ou 'sqlite:///chemin/vers/parties.db', éventuellement suivi de
+    # '?format=binaire' (voir SQLiteGameStore)
+    if url == 'memoire':
+        return MemoryGameStore(ttl)
+    if url.startswith('sqlite:///'):
+        chemin, _, options = url[len('sqlite:///'):].partition('?')
+        format = parse_qs(options).get('format', ['json'])[-1]
+        return SQLiteGameStore(chemin, ttl, format)
+    raise ValueError(f"Stockage inconnu : {url}")
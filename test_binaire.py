@@ -0,0 +1,54 @@
+import pytest
+
+import binaire
+import server
+from benchmarks import partie_en_cours
+
+
+def test_aller_retour_partie_en_cours():
+    _, game = partie_en_cours()
+    assert game['status'] == 'ongoing'
+    # État complet (avec _versions et graine) et état public, tels que stockés et servis
+    for etat in (game, server.etat_public(game)):
+        octets = binaire.encoder(etat)
+        assert binaire.est_binaire(octets)
+        assert binaire.decoder(octets) == etat
+
+
+def test_aller_retour_equipe_et_carte_absentes():
+    etat = {
+        'status': 'waiting_teams', 'equipe1': {'nom': 'Rouen', 'personnages': []}, 'equipe2': None,
+        'map': None, 'tour_actuel': 1, 'stats': {'joueur1': {}, 'joueur2': {}},
+    }
+    assert binaire.decoder(binaire.encoder(etat)) == etat
+
+
+def test_table_des_chaines_et_nombres():
+    # Chaînes hors CHAINES_CONNUES (non ASCII, répétées), arme absente, entiers de toutes tailles
+    personnage = {'type': 'Archer', 'nom': 'Élodie', 'classe': 'Archer', 'pv': -3, 'pv_max': 90,
+                  'vivant': False, 'arme': None}
+    valeur = {
+        'personnages': [personnage, dict(personnage, nom='Zoé', arme='Arc 🏹')],
+        'noms': ['Élodie', 'Élodie', ''],
+        'entiers': [0, 255, 256, -1, 2 ** 63 - 1, -2 ** 63, 2 ** 64 - 1, 2 ** 80, -2 ** 80],
+        'reels': [0.5, -1e300],
+        'booleens': [True, False, None],
+    }
+    octets = binaire.encoder(valeur)
+    assert binaire.decoder(octets) == valeur
+    # Une chaîne répétée n'est écrite qu'une fois dans la table
+    assert octets.count('Élodie'.encode('utf-8')) == 1
+
+
+def test_version_inconnue_refusee():
+    octets = bytearray(binaire.encoder({'status': 'ongoing'}))
+    octets[len(binaire.MAGIE)] = binaire.VERSION + 1
+    with pytest.raises(ValueError):
+        binaire.decoder(bytes(octets))
+
+
+def test_donnees_invalides_refusees():
+    octets = binaire.encoder({'status': 'ongoing', 'map': 'Carrefour Saint-Sever'})
+    for invalide in (b'{"status": "ongoing"}', octets[:-1], octets + b'\x00'):
+        with pytest.raises(ValueError):
+            binaire.decoder(invalide)
@@ -0,0 +1,85 @@
+import json
+
+import server
+from combat import ACTIONS_PAR_TYPE
+
+# Les player_id servent de jeton de session : aucune réponse publique ne doit en contenir
+# (voir server.CHAMPS_PRIVES).
+
+
+def partie_commencee(client):
+    game_id = client.post('/create_game', json={'player_id': 'secret-hote'}).get_json()['game_id']
+    client.post('/join_game', json={'game_id': game_id, 'player_id': 'secret-invite'})
+    for player_id, nom in (('secret-hote', 'Rouen'), ('secret-invite', 'Le Havre')):
+        equipe = dict(server.equipe_bot(None), nom=nom)
+        client.post('/submit_team', json={'game_id': game_id, 'player_id': player_id, 'equipe': equipe})
+    client.post('/submit_map', json={'game_id': game_id, 'player_id': 'secret-hote', 'map': server.MAPS[0]})
+    # Un coup, pour que les stats figurent dans l'état, le delta et l'événement du coup
+    type_ = server.games.get(game_id)['equipe1']['personnages'][0]['type']
+    action = next(a for a in ACTIONS_PAR_TYPE[type_].values() if a.cible != 'allie')
+    reponse = client.post('/make_move', json={
+        'game_id': game_id, 'player_id': 'secret-hote', 'personnage_index': 0, 'action_key': action.cle, 'cible_index': 0,
+    })
+    assert reponse.status_code == 200
+    return game_id
+
+
+def test_etat_public_sans_player_id():
+    client = server.app.test_client()
+    game_id = partie_commencee(client)
+    reponses = [
+        client.get(f'/game_state/{game_id}').get_data(as_text=True),
+        client.get(f'/game_state/{game_id}?since=0&delta=1').get_data(as_text=True),
+        client.get('/resume/secret-hote').get_data(as_text=True),
+        client.get('/lobby').get_data(as_text=True),
+    ]
+    for texte in reponses:
+        assert 'secret-hote' not in texte
+        assert 'secret-invite' not in texte
+    etat = client.get(f'/game_state/{game_id}').get_json()
+    assert set(etat['stats']) == {'Rouen', 'Le Havre'}
+
+
+def test_evenements_sans_player_id():
+    client = server.app.test_client()
+    game_id = partie_commencee(client)
+    for evenement in server.evenements_a_envoyer(game_id, 0):
+        texte = json.dumps(evenement)
+        assert 'secret-hote' not in texte
+        assert 'secret-invite' not in texte
+
+
+def test_rejoindre_sa_propre_partie():
+    client = server.app.test_client()
+    game_id = client.post('/create_game', json={'player_id': 'solo'}).get_json()['game_id']
+    reponse = client.post('/join_game', json={'game_id': game_id, 'player_id': 'solo'})
+    assert reponse.status_code == 400
+    lobby = client.get('/lobby?player_id=solo&par_page=100').get_json()
+    assert game_id not in [partie['game_id'] for partie in lobby['parties']]
+    lobby = client.get('/lobby?par_page=100').get_json()
+    assert game_id in [partie['game_id'] for partie in lobby['parties']]
+
+
+def test_equipe_soumise_une_seule_fois():
+    client = server.app.test_client()
+    game_id = partie_commencee(client)
+    avant = client.get(f'/game_state/{game_id}').get_json()
+    equipe = dict(server.equipe_bot(None), nom='Rouen')
+    reponse = client.post('/submit_team', json={'game_id': game_id, 'player_id': 'secret-hote', 'equipe': equipe})
+    assert reponse.status_code == 400
+    apres = client.get(f'/game_state/{game_id}').get_json()
+    assert apres['status'] == 'ongoing'
+    assert apres['stats'] == avant['stats']
+
+
+def test_evenement_fige_au_coup():
+    client = server.app.test_client()
+    game_id = partie_commencee(client)
+    (coup,) = [e for e in server.evenements_a_envoyer(game_id, 0) if e['type'] == 'coup']
+    emis = json.dumps(coup)
+    type_ = server.games.get(game_id)['equipe2']['personnages'][0]['type']
+    action = next(a for a in ACTIONS_PAR_TYPE[type_].values() if a.cible != 'allie')
+    client.post('/make_move', json={
+        'game_id': game_id, 'player_id': 'secret-invite', 'personnage_index': 0, 'action_key': action.cle, 'cible_index': 0,
+    })
+    assert json.dumps(server.evenements_a_envoyer(game_id, coup['id'] - 1)[0]) == emis
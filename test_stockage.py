@@ -0,0 +1,45 @@
+import copy
+
+import pytest
+
+import server
+from benchmarks import partie_en_cours
+from combat import ACTIONS_PAR_TYPE
+from stockage import INTERVALLE_INSTANTANE, SQLiteGameStore
+
+
+def coup_valide(game):
+    # Premier personnage vivant de l'équipe active, attaque sur le premier adversaire vivant
+    active, inactive = ('equipe1', 'equipe2') if game['equipe_active_nom'] == game['equipe1']['nom'] else ('equipe2', 'equipe1')
+    i = next(i for i, p in enumerate(game[active]['personnages']) if p['vivant'])
+    j = next(j for j, p in enumerate(game[inactive]['personnages']) if p['vivant'])
+    type_ = game[active]['personnages'][i]['type']
+    action = next(a for a in ACTIONS_PAR_TYPE[type_].values() if a.cible != 'allie')
+    joueur = game['player1_id'] if active == 'equipe1' else game['player2_id']
+    return joueur, i, action.cle, j
+
+
+@pytest.mark.parametrize('format', ['json', 'binaire'])
+def test_instantanes_et_journal_des_coups(tmp_path, monkeypatch, format):
+    # Plus de INTERVALLE_INSTANTANE coups : get() reconstruit l'état depuis le dernier
+    # instantané et les coups suivants, et doit rendre exactement le dernier état écrit
+    chemin = str(tmp_path / 'parties.db')
+    store = SQLiteGameStore(chemin, format=format)
+    game_id, modele = partie_en_cours()
+    monkeypatch.setattr(server, 'games', store)
+    store.put(game_id, copy.deepcopy(modele))
+
+    coups = 0
+    while coups <= 2 * INTERVALLE_INSTANTANE:
+        game = store.get(game_id)
+        if game['status'] == 'finished':
+            break
+        reponse, code = server.jouer_coup(game_id, game, *coup_valide(game))
+        assert code == 200, reponse
+        coups += 1
+        assert store.get(game_id) == game
+    assert coups > INTERVALLE_INSTANTANE
+
+    # Même résultat depuis une autre connexion (autre worker, redémarrage)
+    assert SQLiteGameStore(chemin, format=format).get(game_id) == game
+    assert [c['id'] for c in store.coups(game_id)] == list(range(modele['version'] + 1, game['version'] + 1))